@@ -14,15 +14,28 @@ import json
 import os
 import subprocess
 import datetime
+import queue
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 import click
 from dotenv import load_dotenv
-from openai import OpenAI
 from pydantic import BaseModel
 from rich.console import Console
-from rich.prompt import Confirm
+
+if TYPE_CHECKING:                   # `openai` is imported on first use; it dominates startup time
+    from openai import OpenAI
+
+from endpoint_pool import make_client, session_client
+from mcp_http import DEFAULT_TIMEOUT_S, HTTPMCPServer, is_http_server
+from partial_json import parse_tool_arguments
+from response_cache import DEFAULT_MAX_BYTES, ResponseCache, cached_chat_completion
+from schema_compiler import CompiledSchema, compile_schema, format_errors, normalize_root, strip_unsupported_formats
+from snapshot_diff import SnapshotDiffer
+from tool_retrieval import ToolRetriever, recently_used_tools, retrieval_query
+from trace_catalog import TraceCatalog
 
 console = Console()
 load_dotenv()                       # .env support, e.g. for OpenAI api key.
@@ -62,12 +75,20 @@ class MCPAgent:
         trace_dir: str = "traces",
         system_prompt: Optional[str] = None,
         truncate: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        temperature: Optional[float] = None,
+        tool_top_k: Optional[int] = None,
+        snapshot_diff: bool = False,
+        json_repair: str = "repair",
+        client: Optional[OpenAI] = None,
     ):
         self.model = model
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"),
-                             base_url=base_url) if base_url else OpenAI(
-                                 api_key=api_key or os.getenv("OPENAI_API_KEY"))
-        if not self.client.api_key:
+        self.session_id = uuid.uuid4().hex   # routing key when --base-url lists several endpoints
+        self._client = client               # shared client (e.g. one per service process), else built lazily
+        self._client_lock = threading.Lock()
+        self._api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._base_url = base_url
+        if client is None and not self._api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
 
         self.config = self._load_config(config_path)
@@ -76,6 +97,13 @@ class MCPAgent:
         self.trace_dir.mkdir(exist_ok=True)
         self.system_prompt = system_prompt
         self.truncate = truncate
+        self.cache = cache                  # opt-in response cache, None = always call the API
+        self.temperature = temperature      # None = the server's default (responses are then not cached)
+        self.tool_top_k = tool_top_k        # per-turn tool retrieval, None = send every tool
+        self.snapshot_differ = SnapshotDiffer() if snapshot_diff else None
+        self.json_repair = json_repair      # policy for malformed tool-call arguments, see partial_json.py
+        self.argument_repairs: Dict[str, dict] = {}     # tool_call_id → repairs applied to its arguments
+        self.failed_tool_calls: List[str] = []          # tool_call_ids that were rejected or returned an error
 
         # Initialize conversation history with system prompt if provided
         self.conversation_history: List[Dict[str, Any]] = []
@@ -84,9 +112,27 @@ class MCPAgent:
             
         self.tools: List[dict] = []          # MCP format
         self.oa_tools: List[dict] = []       # OpenAI format
+        self.compiled_schemas: Dict[str, CompiledSchema] = {}   # OpenAI tool name → schema + validator
+        self.tool_retriever: Optional[ToolRetriever] = None
+        self.tool_selections: List[dict] = []   # tools sent per assistant message when retrieval is on
 
-        # One running process per MCP server
+        # One running process per stdio MCP server, one session per HTTP one
         self.mcp_processes: Dict[str, Tuple[subprocess.Popen, Dict[str, str]]] = {}
+        self.mcp_http: Dict[str, HTTPMCPServer] = {}
+        self.mcp_lines: Dict[str, queue.Queue] = {}     # stdout lines of each stdio server, "" at EOF
+        self.batch_rejected: set = set()     # stdio servers configured with "batch" that answered a batch with an error
+
+    @property
+    def client(self) -> OpenAI:
+        """
+        OpenAI client, created (and `openai` imported) on first use. With a
+        comma-separated `base_url` this is a pooled client pinned to this
+        conversation's replica (see endpoint_pool.py).
+        """
+        with self._client_lock:
+            if self._client is None:
+                self._client = session_client(make_client(self._base_url, self._api_key), self.session_id)
+            return self._client
 
     # ---------------------------------------------------------------------#
     #  Utility loaders                                                     #
@@ -103,7 +149,7 @@ class MCPAgent:
     # ---------------------------------------------------------------------#
     #  MCP server management                                               #
     # ---------------------------------------------------------------------#
-    def _start_mcp_server(self, name: str) -> Tuple[subprocess.Popen, Dict[str, str]]:
+    def _start_mcp_server(self, name: str, log: Callable[[str], Any] = console.print) -> Tuple[subprocess.Popen, Dict[str, str]]:
         if name in self.mcp_processes:
             return self.mcp_processes[name]
 
@@ -124,22 +170,128 @@ class MCPAgent:
             env=env,
         )
         self.mcp_processes[name] = (proc, env)
-        console.print(f"[green]Started MCP server:[/green] {name}")
+        # Lines are read on a thread so that waits for a response can time out
+        lines: queue.Queue = queue.Queue()
+        self.mcp_lines[name] = lines
+        threading.Thread(target=self._pump_lines, args=(proc.stdout, lines), daemon=True).start()
+        log(f"[green]Started MCP server:[/green] {name}")
         return proc, env
 
-    def _list_mcp_tools(self, proc, server_name: str) -> List[dict]:
-        """Call tools/list via JSON-RPC 2.0 and return raw tool objects."""
-        req = {"jsonrpc": "2.0", "id": 1, "method": "tools/list", "params": {}}
+    @staticmethod
+    def _pump_lines(stream, lines: queue.Queue) -> None:
+        for line in iter(stream.readline, ""):
+            lines.put(line)
+        lines.put("")
+
+    def _read_mcp_responses(self, server_name: str, ids: set) -> Tuple[Dict[Any, dict], bool]:
+        """
+        Read a stdio server's output until every id in `ids` has a response,
+        the server exits, or its `timeout` (as for HTTP servers) passes. Batch
+        arrays and single messages are both accepted. The flag is True if a
+        response came back outside an array: either individual answers or the
+        id-null error of a rejected batch, which ends the read at once.
+        """
+        lines = self.mcp_lines[server_name]
+        deadline = time.monotonic() + float(self.config["mcpServers"][server_name].get("timeout", DEFAULT_TIMEOUT_S))
+        responses: Dict[Any, dict] = {}
+        unbatched = False
+        while len(responses) < len(ids):
+            try:
+                line = lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                if not responses:
+                    raise TimeoutError(f"MCP server {server_name} timed out")
+                break
+            if not line:
+                lines.put("")                       # keep the EOF marker for later reads
+                break
+            msg = json.loads(line)
+            if isinstance(msg, dict):
+                if msg.get("id") is None and "error" in msg:
+                    return responses, True
+                unbatched = unbatched or msg.get("id") in ids
+            for m in msg if isinstance(msg, list) else [msg]:
+                if isinstance(m, dict) and m.get("id") in ids:
+                    responses[m["id"]] = m
+        return responses, unbatched
+
+    def _connect_mcp_server(self, name: str, log: Callable[[str], Any] = console.print) -> None:
+        """Start the server's process, or open a session for servers configured by URL."""
+        server_cfg = self.config["mcpServers"].get(name)
+        if not server_cfg:
+            raise ValueError(f"Unknown MCP server '{name}' (check config.json)")
+        if not is_http_server(server_cfg):
+            self._start_mcp_server(name, log)
+            return
+        if name not in self.mcp_http:
+            server = HTTPMCPServer(name, server_cfg)
+            server.connect()
+            self.mcp_http[name] = server
+            log(f"[green]Connected to MCP server:[/green] {name} ({server.url})")
+
+    def _mcp_request(self, server_name: str, req: dict) -> Optional[dict]:
+        """Send one JSON-RPC request to a server over its transport; None if it didn't answer."""
+        self._connect_mcp_server(server_name)
+        if server_name in self.mcp_http:
+            return self.mcp_http[server_name].request(req["method"], req["params"])
+
+        proc, _ = self.mcp_processes[server_name]
         proc.stdin.write(json.dumps(req) + "\n")
         proc.stdin.flush()
+        return self._read_mcp_responses(server_name, {req["id"]})[0].get(req["id"])
+
+    def _mcp_request_many(self, server_name: str, reqs: List[dict]) -> List[Optional[dict]]:
+        """
+        Send requests that may run concurrently to one server; returns the
+        responses in request order (None where the server didn't answer).
+        One JSON-RPC batch array when the server takes batches, otherwise the
+        requests are pipelined: written in one go, answers matched by id.
+        """
+        self._connect_mcp_server(server_name)
+        if server_name in self.mcp_http:
+            return self.mcp_http[server_name].request_many([(r["method"], r["params"]) for r in reqs])
+
+        proc, _ = self.mcp_processes[server_name]
+        order = [r["id"] for r in reqs]
+        ids = set(order)
+        responses: Dict[Any, dict] = {}
+        if self.config["mcpServers"][server_name].get("batch") and server_name not in self.batch_rejected:
+            proc.stdin.write(json.dumps(reqs) + "\n")
+            proc.stdin.flush()
+            responses, unbatched = self._read_mcp_responses(server_name, ids)
+            if not unbatched:
+                return [responses.get(i) for i in order]
+            # An error (id null) or answers outside an array: the server doesn't take
+            # batches, so pipeline whatever it didn't answer
+            self.batch_rejected.add(server_name)
+            reqs = [r for r in reqs if r["id"] not in responses]
+
+        if reqs:
+            proc.stdin.write("".join(json.dumps(r) + "\n" for r in reqs))
+            proc.stdin.flush()
+            responses.update(self._read_mcp_responses(server_name, {r["id"] for r in reqs})[0])
+        return [responses.get(i) for i in order]
+
+    def _stop_mcp_servers(self) -> None:
+        """Terminate the stdio server processes and end the HTTP sessions."""
+        for proc, _ in self.mcp_processes.values():
+            try:
+                proc.terminate()
+                proc.wait(timeout=3)
+            except Exception:
+                proc.kill()
+        for server in self.mcp_http.values():
+            server.close()
 
-        line = proc.stdout.readline()
-        if not line:
+    def _list_mcp_tools(self, server_name: str, log: Callable[[str], Any] = console.print) -> List[dict]:
+        """Call tools/list via JSON-RPC 2.0 and return raw tool objects."""
+        req = {"jsonrpc": "2.0", "id": 1, "method": "tools/list", "params": {}}
+        rsp = self._mcp_request(server_name, req)
+        if not rsp:
             return []
 
-        rsp = json.loads(line)
         if "error" in rsp:
-            console.print(f"[red]tools/list error from {server_name}: {rsp['error']}[/red]")
+            log(f"[red]tools/list error from {server_name}: {rsp['error']}[/red]")
             return []
 
         tools = rsp.get("result", {}).get("tools", [])
@@ -152,39 +304,32 @@ class MCPAgent:
     # ---------------------------------------------------------------------#
     def _normalize_root(self, schema: dict) -> dict:
         """Guarantee the root is an object so OpenAI is happy."""
-        if schema.get("type") == "object":
-            return schema
-
-        # wrap non-object schemas
-        return {
-            "type": "object",
-            "properties": {"value": schema},
-            "required": ["value"],
-        }
+        return normalize_root(schema)
 
     def _strip_unsupported_formats(self, node: dict):
         """Remove JSON-Schema 'format' fields OpenAI doesn’t recognise."""
-        if not isinstance(node, dict):
-            return
-        if node.get("type") == "string" and node.get("format") not in {"date-time", "enum"}:
-            node.pop("format", None)
-        if node.get("type") == "object":
-            for prop in node.get("properties", {}).values():
-                self._strip_unsupported_formats(prop)
-        if node.get("items"):
-            self._strip_unsupported_formats(node["items"])
-
-    def _mcp_to_openai_tools(self, mcp_tools):
+        strip_unsupported_formats(node)
+
+    def _mcp_to_openai_tools(self, mcp_tools, log: Callable[[str], Any] = console.print):
+        """
+        Convert MCP tools, compiling (and caching by schema hash) each input
+        schema. A tool whose schema can't be compiled is left out, not the server.
+        """
         oa = []
         for tool in mcp_tools:
-            schema = self._normalize_root(tool.get("inputSchema", {"type": "object", "properties": {}}))
-            self._strip_unsupported_formats(schema)
+            name = tool["name"][:64]                      # OpenAI 64-char limit
+            try:
+                compiled = compile_schema(tool.get("inputSchema"), tool["name"])
+            except Exception as exc:
+                log(f"[yellow]Skipping tool {name}: could not compile its input schema: {exc}[/yellow]")
+                continue
+            self.compiled_schemas[name] = compiled
             oa.append({
                 "type": "function",
                 "function": {
-                    "name": tool["name"][:64],            # OpenAI 64-char limit
+                    "name": name,
                     "description": tool.get("description", "")[:1024],
-                    "parameters": schema,
+                    "parameters": compiled.openai_schema,
                 },
             })
         return oa
@@ -192,44 +337,118 @@ class MCPAgent:
     # ---------------------------------------------------------------------#
     #  Tool execution helpers                                              #
     # ---------------------------------------------------------------------#
+    def _parse_tool_arguments(self, tool_call_id: str, raw_args: Any) -> Dict[str, Any]:
+        """
+        Arguments as a dict under the JSON repair policy. Repairs are recorded
+        (with the raw text) for the trace; raises json.JSONDecodeError if the
+        arguments can't be read.
+        """
+        arguments, repairs = parse_tool_arguments(raw_args, self.json_repair)
+        if repairs and tool_call_id not in self.argument_repairs:
+            self.argument_repairs[tool_call_id] = {"tool_call_id": tool_call_id, "repairs": repairs, "raw": raw_args}
+        return arguments
+
     def _convert_oa_toolcall_to_mcp(self, call) -> MCPToolCall:
-        raw_args = call.function.arguments
-        arguments = json.loads(raw_args) if isinstance(raw_args, str) else raw_args
+        arguments = self._parse_tool_arguments(call.id, call.function.arguments)
         return MCPToolCall(name=call.function.name, arguments=arguments)
 
+    def _validate_tool_call(self, tool: MCPToolCall) -> Optional[Dict[str, Any]]:
+        """
+        Check arguments against the tool's compiled schema before dispatch.
+        Returns an MCP-style error result for the model, or None if valid.
+        """
+        compiled = self.compiled_schemas.get(tool.name)
+        if compiled is None:
+            return None
+        errors = compiled.validate(tool.arguments)
+        if not errors:
+            return None
+        return {
+            "content": [{"type": "text", "text": format_errors(tool.name, errors)}],
+            "structuredContent": {"errors": [{"path": p, "message": m} for p, m in errors]},
+            "isError": True,
+        }
+
     def _execute_mcp_tool(self, tool: MCPToolCall) -> Dict[str, Any]:
         original = next((t for t in self.tools if t["name"] == tool.name), None)
         if original is None:
             return {"content": [{"type": "text", "text": f"Tool {tool.name} not found"}], "isError": True}
 
-        proc, _ = self._start_mcp_server(original["server"])
-
         req = {
             "jsonrpc": "2.0",
             "id": uuid.uuid4().hex,                 # ① unique per request
             "method": "tools/call",
             "params": {"name": tool.name, "arguments": tool.arguments},
         }
-        proc.stdin.write(json.dumps(req) + "\n")
-        proc.stdin.flush()
+        try:
+            rsp = self._mcp_request(original["server"], req)
+        except (ConnectionError, TimeoutError) as exc:
+            return {"content": [{"type": "text", "text": str(exc)}], "isError": True}
+        return self._tool_result(rsp)
 
-        line = proc.stdout.readline()
-        if not line:
+    @staticmethod
+    def _tool_result(rsp: Optional[dict]) -> Dict[str, Any]:
+        """JSON-RPC response to tools/call → MCP tool result (errors become isError results)."""
+        if not rsp:
             return {"content": [{"type": "text", "text": "No response"}], "isError": True}
 
-        rsp = json.loads(line)
         if "error" in rsp:
             return {"content": [{"type": "text", "text": str(rsp['error'])}], "isError": True}
 
         return rsp.get("result", {})
 
-    def _wrap_tool_result(self, tool_call_id: str, result: dict) -> dict:
+    def _group_tool_calls(self, tools: List[MCPToolCall]) -> List[Tuple[Optional[str], List[MCPToolCall]]]:
+        """
+        Split one turn's calls into consecutive groups that can be dispatched
+        together: back-to-back calls to the same server whose tools are all
+        read-only (MCP `readOnlyHint`). Anything else is a group of one, so
+        calls with side effects still run one at a time and in order.
+        """
+        by_name = {t["name"]: t for t in self.tools}
+        groups: List[Tuple[Optional[str], List[MCPToolCall]]] = []
+        for tool in tools:
+            original = by_name.get(tool.name)
+            read_only = bool(original and (original.get("annotations") or {}).get("readOnlyHint"))
+            server = original["server"] if read_only else None
+            if server is not None and groups and groups[-1][0] == server:
+                groups[-1][1].append(tool)
+            else:
+                groups.append((server, [tool]))
+        return groups
+
+    def _execute_mcp_tools(self, tools: List[MCPToolCall]) -> List[Dict[str, Any]]:
+        """Execute one turn's approved calls, batching where possible; results are in call order."""
+        results: List[Dict[str, Any]] = []
+        for server, group in self._group_tool_calls(tools):
+            if server is None or len(group) == 1:
+                results.extend(self._execute_mcp_tool(tool) for tool in group)
+                continue
+            reqs = [{
+                "jsonrpc": "2.0",
+                "id": uuid.uuid4().hex,
+                "method": "tools/call",
+                "params": {"name": tool.name, "arguments": tool.arguments},
+            } for tool in group]
+            try:
+                responses = self._mcp_request_many(server, reqs)
+            except (ConnectionError, TimeoutError) as exc:
+                responses = [{"error": str(exc)}] * len(group)
+            results.extend(self._tool_result(rsp) for rsp in responses)
+        return results
+
+    def _wrap_tool_result(self, tool_call_id: str, result: dict, tool_name: Optional[str] = None) -> dict:
         """MCP result → OpenAI tool-role message (role, tool_call_id, content)."""
+        if isinstance(result, dict) and result.get("isError"):
+            self.failed_tool_calls.append(tool_call_id)
         if isinstance(result, dict):
             parts = result.get("content", [])
             text = " ".join(p.get("text", "") for p in parts if p.get("type") == "text")
         else:
             text = str(result)
+        
+        # Replace repeated page snapshots with a diff against the last one for the tab
+        if self.snapshot_differ is not None and not (isinstance(result, dict) and result.get("isError")):
+            text = self.snapshot_differ.process(tool_name, text)
             
         # Truncate the content if truncate parameter is set
         if self.truncate is not None and len(text) > self.truncate:
@@ -244,18 +463,67 @@ class MCPAgent:
     # ---------------------------------------------------------------------#
     #  Discovery                                                           #
     # ---------------------------------------------------------------------#
-    def _discover_all_tools(self) -> None:
+    def _discover_all_tools(self, log: Callable[[str], Any] = console.print) -> None:
         for server_name in self.config.get("mcpServers", {}):
             try:
-                proc, _ = self._start_mcp_server(server_name)
-                server_tools = self._list_mcp_tools(proc, server_name)
+                self._connect_mcp_server(server_name, log)
+                server_tools = self._list_mcp_tools(server_name, log)
                 self.tools.extend(server_tools)
-                console.print(f"[green]Discovered {len(server_tools)} tools from {server_name}.[/green]")
+                log(f"[green]Discovered {len(server_tools)} tools from {server_name}.[/green]")
             except Exception as exc:
-                console.print(f"[yellow]Could not list tools from {server_name}: {exc}[/yellow]")
+                log(f"[yellow]Could not list tools from {server_name}: {exc}[/yellow]")
+
+        self.oa_tools = self._mcp_to_openai_tools(self.tools, log)
+        log(f"[bold blue]Total available tools:[/bold blue] {len(self.oa_tools)}")
+        if self.tool_top_k and self.oa_tools:
+            self.tool_retriever = ToolRetriever(self.oa_tools)
+            log(f"[blue]Tool retrieval on: top {self.tool_top_k} tools per turn plus recently used ones[/blue]")
+
+    def _start_background_startup(self) -> Tuple[threading.Thread, List[str]]:
+        """
+        Spawn MCP servers, discover tools and build the model client while the
+        user types their first message. Log lines are buffered so they don't
+        interleave with the prompt; `_finish_background_startup` prints them.
+        """
+        lines: List[str] = []
+
+        def run():
+            try:
+                self._discover_all_tools(log=lines.append)
+            except Exception as exc:
+                lines.append(f"[red]Tool discovery failed: {exc}[/red]")
+            self.client                         # import openai + build the client off the main thread
+
+        thread = threading.Thread(target=run, name="mcp-startup", daemon=True)
+        thread.start()
+        return thread, lines
+
+    def _finish_background_startup(self, startup: Tuple[threading.Thread, List[str]]) -> None:
+        thread, lines = startup
+        if thread.is_alive():
+            console.print("[dim]Waiting for MCP servers to start...[/dim]")
+        thread.join()
+        for line in lines:
+            console.print(line)
+        if not self.oa_tools:
+            console.print("[yellow]No tools found – continuing with plain chat.[/yellow]")
+
+    def _select_tools(self) -> List[dict]:
+        """Tools to send on the next request: all of them, or the retrieved subset."""
+        if self.tool_retriever is None:
+            return self.oa_tools
 
-        self.oa_tools = self._mcp_to_openai_tools(self.tools)
-        console.print(f"[bold blue]Total available tools:[/bold blue] {len(self.oa_tools)}")
+        selected = self.tool_retriever.select(
+            retrieval_query(self.conversation_history),
+            self.tool_top_k,
+            pinned=recently_used_tools(self.conversation_history),
+        )
+        # Index the assistant message this request will produce
+        self.tool_selections.append({
+            "message_index": len(self.conversation_history),
+            "tools": [t["function"]["name"] for t in selected],
+        })
+        return selected
 
     # ---------------------------------------------------------------------#
     #  Chat loop                                                           #
@@ -264,12 +532,14 @@ class MCPAgent:
         console.print("[bold magenta]MCP Agent (OpenAI edition)[/bold magenta]")
         console.print("Type 'exit' to quit.\n")
 
-        self._discover_all_tools()
-        if not self.oa_tools:
-            console.print("[yellow]No tools found – continuing with plain chat.[/yellow]")
+        # Servers start in the background; the first prompt appears immediately
+        startup = self._start_background_startup()
 
         while True:
             user_msg = click.prompt("You")
+            if startup is not None:
+                self._finish_background_startup(startup)
+                startup = None
             if user_msg.lower() in {"exit", "quit"}:
                 # Save the conversation trace before exiting
                 self._save_conversation_trace()
@@ -279,73 +549,62 @@ class MCPAgent:
 
             # -- 1st assistant response ----------------------------------#
             asst_msg = self._chat_once()
-            
-            # Create a complete assistant message for the conversation history
-            asst_history_msg = {"role": "assistant", "content": ""}
-            
-            # Add content if present
             if asst_msg.content:
                 console.print(f"\n[bold green]Assistant:[/bold green] {asst_msg.content}\n")
-                asst_history_msg["content"] = asst_msg.content
-            
-            # Add reasoning_content if present
-            if hasattr(asst_msg, "reasoning_content") and asst_msg.reasoning_content:
-                asst_history_msg["reasoning_content"] = asst_msg.reasoning_content
-            
-            # Add tool_calls if present
-            tool_calls = getattr(asst_msg, "tool_calls", None)
-            serialized_tool_calls = None
-            if tool_calls:
-                serialized_tool_calls = [self._convert_tool_call_to_dict(tc) for tc in tool_calls]
-                asst_history_msg["tool_calls"] = serialized_tool_calls
             
             # Add the complete message to history
-            self.conversation_history.append(asst_history_msg)
+            self.conversation_history.append(self._to_history_message(asst_msg))
 
             # -- Handle function calls -----------------------------------#
             tool_calls = getattr(asst_msg, "tool_calls", None)
             while tool_calls:
+                # One tool message per call, in call order; approved calls are dispatched together
+                tool_msgs: List[Optional[dict]] = []
+                approved: List[Tuple[int, Any, MCPToolCall]] = []
                 for tc in tool_calls:
-                    mcp_call = self._convert_oa_toolcall_to_mcp(tc)
+                    try:
+                        mcp_call = self._convert_oa_toolcall_to_mcp(tc)
+                    except json.JSONDecodeError as exc:
+                        # Unreadable even after repair: tell the model instead of ending the chat
+                        console.print(f"[yellow]Could not parse arguments for {tc.function.name}: {exc}[/yellow]")
+                        invalid = {"content": [{"type": "text", "text": f"Invalid JSON arguments: {exc}"}], "isError": True}
+                        tool_msgs.append(self._wrap_tool_result(tc.id, invalid))
+                        continue
+                    if tc.id in self.argument_repairs:
+                        repairs = ", ".join(self.argument_repairs[tc.id]["repairs"])
+                        console.print(f"[dim]Repaired arguments for {mcp_call.name}: {repairs}[/dim]")
+
+                    # Reject malformed arguments locally, without asking or dispatching
+                    invalid = self._validate_tool_call(mcp_call)
+                    if invalid is not None:
+                        console.print(f"[yellow]Rejected invalid arguments for {mcp_call.name}[/yellow]")
+                        tool_msgs.append(self._wrap_tool_result(tc.id, invalid))
+                        continue
 
                     if not self._ask_permission(mcp_call):
                         # user rejected
-                        self.conversation_history.append(
-                            {"role": "tool", "tool_call_id": tc.id, "content": "User rejected tool call."}
-                        )
+                        tool_msgs.append({"role": "tool", "tool_call_id": tc.id, "content": "User rejected tool call."})
+                        self.failed_tool_calls.append(tc.id)
                         continue
 
-                    mcp_result = self._execute_mcp_tool(mcp_call)
-                    wrapped = self._wrap_tool_result(tc.id, mcp_result)
-                    self.conversation_history.append(wrapped)
+                    approved.append((len(tool_msgs), tc, mcp_call))
+                    tool_msgs.append(None)
+
+                results = self._execute_mcp_tools([mcp_call for _, _, mcp_call in approved])
+                for (index, tc, mcp_call), mcp_result in zip(approved, results):
+                    tool_msgs[index] = self._wrap_tool_result(tc.id, mcp_result, tool_name=mcp_call.name)
+                self.conversation_history.extend(tool_msgs)
 
                 # -- follow-up after tool execution -------------------#
                 follow = self._chat_once()
-                
-                # Create a complete assistant message for the conversation history
-                follow_history_msg = {"role": "assistant", "content": ""}
-                
-                # Add content if present
                 if follow.content:
                     console.print(f"\n[bold green]Assistant:[/bold green] {follow.content}\n")
-                    follow_history_msg["content"] = follow.content
-                
-                # Add reasoning_content if present
-                if hasattr(follow, "reasoning_content") and follow.reasoning_content:
-                    follow_history_msg["reasoning_content"] = follow.reasoning_content
-                
-                # Add tool_calls if present
-                new_tool_calls = getattr(follow, "tool_calls", None)
-                if new_tool_calls:
-                    # Convert only the new tool calls
-                    serialized_tool_calls = [self._convert_tool_call_to_dict(tc) for tc in new_tool_calls]
-                    follow_history_msg["tool_calls"] = serialized_tool_calls
                 
                 # Add the complete message to history
-                self.conversation_history.append(follow_history_msg)
+                self.conversation_history.append(self._to_history_message(follow))
                 
                 # Update tool_calls for the next iteration
-                tool_calls = new_tool_calls
+                tool_calls = getattr(follow, "tool_calls", None)
 
     # Define allowed keys for each role
     ALLOWED = {
@@ -384,12 +643,16 @@ class MCPAgent:
         """Single call to OpenAI Chat Completion."""
         # Prepare messages for API call
         api_messages = self._prepare_messages_for_api(self.conversation_history)
+        tools = self._select_tools()
         
-        rsp = self.client.chat.completions.create(
+        rsp = cached_chat_completion(
+            self.client,
+            self.cache,
             model=self.model,
             messages=api_messages,
-            tools=self.oa_tools if self.oa_tools else None,
+            tools=tools if tools else None,
             tool_choice="auto",
+            **({} if self.temperature is None else {"temperature": self.temperature}),
         )
         message = rsp.choices[0].message
         
@@ -402,6 +665,25 @@ class MCPAgent:
     # ---------------------------------------------------------------------#
     #  Conversion Helpers                                                  #
     # ---------------------------------------------------------------------#
+    def _to_history_message(self, message) -> dict:
+        """Convert an OpenAI assistant message to a complete conversation-history entry."""
+        history_msg = {"role": "assistant", "content": ""}
+        
+        # Add content if present
+        if message.content:
+            history_msg["content"] = message.content
+        
+        # Add reasoning_content if present
+        if hasattr(message, "reasoning_content") and message.reasoning_content:
+            history_msg["reasoning_content"] = message.reasoning_content
+        
+        # Add tool_calls if present
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            history_msg["tool_calls"] = [self._convert_tool_call_to_dict(tc) for tc in tool_calls]
+        
+        return history_msg
+
     def _convert_tool_call_to_dict(self, tool_call) -> dict:
         """Convert an OpenAI tool call object to a dictionary for storage."""
         # For trace logging, we want to store the complete data including parsed arguments
@@ -420,8 +702,8 @@ class MCPAgent:
                 args = tool_call.function.arguments
                 if isinstance(args, str):
                     try:
-                        # Store the parsed arguments for trace logging
-                        function_data["arguments"] = json.loads(args)
+                        # Store the parsed (and, by policy, repaired) arguments for trace logging
+                        function_data["arguments"] = self._parse_tool_arguments(tool_call.id, args)
                     except json.JSONDecodeError:
                         function_data["arguments"] = args
                 else:
@@ -434,10 +716,14 @@ class MCPAgent:
     # ---------------------------------------------------------------------#
     #  Logging & Tracing                                                   #
     # ---------------------------------------------------------------------#
-    def _save_conversation_trace(self):
-        """Save the current conversation history and tools to a trace file."""
+    def _save_conversation_trace(self, extra: Optional[Dict[str, Any]] = None, suffix: str = "") -> Optional[Path]:
+        """
+        Save the current conversation history and tools to a trace file.
+        `extra` adds top-level fields; `suffix` keeps filenames unique when
+        several traces are saved in the same second (e.g. forked branches).
+        """
         if not self.conversation_history:
-            return
+            return None
         
         # Get the first user message to use in the filename
         first_user_msg = ""
@@ -447,12 +733,12 @@ class MCPAgent:
                 break
         
         if not first_user_msg:
-            return
+            return None
             
         # Create a filename using the first 30 chars of the first user message and timestamp
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_msg = "".join(c if c.isalnum() else "_" for c in first_user_msg[:30]).strip("_")
-        filename = f"{safe_msg}_{timestamp}.json"
+        filename = f"{safe_msg}_{timestamp}{suffix}.json"
         
         # Prepare the trace data
         trace_data = {
@@ -461,13 +747,30 @@ class MCPAgent:
             "messages": self.conversation_history,
             "tools": self.oa_tools
         }
+        if self.tool_selections:
+            trace_data["tool_selections"] = self.tool_selections
+        if self.failed_tool_calls:
+            trace_data["failed_tool_calls"] = self.failed_tool_calls
+        if self.argument_repairs:
+            trace_data["argument_repairs"] = {"policy": self.json_repair, "calls": list(self.argument_repairs.values())}
+        if extra:
+            trace_data.update(extra)
         
         # Save the trace to a file
         trace_path = self.trace_dir / filename
         with open(trace_path, "w") as f:
             json.dump(trace_data, f, indent=2)
+
+        # Keep the trace catalogue current; a catalogue problem must not lose the trace
+        try:
+            catalog = TraceCatalog(self.trace_dir)
+            catalog.add(trace_path, trace_data)
+            catalog.close()
+        except Exception as exc:
+            console.print(f"[yellow]Could not update trace catalogue: {exc}[/yellow]")
             
         console.print(f"\n[bold blue]Conversation trace saved to:[/bold blue] {trace_path}")
+        return trace_path
     
     # ---------------------------------------------------------------------#
     #  UX helpers                                                          #
@@ -477,6 +780,7 @@ class MCPAgent:
         console.print(f"\n[yellow]Tool call requested:[/yellow] [cyan]{tool_call.name}[/cyan]")
         for k, v in tool_call.arguments.items():
             console.print(f"  • [green]{k}[/green]: {v}")
+        from rich.prompt import Confirm
         return Confirm.ask("Run this tool?")
 
 
@@ -486,14 +790,38 @@ class MCPAgent:
 @click.command()
 @click.option("--config", "-c", default="config.json", help="Path to MCP config file.")
 @click.option("--model", "-m", default="gpt-4o", help="OpenAI chat model name.")
-@click.option("--base-url", help="Custom OpenAI-compatible endpoint.")
+@click.option("--base-url", help="Custom OpenAI-compatible endpoint (comma-separated list to load-balance across replicas).")
 @click.option("--api-key", default="EMPTY", help="Override OPENAI_API_KEY.")
 @click.option("--show-reasoning", is_flag=True, help="Display model reasoning content when available")
 @click.option("--trace-dir", default="traces", help="Directory to save conversation traces")
 @click.option("--system-prompt", is_flag=True, default=False, help="System prompt to use for the conversation")
 @click.option("--system-prompt-file", default="system_prompt.txt", help="Path to file containing system prompt")
 @click.option("--truncate", type=int, help="Truncate tool responses to this many characters")
-def main(config, model, base_url, api_key, show_reasoning, trace_dir, system_prompt, system_prompt_file, truncate):
+@click.option("--tool-top-k", type=int, help="Send only the top-k retrieved tools (plus recently used ones) per turn")
+@click.option("--snapshot-diff", is_flag=True, help="Send page snapshot diffs instead of repeating full snapshots")
+@click.option("--json-repair", type=click.Choice(["repair", "strict"]), default="repair", show_default=True,
+              help="Repair malformed tool-call arguments (trailing commas, unclosed braces, single quotes...) or reject them")
+@click.option("--serve", is_flag=True, help="Run as a multi-session HTTP service instead of the interactive REPL")
+@click.option("--host", default="127.0.0.1", help="Host for --serve")
+@click.option("--port", default=8080, type=int, help="Port for --serve")
+@click.option("--mcp-pool-size", type=int,
+              help="MCP server slots for --serve, one per session, started on demand (default: --max-sessions)")
+@click.option("--max-sessions", default=500, type=int, help="Maximum concurrent sessions for --serve")
+@click.option("--max-concurrent-requests", default=64, type=int, help="Maximum in-flight model requests for --serve")
+@click.option("--fork", "fork_trace_path", help="Sample best-of-N continuations of this trace instead of chatting")
+@click.option("--branches", default=4, type=int, help="Number of continuations for --fork")
+@click.option("--branch-temperature", default=1.0, type=float, help="Sampling temperature for --fork")
+@click.option("--max-tool-rounds", default=25, type=int, help="Tool rounds per branch for --fork")
+@click.option("--no-replay", is_flag=True, help="Don't replay the prefix's tool calls on each --fork branch's servers")
+@click.option("--temperature", type=float, help="Sampling temperature (default: the server's, or 0 with --cache-dir)")
+@click.option("--cache-dir", help="Enable the on-disk response cache in this directory")
+@click.option("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Size limit of the response cache in MB")
+@click.option("--cache-bypass", is_flag=True, help="Skip cache lookups (fresh responses are still stored)")
+@click.option("--cache-sampled", is_flag=True, help="Also cache requests not sent at temperature 0")
+def main(config, model, base_url, api_key, show_reasoning, trace_dir, system_prompt, system_prompt_file, truncate,
+         tool_top_k, snapshot_diff, json_repair, serve, host, port, mcp_pool_size, max_sessions, max_concurrent_requests,
+         fork_trace_path, branches, branch_temperature, max_tool_rounds, no_replay, temperature, cache_dir,
+         cache_max_mb, cache_bypass, cache_sampled):
     """Interactive agent bridging MCP tool servers with OpenAI function calling."""
     
     # Handle system prompt
@@ -511,6 +839,66 @@ def main(config, model, base_url, api_key, show_reasoning, trace_dir, system_pro
             console.print(f"[bold yellow]System prompt file not found:[/bold yellow] {system_prompt_file}")
             console.print("[yellow]Continuing without system prompt.[/yellow]")
     
+    cache = None
+    if cache_dir:
+        cache = ResponseCache(cache_dir, max_bytes=cache_max_mb * 1024 * 1024, bypass=cache_bypass,
+                              cache_sampled=cache_sampled)
+        console.print(f"[bold blue]Response cache:[/bold blue] {cache.path}")
+        if temperature is None:
+            temperature = 0.0                   # only deterministic responses are cached
+            console.print("[blue]Sampling at temperature 0 so responses can be cached (--temperature overrides)[/blue]")
+
+    if serve:
+        import asyncio
+        from agent_service import AgentService, SessionLimits
+
+        service = AgentService(
+            config_path=config,
+            model=model,
+            base_url=base_url,
+            api_key=api_key,
+            trace_dir=trace_dir,
+            system_prompt=final_system_prompt,
+            truncate=truncate,
+            cache=cache,
+            temperature=temperature,
+            tool_top_k=tool_top_k,
+            snapshot_diff=snapshot_diff,
+            json_repair=json_repair,
+            pool_size=mcp_pool_size,
+            limits=SessionLimits(max_sessions=max_sessions, max_concurrent_requests=max_concurrent_requests),
+        )
+        try:
+            asyncio.run(service.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if fork_trace_path:
+        from branching import fork_trace, print_branch_results
+
+        try:
+            results = fork_trace(
+                fork_trace_path,
+                branches=branches,
+                temperature=branch_temperature,
+                max_tool_rounds=max_tool_rounds,
+                replay=not no_replay,
+                config_path=config,
+                model=model,
+                base_url=base_url,
+                api_key=api_key,
+                trace_dir=trace_dir,
+                truncate=truncate,
+                tool_top_k=tool_top_k,
+                snapshot_diff=snapshot_diff,
+                json_repair=json_repair,
+            )
+        except ValueError as exc:
+            raise click.UsageError(str(exc))
+        print_branch_results(results)
+        return
+
     agent = MCPAgent(
         config_path=config,
         model=model,
@@ -520,17 +908,17 @@ def main(config, model, base_url, api_key, show_reasoning, trace_dir, system_pro
         trace_dir=trace_dir,
         system_prompt=final_system_prompt,
         truncate=truncate,
+        cache=cache,
+        temperature=temperature,
+        tool_top_k=tool_top_k,
+        snapshot_diff=snapshot_diff,
+        json_repair=json_repair,
     )
     try:
         agent.chat()
     finally:
         # ensure child processes die
-        for proc, _ in agent.mcp_processes.values():
-            try:
-                proc.terminate()
-                proc.wait(timeout=3)
-            except Exception:
-                proc.kill()
+        agent._stop_mcp_servers()
 
 
 if __name__ == "__main__":
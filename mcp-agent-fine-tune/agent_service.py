@@ -0,0 +1,647 @@
+"""
+Multi-session HTTP service for the MCP agent.
+
+Hosts many independent conversations in one asyncio process. Sessions share:
+  * a pool of MCP server slots (one process, or one HTTP session for servers
+    configured by URL, per configured server; see mcp_http.py), each
+    multiplexing concurrent JSON-RPC requests by request id,
+  * one AsyncOpenAI client (and its connection pool), with a global cap on
+    in-flight model requests,
+  * the discovered tools, compiled schemas and (optional) response cache.
+
+Each session keeps its own MCPAgent for history, tool retrieval, snapshot
+diffing and trace saving, and takes a pool slot for its lifetime that no
+other session uses, so its calls always reach its own browser. Slots are
+started on demand up to the pool size (by default one per allowed session)
+and restarted when their session closes, so the next session starts with a
+fresh browser. When every slot is taken new sessions are refused (429) until
+one closes. Tool calls are auto-approved.
+
+HTTP API (JSON bodies, stdlib asyncio server):
+  POST   /sessions                  {"system_prompt"?}  → {"session_id"}
+  GET    /sessions                                      → session summaries
+  GET    /sessions/{id}                                 → summary + history
+  POST   /sessions/{id}/messages    {"content"}         → 202 {"turn"}
+  GET    /sessions/{id}/events?after=N[&follow=0]       → SSE stream (or JSON list)
+  DELETE /sessions/{id}                                 → saves the trace, frees the slot
+  GET    /health
+
+Events: user_message, reasoning, assistant, tool_call, tool_result, error,
+turn_complete, session_closed — each with a per-session sequence number `seq`.
+
+Started with `uv run agent.py --serve`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from pydantic import BaseModel
+from rich.console import Console
+
+from agent import MCPAgent, MCPToolCall
+from endpoint_pool import make_async_client, session_client
+from mcp_http import HTTPMCPServer, is_http_server
+from response_cache import ResponseCache, acached_chat_completion
+from tool_retrieval import ToolRetriever
+
+console = Console()
+
+
+# -----------------------------------------------------------------------------#
+#  Limits                                                                      #
+# -----------------------------------------------------------------------------#
+class SessionLimits(BaseModel):
+    """Per-session and per-process limits for the service."""
+    max_sessions: int = 500
+    max_turns: int = 200                  # user messages per session
+    max_tool_rounds: int = 25             # model ↔ tool round trips per user message
+    max_message_chars: int = 20000
+    idle_timeout_s: float = 1800.0
+    max_concurrent_requests: int = 64     # in-flight model requests across all sessions
+    tool_timeout_s: float = 120.0
+
+
+# -----------------------------------------------------------------------------#
+#  MCP server pool                                                             #
+# -----------------------------------------------------------------------------#
+class AsyncMCPServer:
+    """One MCP stdio server process; concurrent requests are matched to responses by id."""
+
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.cfg = cfg
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.write_lock = asyncio.Lock()
+        self.reader_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        env = os.environ.copy()
+        env.update(self.cfg.get("env", {}))
+        self.proc = await asyncio.create_subprocess_exec(
+            self.cfg["command"], *self.cfg["args"],
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            env=env,
+            limit=64 * 1024 * 1024,          # page snapshots arrive as single long lines
+        )
+        self.reader_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                break
+            try:
+                msg = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            fut = self.pending.pop(str(msg.get("id")), None)
+            if fut is not None and not fut.done():
+                fut.set_result(msg)
+        for fut in self.pending.values():
+            if not fut.done():
+                fut.set_exception(ConnectionError(f"MCP server {self.name} exited"))
+        self.pending.clear()
+
+    async def request(self, method: str, params: dict, timeout: Optional[float] = None) -> dict:
+        req_id = uuid.uuid4().hex
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = fut
+        req = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
+        try:
+            async with self.write_lock:
+                self.proc.stdin.write((json.dumps(req) + "\n").encode("utf-8"))
+                await self.proc.stdin.drain()
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self.pending.pop(req_id, None)
+
+    async def close(self) -> None:
+        if self.proc and self.proc.returncode is None:
+            self.proc.terminate()
+            try:
+                await asyncio.wait_for(self.proc.wait(), 3)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+        if self.reader_task:
+            self.reader_task.cancel()
+
+
+class AsyncHTTPMCPServer:
+    """The same interface for an MCP server configured by URL; requests run in worker threads."""
+
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.server = HTTPMCPServer(name, cfg)
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.server.connect)
+
+    async def request(self, method: str, params: dict, timeout: Optional[float] = None) -> dict:
+        rsp = await asyncio.to_thread(self.server.request, method, params, timeout)
+        if rsp is None:
+            raise ConnectionError(f"MCP server {self.name} sent no response")
+        return rsp
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.server.close)
+
+
+class MCPPool:
+    """
+    Up to `size` slots, each with its own process (or HTTP session) per
+    configured MCP server. A slot serves one session at a time; slots are
+    started on first use and restarted when a session gives theirs back, so no
+    pages, cookies or snapshots carry over to the next session.
+    """
+
+    def __init__(self, config: dict, size: int = 1):
+        self.config = config.get("mcpServers", {})
+        self.size = max(1, size)
+        self.slots: List[Dict[str, AsyncMCPServer | AsyncHTTPMCPServer]] = []
+        self.free_slots: List[int] = []
+        self.tools: List[dict] = []
+        self._recycling: set = set()
+
+    def _new_slot(self) -> Dict[str, AsyncMCPServer | AsyncHTTPMCPServer]:
+        return {name: (AsyncHTTPMCPServer if is_http_server(cfg) else AsyncMCPServer)(name, cfg)
+                for name, cfg in self.config.items()}
+
+    @staticmethod
+    async def _start_slot(servers: Dict[str, AsyncMCPServer | AsyncHTTPMCPServer]) -> None:
+        results = await asyncio.gather(*(s.start() for s in servers.values()), return_exceptions=True)
+        for name, result in zip(servers, results):
+            if isinstance(result, Exception):
+                console.print(f"[yellow]Could not start MCP server {name}: {result}[/yellow]")
+
+    async def acquire_slot(self) -> Optional[int]:
+        """
+        Take a slot for exclusive use by one session: a free one, one that is
+        being restarted, or a newly started one. None if all are in use.
+        """
+        if not self.config:
+            return -1                   # nothing to isolate: no limit
+        while not self.free_slots and len(self.slots) >= self.size:
+            restarting = [t for t in self._recycling if not t.done()]
+            if not restarting:
+                break
+            await asyncio.wait(restarting, return_when=asyncio.FIRST_COMPLETED)
+        if self.free_slots:
+            return self.free_slots.pop(0)
+        if len(self.slots) >= self.size:
+            return None
+        slot = len(self.slots)
+        self.slots.append(self._new_slot())
+        await self._start_slot(self.slots[slot])
+        return slot
+
+    def release_slot(self, slot: int, recycle: bool = True) -> None:
+        """Give a slot back; it is restarted in the background before the next session gets it."""
+        if slot < 0:
+            return
+        if not recycle:
+            self.free_slots.append(slot)
+            return
+        task = asyncio.create_task(self._recycle(slot))
+        self._recycling.add(task)
+        task.add_done_callback(self._recycling.discard)
+
+    async def _recycle(self, slot: int) -> None:
+        old = self.slots[slot]
+        await asyncio.gather(*(s.close() for s in old.values()), return_exceptions=True)
+        fresh = self._new_slot()
+        await self._start_slot(fresh)
+        self.slots[slot] = fresh
+        self.free_slots.append(slot)
+
+    async def start(self) -> None:
+        """Start the first slot and discover the tools from it."""
+        self.slots.append(self._new_slot())
+        await self._start_slot(self.slots[0])
+        self.free_slots.append(0)
+        for name, server in self.slots[0].items():
+            try:
+                rsp = await server.request("tools/list", {}, timeout=60)
+            except Exception as exc:
+                console.print(f"[yellow]Could not list tools from {name}: {exc}[/yellow]")
+                continue
+            if "error" in rsp:
+                console.print(f"[red]tools/list error from {name}: {rsp['error']}[/red]")
+                continue
+            server_tools = rsp.get("result", {}).get("tools", [])
+            for t in server_tools:
+                t["server"] = name
+            self.tools.extend(server_tools)
+            console.print(f"[green]Discovered {len(server_tools)} tools from {name}.[/green]")
+
+    async def call_tool(self, tool: MCPToolCall, slot: int, timeout: Optional[float] = None) -> Dict[str, Any]:
+        original = next((t for t in self.tools if t["name"] == tool.name), None)
+        if original is None:
+            return {"content": [{"type": "text", "text": f"Tool {tool.name} not found"}], "isError": True}
+
+        server = self.slots[slot][original["server"]]
+        try:
+            rsp = await server.request("tools/call", {"name": tool.name, "arguments": tool.arguments}, timeout)
+        except asyncio.TimeoutError:
+            return {"content": [{"type": "text", "text": "Tool call timed out"}], "isError": True}
+        except ConnectionError as exc:
+            return {"content": [{"type": "text", "text": str(exc)}], "isError": True}
+
+        if "error" in rsp:
+            return {"content": [{"type": "text", "text": str(rsp['error'])}], "isError": True}
+        return rsp.get("result", {})
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._recycling, return_exceptions=True)
+        await asyncio.gather(*(s.close() for servers in self.slots for s in servers.values()))
+
+
+# -----------------------------------------------------------------------------#
+#  Sessions                                                                    #
+# -----------------------------------------------------------------------------#
+class Session:
+    """One conversation: its MCPAgent state, event log and running turn."""
+
+    def __init__(self, session_id: str, agent: MCPAgent, slot: int):
+        self.id = session_id
+        self.agent = agent
+        self.slot = slot
+        self.events: List[dict] = []
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self.turns = 0
+        self.created = time.time()
+        self.last_active = self.created
+
+    @property
+    def busy(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def emit(self, type_: str, **data) -> None:
+        async with self.changed:
+            self.events.append({"seq": len(self.events), "type": type_, "time": time.time(), **data})
+            self.changed.notify_all()
+
+    def summary(self) -> dict:
+        return {
+            "session_id": self.id,
+            "busy": self.busy,
+            "turns": self.turns,
+            "messages": len(self.agent.conversation_history),
+            "events": len(self.events),
+            "created": self.created,
+            "last_active": self.last_active,
+        }
+
+
+class AgentService:
+    """Hosts sessions, runs their turns and serves the HTTP API."""
+
+    def __init__(
+        self,
+        *,
+        config_path: str = "config.json",
+        model: str = "gpt-4.1-mini",
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        trace_dir: str = "traces",
+        system_prompt: Optional[str] = None,
+        truncate: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        temperature: Optional[float] = None,
+        tool_top_k: Optional[int] = None,
+        snapshot_diff: bool = False,
+        json_repair: str = "repair",
+        pool_size: Optional[int] = None,
+        limits: Optional[SessionLimits] = None,
+    ):
+        self.limits = limits or SessionLimits()
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.client = make_async_client(base_url, api_key)     # pooled when base_url lists several replicas
+        self.model_slots = asyncio.Semaphore(self.limits.max_concurrent_requests)
+        self.cache = cache
+        self.sessions: Dict[str, Session] = {}
+
+        # Arguments for each session's MCPAgent. Its sync client is built lazily and the
+        # service never calls it: model requests go through `self.client`.
+        self.agent_kwargs = dict(
+            config_path=config_path, model=model, base_url=base_url, api_key=api_key or "EMPTY",
+            trace_dir=trace_dir, system_prompt=system_prompt,
+            truncate=truncate, temperature=temperature, tool_top_k=tool_top_k, snapshot_diff=snapshot_diff,
+            json_repair=json_repair,
+        )
+        self.prototype = MCPAgent(**self.agent_kwargs)
+        # A slot per session: more slots than sessions would never be used
+        pool_size = min(pool_size or self.limits.max_sessions, self.limits.max_sessions)
+        self.pool = MCPPool(self.prototype.config, pool_size)
+        self._closing = False
+
+    # ---------------------------------------------------------------------#
+    #  Lifecycle                                                           #
+    # ---------------------------------------------------------------------#
+    async def start(self) -> None:
+        await self.pool.start()
+        self.prototype.tools = self.pool.tools
+        self.prototype.oa_tools = self.prototype._mcp_to_openai_tools(self.pool.tools)
+        console.print(f"[bold blue]Total available tools:[/bold blue] {len(self.prototype.oa_tools)}")
+        if self.prototype.tool_top_k and self.prototype.oa_tools:
+            self.prototype.tool_retriever = ToolRetriever(self.prototype.oa_tools)
+        self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def close(self) -> None:
+        self._closing = True                    # slots are shut down, not restarted
+        self._reaper.cancel()
+        for session in list(self.sessions.values()):
+            await self.close_session(session)
+        await self.pool.close()
+        await self.client.close()
+
+    async def _reap_idle(self) -> None:
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.time() - self.limits.idle_timeout_s
+            for session in list(self.sessions.values()):
+                if not session.busy and session.last_active < cutoff:
+                    console.print(f"[yellow]Closing idle session {session.id}[/yellow]")
+                    await self.close_session(session)
+
+    # ---------------------------------------------------------------------#
+    #  Sessions                                                            #
+    # ---------------------------------------------------------------------#
+    async def create_session(self, system_prompt: Optional[str] = None) -> Session:
+        if len(self.sessions) >= self.limits.max_sessions:
+            raise RuntimeError(f"Session limit reached ({self.limits.max_sessions})")
+        slot = await self.pool.acquire_slot()
+        if slot is None:
+            raise RuntimeError(f"All {self.pool.size} MCP slots are in use; close a session or raise --mcp-pool-size")
+
+        kwargs = dict(self.agent_kwargs)
+        if system_prompt is not None:
+            kwargs["system_prompt"] = system_prompt
+        try:
+            agent = MCPAgent(**kwargs)
+        except Exception:
+            self.pool.release_slot(slot, recycle=False)     # never used: no state to clear
+            raise
+
+        # Share the discovered tools and compiled schemas instead of rediscovering
+        agent.tools = self.prototype.tools
+        agent.oa_tools = self.prototype.oa_tools
+        agent.compiled_schemas = self.prototype.compiled_schemas
+        agent.tool_retriever = self.prototype.tool_retriever
+
+        session = Session(uuid.uuid4().hex, agent, slot)
+        self.sessions[session.id] = session
+        return session
+
+    async def close_session(self, session: Session) -> None:
+        if self.sessions.pop(session.id, None) is None:
+            return                                      # already closed (reaper and DELETE can race)
+        if session.task and not session.task.done():
+            session.task.cancel()
+            await asyncio.gather(session.task, return_exceptions=True)
+        try:
+            # Writing the trace and its catalogue row is blocking file and sqlite work
+            await asyncio.to_thread(session.agent._save_conversation_trace)
+        finally:
+            self.pool.release_slot(session.slot, recycle=not self._closing)
+            await session.emit("session_closed")      # wakes any open event streams
+
+    def post_message(self, session: Session, content: str) -> int:
+        if session.busy:
+            raise RuntimeError("Session is still processing the previous message")
+        if session.turns >= self.limits.max_turns:
+            raise RuntimeError(f"Turn limit reached ({self.limits.max_turns})")
+        if len(content) > self.limits.max_message_chars:
+            raise ValueError(f"Message longer than {self.limits.max_message_chars} characters")
+        session.turns += 1
+        session.last_active = time.time()
+        session.task = asyncio.create_task(self._run_turn(session, content))
+        return session.turns
+
+    # ---------------------------------------------------------------------#
+    #  Turn execution                                                      #
+    # ---------------------------------------------------------------------#
+    async def _chat_once(self, agent: MCPAgent):
+        api_messages = agent._prepare_messages_for_api(agent.conversation_history)
+        tools = agent._select_tools()
+        async with self.model_slots:
+            rsp = await acached_chat_completion(
+                session_client(self.client, agent.session_id),
+                self.cache,
+                model=agent.model,
+                messages=api_messages,
+                tools=tools if tools else None,
+                tool_choice="auto",
+                **({} if agent.temperature is None else {"temperature": agent.temperature}),
+            )
+        return rsp.choices[0].message
+
+    async def _run_turn(self, session: Session, content: str) -> None:
+        agent = session.agent
+        agent.conversation_history.append({"role": "user", "content": content})
+        await session.emit("user_message", content=content)
+        try:
+            for _ in range(self.limits.max_tool_rounds + 1):
+                message = await self._chat_once(agent)
+                history_msg = agent._to_history_message(message)
+                agent.conversation_history.append(history_msg)
+                if history_msg.get("reasoning_content"):
+                    await session.emit("reasoning", content=history_msg["reasoning_content"])
+                if history_msg["content"]:
+                    await session.emit("assistant", content=history_msg["content"])
+
+                tool_calls = getattr(message, "tool_calls", None)
+                if not tool_calls:
+                    break
+                for tc in tool_calls:
+                    await self._run_tool_call(session, tc)
+            else:
+                await session.emit("error", message=f"Stopped after {self.limits.max_tool_rounds} tool rounds")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await session.emit("error", message=str(exc))
+        finally:
+            session.last_active = time.time()
+        await session.emit("turn_complete", turn=session.turns)
+
+    async def _run_tool_call(self, session: Session, tc) -> None:
+        agent = session.agent
+        try:
+            mcp_call = agent._convert_oa_toolcall_to_mcp(tc)
+        except (json.JSONDecodeError, ValueError) as exc:
+            result = {"content": [{"type": "text", "text": f"Could not parse tool arguments: {exc}"}], "isError": True}
+            wrapped = agent._wrap_tool_result(tc.id, result)
+            agent.conversation_history.append(wrapped)
+            await session.emit("tool_result", tool_call_id=tc.id, name=tc.function.name,
+                               content=wrapped["content"], is_error=True)
+            return
+
+        await session.emit("tool_call", tool_call_id=tc.id, name=mcp_call.name, arguments=mcp_call.arguments)
+        result = agent._validate_tool_call(mcp_call)
+        if result is None:
+            result = await self.pool.call_tool(mcp_call, session.slot, self.limits.tool_timeout_s)
+        wrapped = agent._wrap_tool_result(tc.id, result, tool_name=mcp_call.name)
+        agent.conversation_history.append(wrapped)
+        await session.emit("tool_result", tool_call_id=tc.id, name=mcp_call.name,
+                           content=wrapped["content"], is_error=bool(result.get("isError")))
+
+    # ---------------------------------------------------------------------#
+    #  HTTP                                                                #
+    # ---------------------------------------------------------------------#
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        await self.start()
+        server = await asyncio.start_server(self._handle, host, port, limit=1024 * 1024)
+        console.print(f"[bold magenta]MCP Agent service listening on http://{host}:{port}[/bold magenta]")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.close()
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, body: Any) -> None:
+        reasons = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                   405: "Method Not Allowed", 409: "Conflict", 429: "Too Many Requests", 500: "Internal Server Error"}
+        data = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("ascii")
+            + data
+        )
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0) or 0)
+            raw = await reader.readexactly(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else {}
+            except json.JSONDecodeError:
+                await self._send_json(writer, 400, {"error": "Body is not valid JSON"})
+                return
+            url = urlsplit(target)
+            await self._route(method.upper(), url.path, parse_qs(url.query), body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as exc:
+            try:
+                await self._send_json(writer, 500, {"error": str(exc)})
+            except Exception:
+                pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _route(self, method: str, path: str, query: dict, body: dict, writer) -> None:
+        parts = [p for p in path.split("/") if p]
+
+        if parts == ["health"]:
+            await self._send_json(writer, 200, {"status": "ok", "sessions": len(self.sessions),
+                                                "tools": len(self.prototype.oa_tools)})
+            return
+
+        if parts == ["sessions"]:
+            if method == "POST":
+                try:
+                    session = await self.create_session(body.get("system_prompt"))
+                except RuntimeError as exc:
+                    await self._send_json(writer, 429, {"error": str(exc)})
+                    return
+                await self._send_json(writer, 201, {"session_id": session.id})
+            elif method == "GET":
+                await self._send_json(writer, 200, [s.summary() for s in self.sessions.values()])
+            else:
+                await self._send_json(writer, 405, {"error": f"{method} not allowed"})
+            return
+
+        if not parts or parts[0] != "sessions" or len(parts) > 3:
+            await self._send_json(writer, 404, {"error": f"Unknown path {path}"})
+            return
+
+        session = self.sessions.get(parts[1])
+        if session is None:
+            await self._send_json(writer, 404, {"error": f"Unknown session {parts[1]}"})
+            return
+
+        if len(parts) == 2:
+            if method == "GET":
+                await self._send_json(writer, 200, {**session.summary(), "history": session.agent.conversation_history})
+            elif method == "DELETE":
+                await self.close_session(session)
+                await self._send_json(writer, 200, {"closed": session.id})
+            else:
+                await self._send_json(writer, 405, {"error": f"{method} not allowed"})
+        elif parts[2] == "messages" and method == "POST":
+            content = body.get("content")
+            if not isinstance(content, str) or not content:
+                await self._send_json(writer, 400, {"error": "Body must contain a non-empty 'content' string"})
+                return
+            try:
+                turn = self.post_message(session, content)
+            except ValueError as exc:
+                await self._send_json(writer, 400, {"error": str(exc)})
+                return
+            except RuntimeError as exc:
+                await self._send_json(writer, 409, {"error": str(exc)})
+                return
+            await self._send_json(writer, 202, {"session_id": session.id, "turn": turn})
+        elif parts[2] == "events" and method == "GET":
+            try:
+                after = int(query.get("after", ["-1"])[0])
+            except ValueError:
+                await self._send_json(writer, 400, {"error": "'after' must be an integer"})
+                return
+            if query.get("follow", ["1"])[0] == "0":
+                await self._send_json(writer, 200, [e for e in session.events if e["seq"] > after])
+            else:
+                await self._stream_events(session, after, writer)
+        else:
+            await self._send_json(writer, 404, {"error": f"Unknown path {path}"})
+
+    async def _stream_events(self, session: Session, after: int, writer: asyncio.StreamWriter) -> None:
+        """Server-sent events from `after` onwards until the client disconnects or the session closes."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+        next_seq = after + 1
+        while session.id in self.sessions:
+            async with session.changed:
+                if next_seq >= len(session.events):
+                    try:
+                        await asyncio.wait_for(session.changed.wait(), 15)
+                    except asyncio.TimeoutError:
+                        pass
+                pending = session.events[next_seq:]
+            if not pending:
+                writer.write(b": keep-alive\n\n")
+            for event in pending:
+                writer.write(f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+            next_seq += len(pending)
+            await writer.drain()
@@ -0,0 +1,263 @@
+"""
+Best-of-N branching trace generation from a recorded conversation prefix.
+
+A trace is sliced the same way `test_trace_reload.prepare_messages_for_api`
+does it: everything before the last assistant message is the shared prefix.
+From there N continuations are sampled in parallel:
+
+  * the first assistant step of every branch comes from ONE request with
+    `n=N`, so the shared prefix is prefilled once (servers that ignore `n`
+    or return fewer choices are topped up with single requests, which still
+    benefit from prefix caching on vLLM/SGLang),
+  * each branch then runs on its own MCPAgent with its own MCP server
+    processes (or sessions, for servers configured by URL), auto-approving tool calls until the model answers without
+    calling a tool or `max_tool_rounds` is reached,
+  * before branching, each branch replays the prefix's tool calls that ran
+    and succeeded on its fresh servers so browser state (current page, open
+    tabs) matches the recorded conversation; the recorded tool results stay
+    in the history.
+
+Branches that finish with a final answer are saved as separate traces, with
+a `branch` field recording the source trace and branch settings.
+
+Started with `uv run agent.py --fork traces/<trace>.json --branches 4`.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+from agent import MCPAgent, MCPToolCall
+from partial_json import parse_tool_arguments
+from test_trace_reload import load_trace, prepare_messages_for_api
+
+console = Console()
+
+# Tool results the agent writes itself when a call was rejected or never reached
+# a server; traces saved before `failed_tool_calls` was recorded only have these
+_FAILED_RESULTS = ("User rejected tool call.", "Invalid JSON arguments:", "Could not parse tool arguments:",
+                   "Tool call timed out", "No response")
+
+
+def _quiet(_: str) -> None:
+    pass
+
+
+def _replay_prefix_tools(agent: MCPAgent, prefix: List[Dict[str, Any]], failed: Set[str] = frozenset()) -> int:
+    """
+    Re-run the prefix's tool calls that ran and succeeded on this agent's
+    servers; returns the number replayed. Calls without a tool message, calls
+    in `failed` (the trace's `failed_tool_calls`), calls the agent answered
+    itself (rejected, unparseable, timed out) and calls that fail the tool's
+    schema are skipped, since they never changed the server's state.
+    """
+    results = {m.get("tool_call_id"): m.get("content") for m in prefix if m.get("role") == "tool"}
+    replayed = 0
+    for msg in prefix:
+        if msg.get("role") != "assistant":
+            continue
+        for tc in msg.get("tool_calls") or []:
+            content = results.get(tc.get("id"))
+            if content is None or tc.get("id") in failed:
+                continue
+            if isinstance(content, str) and content.startswith(_FAILED_RESULTS):
+                continue
+            fn = tc.get("function", {})
+            try:
+                args, _ = parse_tool_arguments(fn.get("arguments") or {}, agent.json_repair)
+            except json.JSONDecodeError:
+                continue
+            call = MCPToolCall(name=fn.get("name", ""), arguments=args)
+            if agent._validate_tool_call(call) is not None:
+                continue
+            agent._execute_mcp_tool(call)
+            replayed += 1
+    return replayed
+
+
+def _sample(agent: MCPAgent, temperature: float, n: int = 1) -> List[Any]:
+    """One chat completion for the agent's current history; returns the choices' messages."""
+    tools = agent._select_tools()
+    rsp = agent.client.chat.completions.create(
+        model=agent.model,
+        messages=agent._prepare_messages_for_api(agent.conversation_history),
+        tools=tools if tools else None,
+        tool_choice="auto",
+        temperature=temperature,
+        n=n,
+    )
+    return [choice.message for choice in rsp.choices]
+
+
+def _run_branch(agent: MCPAgent, first_message: Any, temperature: float, max_tool_rounds: int) -> Dict[str, Any]:
+    """Continue one branch from its first sampled assistant message."""
+    result: Dict[str, Any] = {"tool_rounds": 0, "tool_errors": 0, "success": False, "error": None}
+    message = first_message
+    try:
+        while True:
+            agent.conversation_history.append(agent._to_history_message(message))
+            tool_calls = getattr(message, "tool_calls", None)
+            if not tool_calls:
+                result["success"] = bool(message.content)
+                if not result["success"]:
+                    result["error"] = "empty final answer"
+                return result
+            if result["tool_rounds"] >= max_tool_rounds:
+                result["error"] = f"tool round limit ({max_tool_rounds}) reached"
+                return result
+
+            tool_msgs: List[Optional[Dict[str, Any]]] = []
+            valid: List[Tuple[int, Any, MCPToolCall]] = []
+            for tc in tool_calls:
+                try:
+                    mcp_call = agent._convert_oa_toolcall_to_mcp(tc)
+                except json.JSONDecodeError as exc:
+                    mcp_result = {"content": [{"type": "text", "text": f"Invalid JSON arguments: {exc}"}], "isError": True}
+                    tool_msgs.append(agent._wrap_tool_result(tc.id, mcp_result))
+                    result["tool_errors"] += 1
+                    continue
+                invalid = agent._validate_tool_call(mcp_call)
+                if invalid is not None:
+                    tool_msgs.append(agent._wrap_tool_result(tc.id, invalid, tool_name=mcp_call.name))
+                    result["tool_errors"] += 1
+                    continue
+                valid.append((len(tool_msgs), tc, mcp_call))
+                tool_msgs.append(None)
+
+            # Read-only calls to the same server go out together (see MCPAgent._execute_mcp_tools)
+            for (index, tc, mcp_call), mcp_result in zip(valid, agent._execute_mcp_tools([c for _, _, c in valid])):
+                if mcp_result.get("isError"):
+                    result["tool_errors"] += 1
+                tool_msgs[index] = agent._wrap_tool_result(tc.id, mcp_result, tool_name=mcp_call.name)
+            agent.conversation_history.extend(tool_msgs)
+            result["tool_rounds"] += 1
+
+            message = _sample(agent, temperature)[0]
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+        return result
+
+
+def fork_trace(
+    trace_path: str,
+    *,
+    branches: int = 4,
+    temperature: float = 1.0,
+    max_tool_rounds: int = 25,
+    replay: bool = True,
+    **agent_kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    Sample `branches` continuations of the trace at `trace_path` and save the
+    successful ones. `agent_kwargs` are passed to every branch's MCPAgent.
+    Returns one result dict per branch.
+    """
+    if branches < 1:
+        raise ValueError(f"branches must be at least 1, got {branches}")
+    trace = load_trace(Path(trace_path))
+    if trace is None:
+        raise ValueError(f"Could not load trace {trace_path}")
+    prefix, _ = prepare_messages_for_api(trace.get("messages", []))
+    if not any(m.get("role") == "user" for m in prefix):
+        raise ValueError(f"Trace {trace_path} has no user message before its last assistant message")
+
+    # The prefix carries the system prompt, so branch agents don't add their own
+    agent_kwargs = {**agent_kwargs, "system_prompt": None}
+    agents = [MCPAgent(**agent_kwargs)]
+    agents[0]._discover_all_tools()
+    for _ in range(branches - 1):
+        agent = MCPAgent(**agent_kwargs, client=agents[0].client)
+        # Share the discovered tools; each agent starts its own server processes
+        agent.tools = agents[0].tools
+        agent.oa_tools = agents[0].oa_tools
+        agent.compiled_schemas = agents[0].compiled_schemas
+        agent.tool_retriever = agents[0].tool_retriever
+        agents.append(agent)
+    prefix_ids = {m.get("tool_call_id") for m in prefix if m.get("role") == "tool"}
+    failed_ids = [i for i in trace.get("failed_tool_calls", []) if i in prefix_ids]
+    failed = set(failed_ids)
+    for agent in agents:
+        agent.conversation_history = copy.deepcopy(prefix)
+        agent.failed_tool_calls = list(failed_ids)
+
+    def prepare(agent: MCPAgent) -> int:
+        for name in agent.config.get("mcpServers", {}):
+            agent._connect_mcp_server(name, log=_quiet)
+        return _replay_prefix_tools(agent, prefix, failed) if replay else 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=branches) as pool:
+            # Start servers and replay while the shared-prefix request is in flight
+            prepared = [pool.submit(prepare, agent) for agent in agents]
+
+            try:
+                first_messages = _sample(agents[0], temperature, n=branches)[:branches]
+            except Exception as exc:
+                console.print(f"[yellow]n={branches} request failed ({exc}); sampling branches separately[/yellow]")
+                first_messages = []
+            shared = len(first_messages)
+            missing = [pool.submit(_sample, agent, temperature) for agent in agents[shared:]]
+            first_messages += [f.result()[0] for f in missing]
+
+            # Every agent's history now has the same prefix; record the tool selection for the others too
+            for agent in agents[1:shared]:
+                agent.tool_selections = copy.deepcopy(agents[0].tool_selections)
+
+            replayed = [f.result() for f in prepared][0]
+            console.print(
+                f"[blue]Forked {len(prefix)} prefix messages into {branches} branches "
+                f"({shared} from one n={branches} request, {replayed} prefix tool calls replayed per branch)[/blue]"
+            )
+
+            outcomes = list(pool.map(
+                lambda pair: _run_branch(pair[0], pair[1], temperature, max_tool_rounds),
+                zip(agents, first_messages),
+            ))
+
+        results = []
+        for index, (agent, outcome) in enumerate(zip(agents, outcomes)):
+            outcome["branch"] = index
+            outcome["trace"] = None
+            if outcome["success"]:
+                saved = agent._save_conversation_trace(
+                    extra={"branch": {
+                        "source": str(trace_path),
+                        "prefix_messages": len(prefix),
+                        "index": index,
+                        "branches": branches,
+                        "temperature": temperature,
+                        "shared_prefill": index < shared,
+                        "tool_rounds": outcome["tool_rounds"],
+                        "tool_errors": outcome["tool_errors"],
+                    }},
+                    suffix=f"_b{index}",
+                )
+                outcome["trace"] = str(saved) if saved else None
+            results.append(outcome)
+        return results
+    finally:
+        for agent in agents:
+            agent._stop_mcp_servers()
+
+
+def print_branch_results(results: List[Dict[str, Any]]) -> None:
+    table = Table(title="Branches")
+    table.add_column("#", justify="right")
+    table.add_column("Status")
+    table.add_column("Tool rounds", justify="right")
+    table.add_column("Tool errors", justify="right")
+    table.add_column("Trace / error")
+    for r in results:
+        status = "[green]kept[/green]" if r["success"] else "[red]dropped[/red]"
+        table.add_row(str(r["branch"]), status, str(r["tool_rounds"]), str(r["tool_errors"]),
+                      r["trace"] or r["error"] or "")
+    console.print(table)
+    kept = sum(r["success"] for r in results)
+    console.print(f"[bold]{kept}/{len(results)} branches kept[/bold]")
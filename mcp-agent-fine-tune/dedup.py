@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for MCP Agent conversation traces.
+
+Builds MinHash signatures over each trace's user prompts and tool-call
+sequence, buckets them with LSH banding, and drops any trace whose estimated
+Jaccard similarity to an already-kept trace is above a threshold.
+
+Signatures use one-permutation hashing (each shingle is hashed once) with
+rotation densification, so building a signature is linear in the trace size
+and checking a trace against the index only touches its LSH buckets.
+
+The index is a small SQLite file, so new traces are checked incrementally
+against everything kept on previous runs.
+
+Usage:
+  uv run dedup.py [--trace-dir="traces"] [--threshold=0.8] [--index="dedup_index.sqlite"]
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import re
+import sqlite3
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Any, Optional, Set, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.8
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def _recorded_at(item: Dict[str, Any]) -> float:
+    """When a trace was recorded: its `timestamp` field (YYYYmmdd_HHMMSS), else the file mtime."""
+    try:
+        return datetime.datetime.strptime(str(item["trace"].get("timestamp", "")), "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return item.get("mtime", float("inf"))
+
+
+# -----------------------------------------------------------------------------#
+#  Shingling                                                                   #
+# -----------------------------------------------------------------------------#
+def _canonical_args(args: Any) -> str:
+    """Tool-call arguments as a stable string, whether stored parsed or raw."""
+    if isinstance(args, str):
+        try:
+            args = json.loads(args)
+        except json.JSONDecodeError:
+            return args
+    return json.dumps(args, sort_keys=True)
+
+
+def trace_shingles(trace: Dict[str, Any], ngram: int = 3) -> Set[str]:
+    """
+    Shingle a trace into a set of strings.
+
+    User prompts contribute word n-grams; the tool-call sequence contributes
+    each call (name + canonical arguments) and consecutive tool-name bigrams,
+    so two sessions match when they ask the same thing and do the same thing.
+    """
+    shingles: Set[str] = set()
+    tool_names: List[str] = []
+
+    for msg in trace.get("messages", []):
+        role = msg.get("role")
+        if role == "user" and isinstance(msg.get("content"), str):
+            words = _WORD_RE.findall(msg["content"].lower())
+            if len(words) < ngram:
+                if words:
+                    shingles.add("u:" + " ".join(words))
+                continue
+            for i in range(len(words) - ngram + 1):
+                shingles.add("u:" + " ".join(words[i:i + ngram]))
+        elif role == "assistant":
+            for tc in msg.get("tool_calls") or []:
+                fn = tc.get("function", {})
+                name = fn.get("name", "")
+                tool_names.append(name)
+                shingles.add(f"c:{name}:{_canonical_args(fn.get('arguments', {}))}")
+
+    for a, b in zip(tool_names, tool_names[1:]):
+        shingles.add(f"t:{a}>{b}")
+    if tool_names:
+        shingles.add("t:^" + tool_names[0])
+
+    return shingles
+
+
+# -----------------------------------------------------------------------------#
+#  MinHash                                                                     #
+# -----------------------------------------------------------------------------#
+def minhash_signature(shingles: Iterable[str], num_perm: int = DEFAULT_NUM_PERM) -> Optional[Tuple[int, ...]]:
+    """
+    One-permutation MinHash signature with rotation densification.
+
+    Returns None for an empty shingle set (nothing to compare on).
+    """
+    bins = [_MAX_HASH + 1] * num_perm
+    empty = True
+    for s in shingles:
+        h = int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        idx = h % num_perm
+        value = (h >> 32) & _MAX_HASH
+        if value < bins[idx]:
+            bins[idx] = value
+        empty = False
+
+    if empty:
+        return None
+
+    # Fill empty bins from the nearest non-empty bin to the right (circular),
+    # offset by the distance so borrowed values stay distinguishable.
+    filled = list(bins)
+    for i in range(num_perm):
+        if bins[i] <= _MAX_HASH:
+            continue
+        for dist in range(1, num_perm):
+            j = (i + dist) % num_perm
+            if bins[j] <= _MAX_HASH:
+                filled[i] = (bins[j] + dist * 0x9E3779B1) & _MAX_HASH
+                break
+    return tuple(filled)
+
+
+def estimate_jaccard(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity: fraction of equal signature slots."""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows <= num_perm whose LSH S-curve
+    minimises false positives below and false negatives above the threshold.
+    """
+    def _integrate(f, lo, hi, steps=200):
+        step = (hi - lo) / steps
+        return sum(f(lo + (i + 0.5) * step) for i in range(steps)) * step
+
+    best, best_err = (1, num_perm), float("inf")
+    for b in range(1, num_perm + 1):
+        r = num_perm // b
+        if r == 0:
+            break
+        fp = _integrate(lambda s: 1 - (1 - s ** r) ** b, 0.0, threshold)
+        fn = _integrate(lambda s: (1 - s ** r) ** b, threshold, 1.0)
+        if fp + fn < best_err:
+            best, best_err = (b, r), fp + fn
+    return best
+
+
+# -----------------------------------------------------------------------------#
+#  Persistent LSH index                                                        #
+# -----------------------------------------------------------------------------#
+class TraceDeduplicator:
+    """
+    MinHash/LSH index of kept traces, backed by SQLite.
+
+    Only traces that are kept are added to the index, so re-running over the
+    same directory is idempotent: kept traces are found by key and kept again,
+    duplicates are matched against the same representatives as before.
+    """
+
+    def __init__(
+        self,
+        index_path: Optional[str] = None,
+        *,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+    ):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        self.db = sqlite3.connect(index_path or ":memory:")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS signatures (key TEXT PRIMARY KEY, sig BLOB);
+            CREATE TABLE IF NOT EXISTS buckets (band INTEGER, bucket INTEGER, key TEXT);
+            CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, bucket);
+            """
+        )
+        self._check_meta()
+
+    def _check_meta(self) -> None:
+        """
+        Store index parameters on first use. An existing index keeps its own
+        banding (the threshold only changes verification); a different
+        signature length cannot be mixed in.
+        """
+        params = {"num_perm": str(self.num_perm), "bands": str(self.bands), "rows": str(self.rows)}
+        stored = dict(self.db.execute("SELECT key, value FROM meta"))
+        if not stored:
+            self.db.executemany("INSERT INTO meta VALUES (?, ?)", params.items())
+            self.db.commit()
+        elif stored["num_perm"] != params["num_perm"]:
+            raise ValueError(
+                f"Dedup index was built with num_perm={stored['num_perm']}, not {self.num_perm}. "
+                "Use a fresh index file."
+            )
+        else:
+            self.bands, self.rows = int(stored["bands"]), int(stored["rows"])
+
+    def _band_buckets(self, sig: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        out = []
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f"<{len(chunk)}I", *chunk), digest_size=8).digest()
+            out.append((band, int.from_bytes(digest, "little", signed=True)))
+        return out
+
+    def _load_sig(self, blob: bytes) -> Tuple[int, ...]:
+        return struct.unpack(f"<{self.num_perm}I", blob)
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def check(self, key: str, trace: Dict[str, Any], *, add: bool = True) -> Optional[Tuple[str, float]]:
+        """
+        Check one trace against the index.
+
+        Returns (duplicate_of_key, similarity) for a near-duplicate, otherwise
+        None — and, if `add` is set, indexes the trace as a new representative.
+        """
+        if self.db.execute("SELECT 1 FROM signatures WHERE key = ?", (key,)).fetchone():
+            return None
+
+        sig = minhash_signature(trace_shingles(trace), self.num_perm)
+        if sig is None:
+            return None
+
+        buckets = self._band_buckets(sig)
+        candidates: Set[str] = set()
+        for band, bucket in buckets:
+            rows = self.db.execute("SELECT key FROM buckets WHERE band = ? AND bucket = ?", (band, bucket))
+            candidates.update(k for (k,) in rows)
+
+        best: Optional[Tuple[str, float]] = None
+        for cand in sorted(candidates):
+            (blob,) = self.db.execute("SELECT sig FROM signatures WHERE key = ?", (cand,)).fetchone()
+            sim = estimate_jaccard(sig, self._load_sig(blob))
+            if sim >= self.threshold and (best is None or sim > best[1]):
+                best = (cand, sim)
+
+        if best is None and add:
+            self.db.execute("INSERT INTO signatures VALUES (?, ?)", (key, struct.pack(f"<{self.num_perm}I", *sig)))
+            self.db.executemany(
+                "INSERT INTO buckets VALUES (?, ?, ?)",
+                [(band, bucket, key) for band, bucket in buckets],
+            )
+        return best
+
+    def filter(self, traces: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split `load_traces`-style items ({"filename", "trace", optional
+        "mtime"}) into kept and dropped. Traces are visited oldest first (see
+        `_recorded_at`, ties by filename) so the earliest copy wins regardless
+        of directory listing order. Dropped items gain "duplicate_of" and
+        "similarity" keys.
+        """
+        kept, dropped = [], []
+        for item in sorted(traces, key=lambda t: (_recorded_at(t), t["filename"])):
+            match = self.check(item["filename"], item["trace"])
+            if match is None:
+                kept.append(item)
+            else:
+                dropped.append({**item, "duplicate_of": match[0], "similarity": match[1]})
+        self.db.commit()
+        return kept, dropped
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+
+def dedup_traces(
+    traces: List[Dict[str, Any]],
+    *,
+    threshold: float = DEFAULT_THRESHOLD,
+    index_path: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Convenience wrapper: filter traces through a (possibly persistent) index."""
+    dedup = TraceDeduplicator(index_path, threshold=threshold)
+    try:
+        return dedup.filter(traces)
+    finally:
+        dedup.close()
+
+
+def print_dropped(dropped: List[Dict[str, Any]]) -> None:
+    """Render the dropped traces and what they duplicate."""
+    if not dropped:
+        console.print("[green]No near-duplicate traces found[/green]")
+        return
+    table = Table(title=f"{len(dropped)} near-duplicate trace(s)")
+    table.add_column("Trace")
+    table.add_column("Duplicate of")
+    table.add_column("Similarity", justify="right")
+    for item in dropped:
+        table.add_row(item["filename"], item["duplicate_of"], f"{item['similarity']:.2f}")
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate MCP Agent traces")
+    parser.add_argument("--trace-dir", default="traces", help="Directory containing trace files (default: 'traces')")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Estimated Jaccard similarity above which a trace is a duplicate (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--index", default=None,
+                        help="SQLite index file to check against and update incrementally (default: in-memory)")
+
+    args = parser.parse_args()
+
+    trace_path = Path(args.trace_dir)
+    if not trace_path.is_dir():
+        console.print(f"[red]Error: Trace directory '{args.trace_dir}' does not exist[/red]")
+        return
+
+    traces = []
+    for trace_file in trace_path.glob("*.json"):
+        try:
+            with open(trace_file, "r") as f:
+                traces.append({"filename": trace_file.name, "trace": json.load(f), "mtime": trace_file.stat().st_mtime})
+        except Exception as e:
+            console.print(f"[red]Error loading {trace_file}: {e}[/red]")
+
+    try:
+        kept, dropped = dedup_traces(traces, threshold=args.threshold, index_path=args.index)
+    except ValueError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        return
+    console.print(f"[blue]Checked {len(traces)} traces: kept {len(kept)}, dropped {len(dropped)}[/blue]")
+    print_dropped(dropped)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+"""
+Load balancing across several OpenAI-compatible endpoints (e.g. vLLM replicas).
+
+`--base-url` takes a comma-separated list of base URLs. With one URL the
+scripts use a plain OpenAI / AsyncOpenAI client; with several they use a
+pooled client with the same `chat.completions.create` surface:
+
+  * requests carrying a session key (conversation, trace, fork) go to the
+    replica that owns the key on a consistent-hash ring, so the replica's
+    prefix cache stays warm for that conversation and adding or removing a
+    replica only moves the sessions it owned,
+  * requests without a key, or whose owner already has `max_outstanding`
+    requests in flight, go to the replica with the fewest requests in flight,
+  * connection errors and 5xx responses are retried on another replica; a
+    replica that fails `eject_after` times in a row is ejected for `eject_s`
+    seconds, and a background thread polls `GET /models` on every replica
+    to eject ones that fail `eject_after_probes` probes in a row and bring
+    recovered ones back.
+
+If every replica is ejected, requests are still sent (to the least loaded
+one) rather than failing outright.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Iterator, List, Optional
+
+RING_REPLICAS = 64          # virtual nodes per endpoint on the hash ring
+
+
+def parse_base_urls(spec: Optional[str]) -> List[str]:
+    """Split a comma-separated `--base-url` value; empty entries are dropped."""
+    return [u.strip().rstrip("/") for u in (spec or "").split(",") if u.strip()]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class Endpoint:
+    """One replica: its clients plus routing and health state."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.client = None                  # OpenAI, built on first sync use
+        self.aclient = None                 # AsyncOpenAI, built on first async use
+        self.outstanding = 0
+        self.failures = 0                   # consecutive failed requests
+        self.probe_failures = 0             # consecutive failed health probes
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+
+class EndpointRouter:
+    """Routing, failure tracking and health checks shared by the sync and async pooled clients."""
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        api_key: Optional[str] = None,
+        *,
+        max_outstanding: int = 64,
+        eject_after: int = 3,
+        eject_s: float = 30.0,
+        eject_after_probes: int = 3,
+        health_interval_s: float = 10.0,
+        **client_kwargs: Any,
+    ):
+        if not base_urls:
+            raise ValueError("At least one base URL is required")
+        self.endpoints = [Endpoint(url) for url in base_urls]
+        self.api_key = api_key or "EMPTY"
+        self.max_outstanding = max_outstanding
+        self.eject_after = eject_after
+        self.eject_s = eject_s
+        self.eject_after_probes = eject_after_probes
+        self.client_kwargs = {"max_retries": 0, **client_kwargs}     # failover replaces per-client retries
+        self._lock = threading.RLock()     # re-entrant: a collected stream may release from inside a locked section
+
+        self._ring = sorted(
+            (_hash(f"{ep.base_url}#{i}"), idx)
+            for idx, ep in enumerate(self.endpoints)
+            for i in range(RING_REPLICAS)
+        )
+        self._ring_keys = [h for h, _ in self._ring]
+
+        self._stop = threading.Event()
+        self._health_thread = None
+        if health_interval_s > 0:
+            self._health_thread = threading.Thread(
+                target=self._health_loop, args=(health_interval_s,), name="endpoint-health", daemon=True)
+            self._health_thread.start()
+
+    @property
+    def label(self) -> str:
+        """Stands in for `client.base_url` (e.g. in response cache keys)."""
+        return ",".join(ep.base_url for ep in self.endpoints)
+
+    # ---------------------------------------------------------------------#
+    #  Routing                                                             #
+    # ---------------------------------------------------------------------#
+    def _owner(self, key: str, candidates: List[Endpoint]) -> Endpoint:
+        """First candidate clockwise from the key on the hash ring."""
+        start = bisect.bisect(self._ring_keys, _hash(key))
+        for i in range(len(self._ring)):
+            ep = self.endpoints[self._ring[(start + i) % len(self._ring)][1]]
+            if ep in candidates:
+                return ep
+        return candidates[0]
+
+    def acquire(self, session_key: Optional[str] = None, exclude: Optional[List[Endpoint]] = None) -> Endpoint:
+        """Pick an endpoint for one request and count it as in flight."""
+        with self._lock:
+            pool = [ep for ep in self.endpoints if not exclude or ep not in exclude] or self.endpoints
+            candidates = [ep for ep in pool if ep.available] or pool
+            least_loaded = min(candidates, key=lambda ep: ep.outstanding)
+            chosen = least_loaded
+            if session_key is not None:
+                owner = self._owner(session_key, candidates)
+                if owner.outstanding < self.max_outstanding:
+                    chosen = owner
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def release(self, ep: Endpoint, ok: Optional[bool]) -> None:
+        """Count a request as finished; `ok=None` says nothing about the replica's health."""
+        with self._lock:
+            ep.outstanding -= 1
+            if ok is not None:
+                self._record(ep, ok)
+
+    def _record(self, ep: Endpoint, ok: bool) -> None:
+        if ok:
+            ep.failures = 0
+            ep.ejected_until = 0.0
+            return
+        ep.errors += 1
+        ep.failures += 1
+        if ep.failures >= self.eject_after:
+            ep.ejected_until = time.monotonic() + self.eject_s
+
+    @staticmethod
+    def is_endpoint_failure(exc: BaseException) -> bool:
+        """Errors that say something about the replica rather than the request."""
+        import openai
+
+        if isinstance(exc, openai.APIConnectionError):          # includes timeouts
+            return True
+        return isinstance(exc, openai.APIStatusError) and (exc.status_code >= 500 or exc.status_code == 429)
+
+    # ---------------------------------------------------------------------#
+    #  Health checks                                                       #
+    # ---------------------------------------------------------------------#
+    def check_health(self, timeout: float = 5.0) -> None:
+        """Probe `GET /models` on every endpoint and update its state."""
+        for ep in self.endpoints:
+            req = urllib.request.Request(f"{ep.base_url}/models", headers={"Authorization": f"Bearer {self.api_key}"})
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as rsp:
+                    ok = rsp.status < 500
+            except urllib.error.HTTPError as exc:
+                ok = exc.code < 500
+            except Exception:
+                ok = False
+            with self._lock:
+                if ok:
+                    ep.probe_failures = 0
+                    self._record(ep, True)
+                    continue
+                # One slow probe (e.g. a replica busy with long prefills) isn't enough to eject
+                ep.probe_failures += 1
+                if ep.probe_failures >= self.eject_after_probes and ep.available:
+                    ep.errors += 1
+                    ep.ejected_until = time.monotonic() + self.eject_s
+
+    def _health_loop(self, interval: float) -> None:
+        while True:
+            self.check_health()
+            if self._stop.wait(interval):
+                return
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{
+                "base_url": ep.base_url,
+                "requests": ep.requests,
+                "errors": ep.errors,
+                "outstanding": ep.outstanding,
+                "ejected": not ep.available,
+            } for ep in self.endpoints]
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+# -----------------------------------------------------------------------------#
+#  Client facades                                                              #
+# -----------------------------------------------------------------------------#
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+
+class _Chat:
+    def __init__(self, create):
+        self.completions = _Completions(create)
+
+
+class PooledOpenAI:
+    """Drop-in for `OpenAI` (chat completions only) that routes across endpoints."""
+
+    def __init__(self, router: EndpointRouter, session_key: Optional[str] = None):
+        self.router = router
+        self.session_key = session_key
+        self.base_url = router.label
+        self.api_key = router.api_key
+        self.chat = _Chat(self._create)
+
+    def for_session(self, session_key: str) -> "PooledOpenAI":
+        """A view of the same pool that routes with affinity to `session_key`."""
+        return PooledOpenAI(self.router, session_key)
+
+    def _client(self, ep: Endpoint):
+        with self.router._lock:
+            if ep.client is None:
+                from openai import OpenAI
+                ep.client = OpenAI(api_key=self.router.api_key, base_url=ep.base_url, **self.router.client_kwargs)
+            return ep.client
+
+    def _create(self, **kwargs: Any) -> Any:
+        tried: List[Endpoint] = []
+        while True:
+            ep = self.router.acquire(self.session_key, exclude=tried)
+            tried.append(ep)
+            try:
+                rsp = self._client(ep).chat.completions.create(**kwargs)
+            except Exception as exc:
+                failed = self.router.is_endpoint_failure(exc)
+                self.router.release(ep, ok=not failed)
+                if not failed or len(tried) >= len(self.router.endpoints):
+                    raise
+                continue
+            if kwargs.get("stream"):
+                return _TrackedStream(rsp, self.router, ep)
+            self.router.release(ep, ok=True)
+            return rsp
+
+    def close(self) -> None:
+        self.router.stop()
+        for ep in self.router.endpoints:
+            if ep.client is not None:
+                ep.client.close()
+
+
+class AsyncPooledOpenAI(PooledOpenAI):
+    """Drop-in for `AsyncOpenAI` (chat completions only) that routes across endpoints."""
+
+    def for_session(self, session_key: str) -> "AsyncPooledOpenAI":
+        return AsyncPooledOpenAI(self.router, session_key)
+
+    def _client(self, ep: Endpoint):
+        with self.router._lock:
+            if ep.aclient is None:
+                from openai import AsyncOpenAI
+                ep.aclient = AsyncOpenAI(api_key=self.router.api_key, base_url=ep.base_url, **self.router.client_kwargs)
+            return ep.aclient
+
+    async def _create(self, **kwargs: Any) -> Any:
+        tried: List[Endpoint] = []
+        while True:
+            ep = self.router.acquire(self.session_key, exclude=tried)
+            tried.append(ep)
+            try:
+                rsp = await self._client(ep).chat.completions.create(**kwargs)
+            except Exception as exc:
+                failed = self.router.is_endpoint_failure(exc)
+                self.router.release(ep, ok=not failed)
+                if not failed or len(tried) >= len(self.router.endpoints):
+                    raise
+                continue
+            if kwargs.get("stream"):
+                return _TrackedAsyncStream(rsp, self.router, ep)
+            self.router.release(ep, ok=True)
+            return rsp
+
+    async def close(self) -> None:
+        self.router.stop()
+        for ep in self.router.endpoints:
+            if ep.aclient is not None:
+                await ep.aclient.close()
+
+
+class _Tracked:
+    """
+    Keeps a streamed request counted as in flight until the stream is
+    consumed, closed (or left as a context manager) or garbage collected,
+    whichever comes first. Only a finished or failed stream counts towards
+    the replica's health; one abandoned early does not.
+    """
+
+    def __init__(self, stream, router: EndpointRouter, ep: Endpoint):
+        self._stream, self._router, self._ep = stream, router, ep
+        self._released = False
+
+    def _release(self, ok: Optional[bool]) -> None:
+        if not self._released:
+            self._released = True
+            self._router.release(self._ep, ok)
+
+    def __del__(self) -> None:
+        if not getattr(self, "_released", True):
+            self._release(None)
+
+
+class _TrackedStream(_Tracked):
+    def __iter__(self) -> Iterator[Any]:
+        ok = None
+        try:
+            yield from self._stream
+            ok = True
+        except Exception as exc:
+            ok = not self._router.is_endpoint_failure(exc)
+            raise
+        finally:
+            self._release(ok)
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release(None)
+
+    def __enter__(self) -> "_TrackedStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class _TrackedAsyncStream(_Tracked):
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        ok = None
+        try:
+            async for chunk in self._stream:
+                yield chunk
+            ok = True
+        except Exception as exc:
+            ok = not self._router.is_endpoint_failure(exc)
+            raise
+        finally:
+            self._release(ok)
+
+    async def close(self) -> None:
+        try:
+            await self._stream.close()
+        finally:
+            self._release(None)
+
+    async def __aenter__(self) -> "_TrackedAsyncStream":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+# -----------------------------------------------------------------------------#
+#  Factories                                                                   #
+# -----------------------------------------------------------------------------#
+def make_client(base_url: Optional[str], api_key: Optional[str], **kwargs: Any):
+    """`OpenAI` for zero or one base URL, `PooledOpenAI` for a comma-separated list."""
+    urls = parse_base_urls(base_url)
+    if len(urls) > 1:
+        return PooledOpenAI(EndpointRouter(urls, api_key, **kwargs))
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=urls[0], **kwargs) if urls else OpenAI(api_key=api_key, **kwargs)
+
+
+def make_async_client(base_url: Optional[str], api_key: Optional[str], **kwargs: Any):
+    """`AsyncOpenAI` for zero or one base URL, `AsyncPooledOpenAI` for a comma-separated list."""
+    urls = parse_base_urls(base_url)
+    if len(urls) > 1:
+        return AsyncPooledOpenAI(EndpointRouter(urls, api_key, **kwargs))
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key, base_url=urls[0], **kwargs) if urls else AsyncOpenAI(api_key=api_key, **kwargs)
+
+
+def session_client(client, session_key: Optional[str]):
+    """The client to use for one session: an affinity view of a pool, or the client itself."""
+    if session_key is not None and hasattr(client, "for_session"):
+        return client.for_session(session_key)
+    return client
@@ -0,0 +1,279 @@
+"""
+MCP servers reached over the streamable HTTP transport.
+
+A server in config.json can be given by URL instead of `command`/`args`:
+
+    "playwright": {"url": "http://localhost:8931/mcp", "headers": {...}, "pool_size": 8, "timeout": 120}
+
+so many agent processes can share a few long-lived servers (e.g.
+`npx @playwright/mcp@latest --port 8931`) instead of each spawning its own.
+
+  * every JSON-RPC message is a `POST` to the URL; the server answers with
+    either a JSON body or an SSE stream (`text/event-stream`) that carries
+    the response, possibly after server notifications, which are skipped,
+  * the `initialize` handshake runs on first use and the `Mcp-Session-Id`
+    the server hands out is sent on every later request,
+  * all servers on the same host share one `requests` session, so requests
+    reuse keep-alive connections from a pool of `pool_size` and run
+    concurrently from several threads,
+  * `request_many` sends calls that may run concurrently as one JSON-RPC
+    batch array when the server negotiated a protocol version with batches
+    (or the config sets `"batch": true`), and as concurrent requests over
+    the pool otherwise, or once a server has rejected a batch,
+  * connection failures before a request is sent are retried with backoff,
+    and a 404 for a known session id (the server restarted or expired the
+    session) starts a fresh session and replays the request once.
+
+Timeouts surface as `TimeoutError` and unreachable servers as
+`ConnectionError`, the same exceptions the stdio paths use.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:                   # `requests` is imported when the first HTTP server is used
+    import requests
+
+PROTOCOL_VERSION = "2025-03-26"
+BATCH_PROTOCOL_VERSIONS = {"2025-03-26"}     # JSON-RPC batches were dropped again in 2025-06-18
+CLIENT_INFO = {"name": "mcp-agent-fine-tune", "version": "0.1.0"}
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT_S = 120.0
+CONNECT_TIMEOUT_S = 10.0
+
+_sessions: Dict[Tuple[str, str], "requests.Session"] = {}
+_sessions_lock = threading.Lock()
+
+
+def is_http_server(cfg: dict) -> bool:
+    """True for config entries given by URL rather than command."""
+    return "url" in cfg
+
+
+def _shared_session(url: str, pool_size: int) -> "requests.Session":
+    """One keep-alive connection pool per scheme and host, shared by every server on it."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            # Only retry failures to connect: a tools/call that reached the server must not run twice
+            retry = Retry(total=3, connect=3, read=0, status=0, other=0, backoff_factor=0.5, allowed_methods=None)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+            session = requests.Session()
+            session.mount(f"{parts.scheme}://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def _responses_by_id(payload: Any, ids: Set[Any], found: Dict[Any, dict]) -> None:
+    """Add the JSON-RPC responses in `payload` (one message or a batch array) whose id is in `ids`."""
+    for msg in payload if isinstance(payload, list) else [payload]:
+        if isinstance(msg, dict) and msg.get("id") in ids and ("result" in msg or "error" in msg):
+            found.setdefault(msg["id"], msg)
+
+
+def _read_sse_responses(rsp: "requests.Response", ids: Set[Any]) -> Dict[Any, dict]:
+    """
+    The JSON-RPC responses for `ids` from an SSE stream, skipping other
+    events. The stream is read to its end (servers close it after the
+    responses) so the connection goes back to the pool instead of being dropped.
+    """
+    found: Dict[Any, dict] = {}
+    data_lines = []
+    for line in rsp.iter_lines(decode_unicode=True):
+        if line:
+            if line.startswith("data:"):
+                data_lines.append(line[5:].lstrip())
+            continue
+        if not data_lines:                      # blank line without data: keep-alive or comment block
+            continue
+        try:
+            _responses_by_id(json.loads("\n".join(data_lines)), ids, found)
+        except json.JSONDecodeError:
+            pass
+        data_lines = []
+    return found
+
+
+class _SessionExpired(Exception):
+    pass
+
+
+class BatchNotSupported(Exception):
+    """The server rejected a JSON-RPC batch as a whole; none of its calls ran."""
+
+
+class HTTPMCPServer:
+    """One MCP session on a streamable HTTP server; safe to use from several threads."""
+
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.url = cfg["url"]
+        self.headers = dict(cfg.get("headers", {}))
+        self.timeout = float(cfg.get("timeout", DEFAULT_TIMEOUT_S))
+        self.pool_size = int(cfg.get("pool_size", DEFAULT_POOL_SIZE))
+        self.session_id: Optional[str] = None
+        self.protocol_version = PROTOCOL_VERSION
+        self.server_info: Dict[str, Any] = {}
+        self.supports_batch: Optional[bool] = cfg.get("batch")     # None = decide from the protocol version
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._http: Optional[requests.Session] = None
+
+    # ---------------------------------------------------------------------#
+    #  Transport                                                           #
+    # ---------------------------------------------------------------------#
+    def _post(self, message: Union[dict, List[dict]], timeout: Optional[float]) -> "requests.Response":
+        import requests
+
+        if self._http is None:
+            self._http = _shared_session(self.url, self.pool_size)
+        headers = {
+            **self.headers,
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/event-stream",
+        }
+        if self.session_id:
+            headers["Mcp-Session-Id"] = self.session_id
+            headers["MCP-Protocol-Version"] = self.protocol_version
+        try:
+            return self._http.post(
+                self.url,
+                data=json.dumps(message).encode("utf-8"),     # bytes go out in one send with the headers
+                headers=headers,
+                timeout=(CONNECT_TIMEOUT_S, timeout or self.timeout),
+                stream=True,
+            )
+        except requests.Timeout as exc:
+            raise TimeoutError(f"MCP server {self.name} timed out") from exc
+        except requests.ConnectionError as exc:
+            raise ConnectionError(f"MCP server {self.name} unreachable at {self.url}: {exc}") from exc
+
+    def _send(self, message: Union[dict, List[dict]], timeout: Optional[float] = None) -> Dict[Any, dict]:
+        """POST one message or a batch array; returns the responses by request id."""
+        import requests
+
+        batch = isinstance(message, list)
+        ids = {m["id"] for m in (message if batch else [message]) if "id" in m}
+        rsp = self._post(message, timeout)
+        try:
+            if rsp.status_code == 404 and self.session_id:
+                raise _SessionExpired()
+            if batch and 400 <= rsp.status_code < 500:
+                raise BatchNotSupported(f"HTTP {rsp.status_code}")
+            if rsp.status_code >= 400:
+                raise ConnectionError(f"MCP server {self.name} returned HTTP {rsp.status_code}: {rsp.text[:200]}")
+            if not batch and message.get("method") == "initialize":
+                self.session_id = rsp.headers.get("Mcp-Session-Id")
+            if not ids:
+                return {}
+            content_type = rsp.headers.get("Content-Type", "")
+            try:
+                if content_type.startswith("text/event-stream"):
+                    return _read_sse_responses(rsp, ids)
+                payload = rsp.json()
+                if batch and not isinstance(payload, list):
+                    raise BatchNotSupported(str(payload.get("error") if isinstance(payload, dict) else payload))
+                found: Dict[Any, dict] = {}
+                _responses_by_id(payload, ids, found)
+                return found
+            except requests.Timeout as exc:
+                raise TimeoutError(f"MCP server {self.name} timed out") from exc
+            except requests.ConnectionError as exc:
+                raise ConnectionError(f"MCP server {self.name} dropped the connection: {exc}") from exc
+        finally:
+            rsp.close()
+
+    # ---------------------------------------------------------------------#
+    #  Session                                                             #
+    # ---------------------------------------------------------------------#
+    def connect(self) -> None:
+        """Run the initialize handshake if this session hasn't yet."""
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.session_id = None
+            req = {
+                "jsonrpc": "2.0",
+                "id": next(self._ids),
+                "method": "initialize",
+                "params": {"protocolVersion": PROTOCOL_VERSION, "capabilities": {}, "clientInfo": CLIENT_INFO},
+            }
+            msg = self._send(req, self.timeout).get(req["id"])
+            if not msg or "error" in msg:
+                raise ConnectionError(f"MCP server {self.name} failed to initialize: {msg and msg.get('error')}")
+            result = msg.get("result", {})
+            self.protocol_version = result.get("protocolVersion", PROTOCOL_VERSION)
+            if self.supports_batch is None:
+                self.supports_batch = self.protocol_version in BATCH_PROTOCOL_VERSIONS
+            self.server_info = result.get("serverInfo", {})
+            self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+            self._initialized = True
+
+    def _reset(self, stale_session_id: Optional[str]) -> None:
+        with self._init_lock:
+            if self.session_id == stale_session_id:     # another thread may have reconnected already
+                self._initialized = False
+
+    def request(self, method: str, params: dict, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Send one JSON-RPC request and return the response message (with
+        `result` or `error`), or None if the server sent no response.
+        """
+        return self._request_all([(method, params)], timeout, batch=False)[0]
+
+    def request_many(self, calls: List[Tuple[str, dict]], timeout: Optional[float] = None) -> List[Optional[dict]]:
+        """
+        Send several requests that may run concurrently; returns their
+        responses in order. They go out as one JSON-RPC batch when the server
+        takes batches, otherwise as concurrent requests over the pool.
+        """
+        if len(calls) > 1 and self.supports_batch is not False:
+            self.connect()
+            if self.supports_batch:
+                try:
+                    return self._request_all(calls, timeout, batch=True)
+                except BatchNotSupported:
+                    self.supports_batch = False
+        if len(calls) == 1:
+            return [self.request(*calls[0], timeout)]
+        with ThreadPoolExecutor(max_workers=min(len(calls), self.pool_size)) as pool:
+            return list(pool.map(lambda call: self.request(*call, timeout), calls))
+
+    def _request_all(self, calls: List[Tuple[str, dict]], timeout: Optional[float], batch: bool) -> List[Optional[dict]]:
+        for attempt in range(2):
+            self.connect()
+            session_id = self.session_id
+            msgs = [{"jsonrpc": "2.0", "id": next(self._ids), "method": m, "params": p} for m, p in calls]
+            try:
+                responses = self._send(msgs if batch else msgs[0], timeout)
+                return [responses.get(m["id"]) for m in msgs]
+            except _SessionExpired:
+                self._reset(session_id)
+                if attempt:
+                    raise ConnectionError(f"MCP server {self.name} keeps rejecting its session")
+        return [None] * len(calls)
+
+    def close(self) -> None:
+        """End the session on the server; the shared connection pool stays open."""
+        if not self.session_id or self._http is None:
+            return
+        try:
+            self._http.delete(self.url, headers={**self.headers, "Mcp-Session-Id": self.session_id},
+                              timeout=(CONNECT_TIMEOUT_S, 5))
+        except Exception:
+            pass
+        self.session_id = None
+        self._initialized = False
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Minimal MCP server over streamable HTTP, for testing without a browser.
+
+Serves `POST /mcp` (initialize, notifications, tools/list, tools/call, and
+JSON-RPC batch arrays of them unless `--no-batch`) and `DELETE /mcp` (end a
+session). `initialize` hands out an `Mcp-Session-Id`;
+requests for an unknown session get 404, as after a server restart. Tools are
+the browser-style tools of synthetic_traces.py, and every call answers after
+a configurable delay with a synthetic page snapshot. With `--sse`, responses
+are sent as an SSE stream preceded by a progress notification, as the MCP
+SDK servers do by default.
+
+Usage:
+  uv run mcp_stub_server.py [--port=8931] [--latency-ms=20] [--snapshot-chars=4000] [--tools=6] [--sse] [--no-batch]
+
+and in config.json:
+  {"mcpServers": {"browser": {"url": "http://127.0.0.1:8931/mcp"}}}
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic_traces import make_tool_result, make_tools
+
+
+class MCPStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency_s = 0.02
+    snapshot_chars = 4000
+    tools = make_tools(6)
+    sse = False
+    batch = True
+    sessions: set = set()
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    # ------------------------------------------------------------------#
+    #  Helpers                                                          #
+    # ------------------------------------------------------------------#
+    def _send_json(self, status: int, body, headers: dict = None) -> None:
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_sse(self, messages: list, headers: dict = None) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for msg in messages:
+            data = f"event: message\ndata: {json.dumps(msg)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _respond(self, req: dict) -> dict:
+        method = req.get("method")
+        if method == "initialize":
+            result = {
+                "protocolVersion": req.get("params", {}).get("protocolVersion", "2025-03-26"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "mcp-stub", "version": "0.1.0"},
+            }
+        elif method == "tools/list":
+            result = {"tools": self.tools}
+        elif method == "tools/call":
+            name = req.get("params", {}).get("name", "")
+            if not any(t["name"] == name for t in self.tools):
+                return {"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32602, "message": f"Unknown tool {name}"}}
+            time.sleep(self.latency_s)
+            text = make_tool_result(random.Random(), name, self.snapshot_chars)
+            result = {"content": [{"type": "text", "text": text}]}
+        elif method == "ping":
+            result = {}
+        else:
+            return {"jsonrpc": "2.0", "id": req["id"], "error": {"code": -32601, "message": f"Unknown method {method}"}}
+        return {"jsonrpc": "2.0", "id": req["id"], "result": result}
+
+    # ------------------------------------------------------------------#
+    #  Routes                                                           #
+    # ------------------------------------------------------------------#
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}})
+            return
+        if self.path.rstrip("/") != "/mcp":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        if isinstance(req, list):
+            self._handle_batch(req)
+            return
+
+        headers = {}
+        session_id = self.headers.get("Mcp-Session-Id")
+        if req.get("method") == "initialize":
+            session_id = uuid.uuid4().hex
+            with self.lock:
+                self.sessions.add(session_id)
+            headers["Mcp-Session-Id"] = session_id
+        elif session_id not in self.sessions:
+            self._send_json(404, {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32001, "message": "Session not found"}})
+            return
+
+        if "id" not in req:                                 # notification
+            self._send_json(202, None)
+            return
+
+        rsp = self._respond(req)
+        if self.sse:
+            progress = {"jsonrpc": "2.0", "method": "notifications/message", "params": {"level": "info", "data": "working"}}
+            self._send_sse([progress, rsp], headers)
+        else:
+            self._send_json(200, rsp, headers)
+
+    def _handle_batch(self, reqs: list) -> None:
+        if not self.batch:
+            self._send_json(400, {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Batches not supported"}})
+            return
+        if self.headers.get("Mcp-Session-Id") not in self.sessions:
+            self._send_json(404, {"jsonrpc": "2.0", "id": None, "error": {"code": -32001, "message": "Session not found"}})
+            return
+        rsps = [self._respond(r) for r in reqs if isinstance(r, dict) and "id" in r]
+        if not rsps:
+            self._send_json(202, None)
+        elif self.sse:
+            self._send_sse(rsps)
+        else:
+            self._send_json(200, rsps)
+
+    def do_DELETE(self):
+        with self.lock:
+            self.sessions.discard(self.headers.get("Mcp-Session-Id"))
+        self._send_json(200, None)
+
+    def do_GET(self):
+        self._send_json(405, None)                          # no server-initiated stream
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamable-HTTP MCP stub server")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8931, help="Port to bind (default: 8931)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay before each tool result (default: 20)")
+    parser.add_argument("--snapshot-chars", type=int, default=4000, help="Approximate snapshot size (default: 4000)")
+    parser.add_argument("--tools", type=int, default=6, help="Number of tools to list (default: 6)")
+    parser.add_argument("--sse", action="store_true", help="Answer with SSE streams instead of JSON bodies")
+    parser.add_argument("--no-batch", action="store_true", help="Reject JSON-RPC batch arrays with HTTP 400")
+    args = parser.parse_args()
+
+    MCPStubHandler.latency_s = args.latency_ms / 1000
+    MCPStubHandler.snapshot_chars = args.snapshot_chars
+    MCPStubHandler.tools = make_tools(args.tools)
+    MCPStubHandler.sse = args.sse
+    MCPStubHandler.batch = not args.no_batch
+
+    server = ThreadingHTTPServer((args.host, args.port), MCPStubHandler)
+    server.daemon_threads = True
+    print(f"Stub MCP server on http://{args.host}:{args.port}/mcp")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the pure-Python hot paths, on synthetic traces.
+
+Cases (each at every selected size):
+  prepare_messages_for_api   MCPAgent._prepare_messages_for_api over a full history
+  wrap_tool_result           MCPAgent._wrap_tool_result on one snapshot-sized result
+  mcp_to_openai_tools_cold   MCPAgent._mcp_to_openai_tools with the schema cache cleared
+  mcp_to_openai_tools_warm   ... with every schema already compiled
+  convert_tool_call_to_dict  MCPAgent._convert_tool_call_to_dict on one tool call
+  repair_tool_arguments      partial_json.parse_tool_arguments on one call's arguments with a trailing comma and no closing brace
+  prepare_rows               push-to-hub row building for 8 traces
+  prepare_rows_unroll        ... with --unroll
+  prepare_dataset            ... plus Dataset.from_list (only if `datasets` is installed)
+  dump_trace                 json.dump(indent=2) of one trace, as the agent saves it
+
+Sizes (turns / snapshot characters / tools):
+  small 4 / 4000 / 25, medium 16 / 16000 / 25, large 64 / 64000 / 100
+
+Time is the best of `--repeat` runs, per call, with the number of calls per
+run calibrated to take at least ~50 ms. Peak memory is measured separately
+with tracemalloc over a single call. Results are appended to
+benchmarks/micro.jsonl with the git revision; `--compare REV` prints the
+ratio against the latest recorded run of another revision.
+
+Usage:
+  uv run microbench.py [--sizes small,medium,large] [--filter prepare] [--compare HEAD~1] [--no-record]
+"""
+
+import argparse
+import copy
+import datetime
+import importlib.util
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+from synthetic_traces import make_tools, make_trace
+
+console = Console()
+
+HERE = Path(__file__).resolve().parent
+RESULTS_FILE = HERE / "benchmarks" / "micro.jsonl"
+
+SIZES = {
+    "small": {"turns": 4, "snapshot_chars": 4000, "n_tools": 25},
+    "medium": {"turns": 16, "snapshot_chars": 16000, "n_tools": 25},
+    "large": {"turns": 64, "snapshot_chars": 64000, "n_tools": 100},
+}
+DATASET_TRACES = 8
+
+
+def _load_push_to_hub():
+    """push-to-hub.py isn't importable by name because of the hyphen."""
+    spec = importlib.util.spec_from_file_location("push_to_hub", HERE / "push-to-hub.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _make_agent(tmp: Path):
+    from agent import MCPAgent
+
+    config = tmp / "config.json"
+    config.write_text(json.dumps({"mcpServers": {}}))
+    return MCPAgent(config_path=str(config), api_key="bench", trace_dir=str(tmp / "traces"))
+
+
+def build_cases(size: Dict[str, int], agent, push) -> Dict[str, Callable[[], Any]]:
+    """Zero-argument callables for one size; inputs are built here, outside the timed region."""
+    from openai.types.chat import ChatCompletionMessageToolCall
+
+    import schema_compiler
+    from partial_json import parse_tool_arguments
+
+    trace = make_trace(size["turns"], size["snapshot_chars"], size["n_tools"], seed=0)
+    history = copy.deepcopy(trace["messages"])
+    agent._prepare_messages_for_api(history)          # steady state: arguments already serialised
+    tool_msg = next(m for m in trace["messages"] if m["role"] == "tool")
+    result = {"content": [{"type": "text", "text": tool_msg["content"]}]}
+    mcp_tools = make_tools(size["n_tools"])
+    first_call = next(m for m in trace["messages"] if m.get("tool_calls"))["tool_calls"][0]
+    tool_call = ChatCompletionMessageToolCall.model_validate({
+        **first_call,
+        "function": {"name": first_call["function"]["name"], "arguments": json.dumps(first_call["function"]["arguments"])},
+    })
+    call_args = next(tc["function"]["arguments"] for m in trace["messages"]
+                     for tc in m.get("tool_calls") or [] if tc["function"]["arguments"])
+    malformed_args = json.dumps(call_args)[:-1] + ","
+    items = [{"filename": f"synthetic_{i:05d}.json",
+              "trace": make_trace(size["turns"], size["snapshot_chars"], size["n_tools"], seed=i)}
+             for i in range(DATASET_TRACES)]
+
+    def mcp_tools_cold():
+        schema_compiler.clear_cache()
+        agent._mcp_to_openai_tools(mcp_tools)
+
+    cases = {
+        "prepare_messages_for_api": lambda: agent._prepare_messages_for_api(history),
+        "wrap_tool_result": lambda: agent._wrap_tool_result(tool_msg["tool_call_id"], result, tool_name="browser_click"),
+        "mcp_to_openai_tools_cold": mcp_tools_cold,
+        "mcp_to_openai_tools_warm": lambda: agent._mcp_to_openai_tools(mcp_tools),
+        "convert_tool_call_to_dict": lambda: agent._convert_tool_call_to_dict(tool_call),
+        "repair_tool_arguments": lambda: parse_tool_arguments(malformed_args),
+        "prepare_rows": lambda: push.prepare_rows(items, unroll=False),
+        "prepare_rows_unroll": lambda: push.prepare_rows(items, unroll=True),
+        "dump_trace": lambda: json.dump(trace, io.StringIO(), indent=2),
+    }
+    if importlib.util.find_spec("datasets") is not None:
+        cases["prepare_dataset"] = lambda: push.prepare_dataset(items, unroll=False)
+    return cases
+
+
+def time_call(fn: Callable[[], Any], repeat: int, min_run_s: float = 0.05) -> float:
+    """Best per-call time in seconds over `repeat` runs."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_run_s or number >= 1_000_000:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_run_s / elapsed) + 1))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    """Peak bytes allocated during one call (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def git_revision(rev: str = "HEAD") -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", rev], cwd=HERE, capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+def load_baseline(rev: str) -> Optional[Dict[Tuple[str, str], float]]:
+    """Per-call times of the latest recorded run of `rev`, keyed by (case, size)."""
+    if not RESULTS_FILE.exists():
+        return None
+    wanted = git_revision(rev)
+    baseline = None
+    with open(RESULTS_FILE) as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("git_rev") == wanted:
+                baseline = {(r["case"], r["size"]): r["time_us"] for r in record["results"]}
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the hot helpers")
+    parser.add_argument("--sizes", default="small,medium,large", help="Comma-separated sizes (default: small,medium,large)")
+    parser.add_argument("--filter", help="Only run cases whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case; the best is kept (default: 5)")
+    parser.add_argument("--compare", metavar="REV", help="Compare against the latest recorded run of this git revision")
+    parser.add_argument("--no-record", action="store_true", help=f"Don't append results to {RESULTS_FILE.name}")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Unknown size(s): {', '.join(unknown)} (choose from {', '.join(SIZES)})")
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    if args.compare and baseline is None:
+        console.print(f"[yellow]No recorded run for {args.compare}; showing absolute numbers only[/yellow]")
+
+    push = _load_push_to_hub()
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        agent = _make_agent(Path(tmp))
+        for size_name in sizes:
+            cases = build_cases(SIZES[size_name], agent, push)
+            for name, fn in cases.items():
+                if args.filter and args.filter not in name:
+                    continue
+                seconds = time_call(fn, args.repeat)
+                results.append({
+                    "case": name,
+                    "size": size_name,
+                    "time_us": round(seconds * 1e6, 2),
+                    "peak_kib": round(peak_memory(fn) / 1024, 1),
+                })
+                console.print(f"[dim]{size_name:>6} {name}: {seconds * 1e6:,.1f} µs[/dim]")
+
+    table = Table(title=f"Microbenchmarks ({git_revision()}, best of {args.repeat})")
+    table.add_column("Case")
+    table.add_column("Size")
+    table.add_column("Time / call", justify="right")
+    table.add_column("Peak KiB", justify="right")
+    if baseline:
+        table.add_column(f"vs {args.compare}", justify="right")
+    for r in results:
+        row = [r["case"], r["size"], f"{r['time_us']:,.1f} µs", f"{r['peak_kib']:,.1f}"]
+        if baseline:
+            before = baseline.get((r["case"], r["size"]))
+            if before:
+                ratio = r["time_us"] / before
+                color = "red" if ratio > 1.1 else "green" if ratio < 0.9 else "white"
+                row.append(f"[{color}]{ratio:.2f}x[/{color}]")
+            else:
+                row.append("-")
+        table.add_row(*row)
+    console.print(table)
+
+    if not args.no_record:
+        RESULTS_FILE.parent.mkdir(exist_ok=True)
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps({
+                "timestamp": datetime.datetime.now().isoformat(),
+                "git_rev": git_revision(),
+                "python": sys.version.split()[0],
+                "repeat": args.repeat,
+                "results": results,
+            }) + "\n")
+        console.print(f"[green]Appended results to {RESULTS_FILE.relative_to(HERE)}[/green]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Incremental JSON parsing of tool-call arguments, with repair.
+
+Small fine-tuned models sometimes emit arguments that are almost JSON: a
+trailing comma, a missing closing brace, single-quoted strings, Python's
+True/None. `json.loads` rejects those and the call is lost. This module scans
+the argument text one fragment at a time (as it streams in, or all at once)
+with a small state machine that:
+
+  * knows after every fragment whether the text so far is a valid prefix of
+    a JSON value (`error` is set at the first character that can't be),
+  * knows when the top-level value has closed (`complete`), so a caller that
+    streams arguments can dispatch without waiting for the end of the message,
+  * rewrites the defects it can fix into valid JSON as it goes, recording the
+    name of every repair it made.
+
+Repairs (names as recorded):
+  trailing_comma      `{"a": 1,}` / `[1, 2,]`
+  single_quotes       `{'a': 'b'}`
+  python_literal      True / False / None
+  control_character   raw newlines or tabs inside strings
+  unclosed_string     text ends inside a string
+  dangling_key        text ends after a key, or after a key's colon
+  unclosed_container  text ends with objects or arrays still open
+  double_encoded      the arguments are a JSON string holding the JSON object
+  empty_arguments     "" for a tool without parameters
+
+Under the "strict" policy nothing is repaired and any defect is an error, as
+with plain `json.loads`. Unrepairable text (unquoted keys, missing commas,
+garbage) raises `json.JSONDecodeError` under either policy.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+POLICIES = ("repair", "strict")
+
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_PREFIX = re.compile(r"-?(?:(?:0|[1-9]\d*)(?:\.\d*)?(?:(?<=\d)[eE][+-]?\d*)?)?")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+_JSON_PREFIXES = {lit[:i] for lit in ("true", "false", "null") for i in range(1, len(lit) + 1)}
+_PYTHON_PREFIXES = {lit[:i] for lit in ("True", "False", "None") for i in range(1, len(lit) + 1)}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_TOKEN_END = set(" \t\r\n,:]}")
+
+# What the scanner expects next
+VALUE, KEY, COLON, COMMA, DONE = "value", "key", "colon", "comma", "done"
+
+
+class PartialJSONParser:
+    """Scan one JSON value fed in fragments; see the module docstring."""
+
+    def __init__(self, policy: str = "repair"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown JSON repair policy {policy!r} (choose from {', '.join(POLICIES)})")
+        self.policy = policy
+        self.text: List[str] = []           # raw input, for error messages
+        self.out: List[str] = []            # repaired output
+        self.repairs: List[str] = []
+        self.error: Optional[Tuple[str, int]] = None      # (message, position) of the first defect
+
+        self._pos = 0
+        self._stack: List[str] = []         # open '{' / '['
+        self._expect = VALUE
+        self._after_comma = False
+        self._comma_at = -1                 # index in `out` of the last comma
+        self._member_start = -1             # index in `out` where the current object member starts
+        self._quote: Optional[str] = None   # quote char while inside a string
+        self._escape = False
+        self._token: List[str] = []         # bare literal or number being read
+
+    # ---------------------------------------------------------------------#
+    #  State                                                               #
+    # ---------------------------------------------------------------------#
+    @property
+    def complete(self) -> bool:
+        """True once the top-level value has been closed."""
+        return self._expect == DONE and not self._token and self.error is None
+
+    @property
+    def valid(self) -> bool:
+        """True while the input so far is a (possibly repaired) valid prefix."""
+        return self.error is None
+
+    def _fail(self, message: str) -> None:
+        if self.error is None:
+            self.error = (message, self._pos)
+
+    def _repair(self, name: str) -> bool:
+        """Record a repair; under the strict policy it is an error instead."""
+        if self.policy == "strict":
+            self._fail(f"Invalid JSON ({name.replace('_', ' ')})")
+            return False
+        if name not in self.repairs:
+            self.repairs.append(name)
+        return True
+
+    # ---------------------------------------------------------------------#
+    #  Scanning                                                            #
+    # ---------------------------------------------------------------------#
+    def feed(self, fragment: str) -> "PartialJSONParser":
+        """Scan the next fragment of the argument text."""
+        self.text.append(fragment)
+        for ch in fragment:
+            if self.error is not None:
+                break
+            if self._quote is not None:
+                self._string_char(ch)
+            elif self._token and ch not in _TOKEN_END:
+                self._token_char(ch)
+            else:
+                if self._token:
+                    self._end_token()
+                    if self.error is not None:
+                        break
+                self._structural_char(ch)
+            self._pos += 1
+        return self
+
+    def _string_char(self, ch: str) -> None:
+        if self._escape:
+            self._escape = False
+            # \' is valid inside a single-quoted string but not in JSON
+            self.out.append("'" if ch == "'" else "\\" + ch)
+        elif ch == "\\":
+            self._escape = True
+        elif ch == self._quote:
+            self._quote = None
+            self.out.append('"')
+            self._expect = COLON if self._expect == KEY else COMMA
+        elif ch == '"':                                   # inside a single-quoted string
+            self.out.append('\\"')
+        elif ch < " ":
+            if self._repair("control_character"):
+                self.out.append(_ESCAPES.get(ch, f"\\u{ord(ch):04x}"))
+        else:
+            self.out.append(ch)
+
+    def _structural_char(self, ch: str) -> None:
+        if ch in " \t\r\n":
+            self.out.append(ch)
+            return
+        expect = self._expect
+        if expect == DONE:
+            self._fail("Extra data after the arguments object")
+        elif ch in "\"'":
+            if expect not in (VALUE, KEY):
+                self._fail("Expected ':'" if expect == COLON else "Expected ',' or a closing bracket")
+                return
+            if ch == "'" and not self._repair("single_quotes"):
+                return
+            self._quote = ch
+            self._after_comma = False
+            self.out.append('"')
+        elif ch in "{[":
+            if expect != VALUE:
+                self._fail("Unexpected bracket")
+                return
+            self._stack.append(ch)
+            self.out.append(ch)
+            self._after_comma = False
+            self._expect = KEY if ch == "{" else VALUE
+            if ch == "{":
+                self._member_start = len(self.out)
+        elif ch in "}]":
+            if not self._stack or self._stack[-1] != ("{" if ch == "}" else "["):
+                self._fail(f"Unexpected '{ch}'")
+                return
+            if self._after_comma:
+                if not self._repair("trailing_comma"):
+                    return
+                self.out[self._comma_at] = ""
+            elif expect == COLON or (expect == VALUE and ch == "}"):
+                self._fail("Object key without a value")
+                return
+            self._close(ch)
+        elif ch == ",":
+            if expect != COMMA:
+                self._fail("Unexpected ','")
+                return
+            self._comma_at = len(self.out)
+            self.out.append(ch)
+            self._after_comma = True
+            if self._stack[-1] == "{":
+                self._expect = KEY
+                self._member_start = len(self.out)
+            else:
+                self._expect = VALUE
+        elif ch == ":":
+            if expect != COLON:
+                self._fail("Unexpected ':'")
+                return
+            self.out.append(ch)
+            self._expect = VALUE
+        elif expect == VALUE:
+            self._token_char(ch)
+            self._after_comma = False
+        else:
+            self._fail({KEY: "Expected a quoted key", COLON: "Expected ':'"}.get(expect, "Expected ',' or a closing bracket"))
+
+    def _close(self, ch: str) -> None:
+        self._stack.pop()
+        self.out.append(ch)
+        self._after_comma = False
+        self._expect = COMMA if self._stack else DONE
+
+    def _token_char(self, ch: str) -> None:
+        """Extend the bare token, failing as soon as it can't become a literal or number."""
+        self._token.append(ch)
+        token = "".join(self._token)
+        if token in _JSON_PREFIXES or _NUMBER_PREFIX.fullmatch(token):
+            return
+        if token in _PYTHON_PREFIXES:
+            if self.policy == "strict":
+                self._repair("python_literal")
+            return
+        self._fail(f"Invalid literal {token!r}")
+
+    def _end_token(self) -> None:
+        token = "".join(self._token)
+        self._token = []
+        if _NUMBER.fullmatch(token):
+            self.out.append(token)
+        elif token in _LITERALS:
+            if _LITERALS[token] != token and not self._repair("python_literal"):
+                return
+            self.out.append(_LITERALS[token])
+        else:
+            self._fail(f"Invalid literal {token!r}")
+            return
+        self._expect = COMMA if self._stack else DONE
+
+    # ---------------------------------------------------------------------#
+    #  Completion                                                          #
+    # ---------------------------------------------------------------------#
+    def finish(self) -> Any:
+        """Close whatever is still open (if the policy allows) and return the parsed value."""
+        text = "".join(self.text)
+        if self.error is None and self._token:
+            self._end_token()
+        if self.error is None and self._quote is not None:
+            if self._repair("unclosed_string"):
+                if self._escape:                            # a lone trailing backslash
+                    self._escape = False
+                self._quote = None
+                self.out.append('"')
+                self._expect = COLON if self._expect == KEY else COMMA
+        if self.error is None and self._stack and self._stack[-1] == "{" and self._expect in (COLON, VALUE) \
+                and not self._after_comma and self._member_start >= 0:
+            if self._repair("dangling_key"):
+                del self.out[self._member_start:]
+                self._after_comma = self._member_start > 0 and self.out[-1] == ","
+                self._comma_at = len(self.out) - 1
+        if self.error is None and self._after_comma:
+            if self._repair("trailing_comma"):
+                self.out[self._comma_at] = ""
+                self._after_comma = False
+        if self.error is None and self._stack:
+            if self._repair("unclosed_container"):
+                while self._stack:
+                    self._close("}" if self._stack[-1] == "{" else "]")
+        if self.error is not None:
+            message, pos = self.error
+            raise json.JSONDecodeError(message, text, min(pos, len(text)))
+        if self._expect != DONE:
+            raise json.JSONDecodeError("Expecting value", text, len(text))
+        return json.loads("".join(self.out))
+
+
+def parse_tool_arguments(raw: Any, policy: str = "repair") -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Tool-call arguments as a dict, plus the names of the repairs applied.
+    Valid JSON takes the `json.loads` fast path; anything else goes through
+    PartialJSONParser. Raises json.JSONDecodeError if the arguments can't be
+    read as an object under `policy`.
+    """
+    if not isinstance(raw, str):
+        return raw, []
+    try:
+        value = json.loads(raw)
+        repairs: List[str] = []
+    except json.JSONDecodeError:
+        if not raw.strip():
+            if policy == "strict":
+                raise
+            return {}, ["empty_arguments"]
+        parser = PartialJSONParser(policy).feed(raw)
+        value = parser.finish()
+        repairs = parser.repairs
+
+    if isinstance(value, str) and policy != "strict":
+        inner, inner_repairs = parse_tool_arguments(value, policy)
+        return inner, ["double_encoded", *inner_repairs]
+    if not isinstance(value, dict):
+        raise json.JSONDecodeError(f"Tool arguments must be a JSON object, not {type(value).__name__}", raw, 0)
+    return value, repairs
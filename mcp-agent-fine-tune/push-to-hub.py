@@ -3,12 +3,17 @@
 Push MCP Agent conversation traces to Hugging Face Hub as a dataset.
 
 Usage:
-  uv run push-to-hub.py --repo-id="owner/dataset-name" [--trace-dir="traces"] [--unroll]
+  uv run push-to-hub.py --repo-id="owner/dataset-name" [--trace-dir="traces"] [--unroll] [--dedup]
 
 Options:
   --repo-id          Hugging Face Hub repository ID (required)
   --trace-dir        Directory containing trace files (default: 'traces')
   --unroll           Create multiple examples from each trace by truncating at different points
+  --dedup            Drop near-duplicate traces (MinHash/LSH, see dedup.py) before building the dataset
+  --dedup-threshold  Similarity above which a trace counts as a duplicate (default: 0.8)
+  --dedup-index      SQLite index file so traces are checked against earlier runs (optional)
+  --filter-model, --filter-tool, --since, --until, --min-turns, --search
+                     Only push traces matching these trace-catalogue filters (see trace_catalog.py)
 
 The --unroll flag creates multiple training examples from each conversation trace:
 - One example with the complete conversation
@@ -19,27 +24,33 @@ Before running this script, make sure to log in to Hugging Face:
   huggingface-cli login
 """
 
+from __future__ import annotations
+
 import argparse
 import json
 import os
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
 
-from datasets import Dataset
-from huggingface_hub import HfApi, login
 from rich.console import Console
 from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn
 
+from dedup import DEFAULT_THRESHOLD, dedup_traces, print_dropped
+from trace_catalog import add_filter_arguments, filters_from_args, select_traces
+
+if TYPE_CHECKING:                   # `datasets` / `huggingface_hub` are slow to import; load them when used
+    from datasets import Dataset
+
 console = Console()
 
-def load_traces(trace_dir: str) -> List[Dict[str, Any]]:
-    """Load all trace files from the specified directory."""
+def load_traces(trace_dir: str, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Load the trace files in the directory, or only those matching catalogue `filters`."""
     trace_path = Path(trace_dir)
     if not trace_path.exists() or not trace_path.is_dir():
         raise ValueError(f"Trace directory '{trace_dir}' does not exist or is not a directory")
     
     traces = []
-    trace_files = list(trace_path.glob("*.json"))
+    trace_files = select_traces(trace_dir, filters) if filters else list(trace_path.glob("*.json"))
     
     if not trace_files:
         console.print(f"[yellow]No trace files found in '{trace_dir}'[/yellow]")
@@ -59,7 +70,8 @@ def load_traces(trace_dir: str) -> List[Dict[str, Any]]:
                     trace_data = json.load(f)
                     traces.append({
                         "filename": trace_file.name,
-                        "trace": trace_data
+                        "trace": trace_data,
+                        "mtime": trace_file.stat().st_mtime,
                     })
                 progress.update(task, advance=1)
             except Exception as e:
@@ -68,8 +80,8 @@ def load_traces(trace_dir: str) -> List[Dict[str, Any]]:
     
     return traces
 
-def prepare_dataset(traces: List[Dict[str, Any]], unroll: bool = False) -> Dataset:
-    """Convert traces to a Hugging Face dataset."""
+def prepare_rows(traces: List[Dict[str, Any]], unroll: bool = False) -> List[Dict[str, Any]]:
+    """Convert traces to dataset rows (one per trace, plus truncated copies with `unroll`)."""
     if not traces:
         raise ValueError("No valid traces to convert to dataset")
     
@@ -150,10 +162,17 @@ def prepare_dataset(traces: List[Dict[str, Any]], unroll: bool = False) -> Datas
             "truncated": False  # Mark as not truncated
         })
     
-    return Dataset.from_list(dataset_rows)
+    return dataset_rows
+
+def prepare_dataset(traces: List[Dict[str, Any]], unroll: bool = False) -> Dataset:
+    """Convert traces to a Hugging Face dataset."""
+    from datasets import Dataset
+    return Dataset.from_list(prepare_rows(traces, unroll))
 
 def push_to_hub(dataset: Dataset, repo_id: str):
     """Push the dataset to Hugging Face Hub."""
+    from huggingface_hub import HfApi
+
     try:
         # Check if user is logged in
         api = HfApi()
@@ -180,6 +199,10 @@ def main():
     parser.add_argument("--repo-id", required=True, help="Hugging Face Hub repository ID (e.g., 'username/dataset-name')")
     parser.add_argument("--trace-dir", default="traces", help="Directory containing trace files (default: 'traces')")
     parser.add_argument("--unroll", action="store_true", help="Create multiple examples from each trace by truncating at different points")
+    parser.add_argument("--dedup", action="store_true", help="Drop near-duplicate traces before building the dataset")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Similarity above which a trace is a duplicate (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--dedup-index", default=None, help="SQLite dedup index file, updated incrementally (default: in-memory)")
+    add_filter_arguments(parser)
     
     args = parser.parse_args()
     
@@ -189,7 +212,10 @@ def main():
     try:
         # Load traces
         console.print(f"[bold blue]Loading traces from {args.trace_dir}...[/bold blue]")
-        traces = load_traces(args.trace_dir)
+        try:
+            traces = load_traces(args.trace_dir, filters_from_args(args))
+        except ValueError as exc:
+            parser.error(str(exc))
         
         if not traces:
             console.print("[yellow]No valid traces found. Exiting.[/yellow]")
@@ -197,6 +223,16 @@ def main():
         
         console.print(f"[green]Loaded {len(traces)} trace files[/green]")
         
+        # Drop near-duplicates
+        if args.dedup:
+            console.print(f"[bold blue]Deduplicating traces (threshold {args.dedup_threshold})...[/bold blue]")
+            traces, dropped = dedup_traces(traces, threshold=args.dedup_threshold, index_path=args.dedup_index)
+            print_dropped(dropped)
+            console.print(f"[green]Kept {len(traces)} traces after deduplication[/green]")
+            if not traces:
+                console.print("[yellow]No traces left after deduplication. Exiting.[/yellow]")
+                return
+        
         # Prepare dataset
         console.print("[bold blue]Preparing dataset...[/bold blue]")
         if args.unroll:
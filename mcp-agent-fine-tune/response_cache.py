@@ -0,0 +1,157 @@
+"""
+Content-addressed, disk-backed cache for chat completion responses.
+
+Requests are keyed by a canonical SHA-256 hash of everything that determines
+the response (endpoint, model, messages, tools, tool_choice and sampling
+parameters). Responses are stored as JSON in a single SQLite file and evicted
+least-recently-used first once the cache grows past `max_bytes`.
+
+The cache is opt-in: callers pass `cache=None` to go straight to the API.
+Only deterministic requests (`temperature=0`) are cached, since replaying a
+stored sample for a sampled request would silently collapse every rerun onto
+the first sample; `cache_sampled=True` caches sampled requests too. With
+`bypass=True` lookups are skipped but fresh responses are still stored, which
+refreshes stale entries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:                   # imported on first cache hit to keep startup fast
+    from openai.types.chat import ChatCompletion
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of chat completion responses."""
+
+    def __init__(self, cache_dir: str = ".cache", *, max_bytes: int = DEFAULT_MAX_BYTES, bypass: bool = False,
+                 cache_sampled: bool = False):
+        self.path = Path(cache_dir) / "responses.sqlite"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value BLOB,
+                size INTEGER,
+                last_access REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access);
+            """
+        )
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        """Canonical hash of a request: key order and whitespace don't matter."""
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def cacheable(self, request: Dict[str, Any]) -> bool:
+        """Whether a request's response may be stored and replayed (temperature 0 unless `cache_sampled`)."""
+        return self.cache_sampled or request.get("temperature") == 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.bypass:
+            return None
+        with self._lock:
+            row = self.db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        blob = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old:
+                self.total_bytes -= old[0]
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self.total_bytes += len(blob)
+            self._evict()
+            self.db.commit()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries until the cache fits in max_bytes."""
+        while self.total_bytes > self.max_bytes:
+            rows = self.db.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def close(self) -> None:
+        with self._lock:
+            self.db.close()
+
+
+def _request_key(client, kwargs: Dict[str, Any]) -> str:
+    return ResponseCache.make_key({"base_url": str(client.base_url), **kwargs})
+
+
+def cached_chat_completion(client, cache: Optional[ResponseCache], **kwargs) -> ChatCompletion:
+    """`client.chat.completions.create(**kwargs)`, served from `cache` when possible."""
+    if cache is None or not cache.cacheable(kwargs):
+        return client.chat.completions.create(**kwargs)
+
+    key = _request_key(client, kwargs)
+    hit = cache.get(key)
+    if hit is not None:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(hit)
+
+    rsp = client.chat.completions.create(**kwargs)
+    cache.put(key, rsp.model_dump(mode="json"))
+    return rsp
+
+
+async def acached_chat_completion(client, cache: Optional[ResponseCache], **kwargs) -> ChatCompletion:
+    """
+    Async counterpart of `cached_chat_completion` for an `AsyncOpenAI` client.
+    SQLite reads and writes run in a worker thread to keep the event loop free.
+    """
+    if cache is None or not cache.cacheable(kwargs):
+        return await client.chat.completions.create(**kwargs)
+
+    key = _request_key(client, kwargs)
+    hit = await asyncio.to_thread(cache.get, key)
+    if hit is not None:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(hit)
+
+    rsp = await client.chat.completions.create(**kwargs)
+    await asyncio.to_thread(cache.put, key, rsp.model_dump(mode="json"))
+    return rsp
@@ -0,0 +1,416 @@
+"""
+Compile MCP tool input schemas into OpenAI parameter schemas and validators.
+
+`compile_schema` normalises a JSON Schema for OpenAI function calling (object
+root, unsupported string formats stripped everywhere, including inside
+`anyOf`/`oneOf`/`allOf`/`not`, `$defs`/`definitions`, `additionalProperties`,
+`items`/`prefixItems` and `patternProperties`) and builds a validator for tool
+arguments. Results are memoised by a canonical hash of the schema and, when
+the caller names the tool, by tool name: a rediscovered tool whose schema is
+equal to the one compiled last time (a C-level dict comparison) skips the
+hashing too.
+
+Validators are trees of small closures built once per schema; validating a
+typical tool call takes microseconds, so malformed arguments can be rejected
+locally and returned to the model instead of costing an MCP round trip.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# String formats OpenAI accepts; everything else is dropped.
+SUPPORTED_FORMATS = {"date-time", "enum"}
+
+# Keywords whose value is a single subschema / a list of subschemas / a map of subschemas.
+_SUBSCHEMA_KEYS = ("items", "additionalProperties", "not", "contains", "propertyNames",
+                   "if", "then", "else", "additionalItems", "unevaluatedProperties")
+_SUBSCHEMA_LIST_KEYS = ("anyOf", "oneOf", "allOf", "prefixItems")
+_SUBSCHEMA_MAP_KEYS = ("properties", "$defs", "definitions", "patternProperties", "dependentSchemas")
+
+ValidationError = Tuple[str, str]            # (JSON path, message)
+Validator = Callable[[Any, str, List[ValidationError]], None]
+
+_CACHE: Dict[str, "CompiledSchema"] = {}
+_BY_NAME: Dict[str, Tuple[dict, "CompiledSchema"]] = {}     # tool name → (schema as compiled, result)
+
+
+class CompiledSchema:
+    """An OpenAI-ready parameter schema plus a validator for arguments against it."""
+
+    __slots__ = ("key", "openai_schema", "_validate")
+
+    def __init__(self, key: str, openai_schema: dict, validate: Validator):
+        self.key = key
+        self.openai_schema = openai_schema
+        self._validate = validate
+
+    def validate(self, arguments: Any) -> List[ValidationError]:
+        """Return a list of (path, message) errors; empty means valid."""
+        errors: List[ValidationError] = []
+        self._validate(arguments, "$", errors)
+        return errors
+
+
+def schema_hash(schema: Any) -> str:
+    """Canonical hash of a schema: key order and whitespace don't matter."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def compile_schema(schema: Optional[dict], name: Optional[str] = None) -> CompiledSchema:
+    """
+    Normalise and compile a tool input schema, memoised by schema hash (and by
+    `name`, if given, as long as the schema is unchanged).
+    """
+    if schema is None:
+        schema = {"type": "object", "properties": {}}
+    if name is not None:
+        seen = _BY_NAME.get(name)
+        if seen is not None and seen[0] == schema:
+            return seen[1]
+    key = schema_hash(schema)
+    compiled = _CACHE.get(key)
+    if compiled is None:
+        normalized = normalize_root(copy.deepcopy(schema))
+        strip_unsupported_formats(normalized)
+        compiled = CompiledSchema(key, normalized, _Compiler(normalized).compile(normalized))
+        _CACHE[key] = compiled
+    if name is not None:
+        _BY_NAME[name] = (copy.deepcopy(schema), compiled)     # a copy: callers may mutate theirs
+    return compiled
+
+
+def clear_cache() -> None:
+    _CACHE.clear()
+    _BY_NAME.clear()
+
+
+# -----------------------------------------------------------------------------#
+#  Normalisation                                                               #
+# -----------------------------------------------------------------------------#
+def normalize_root(schema: dict) -> dict:
+    """Guarantee the root is an object so OpenAI is happy."""
+    if schema.get("type") == "object":
+        return schema
+
+    # Definitions must stay at the root for "#/$defs/..." refs to resolve.
+    defs = {k: schema.pop(k) for k in ("$defs", "definitions") if k in schema}
+    return {
+        "type": "object",
+        "properties": {"value": schema},
+        "required": ["value"],
+        **defs,
+    }
+
+
+def strip_unsupported_formats(node: Any) -> None:
+    """Remove JSON-Schema 'format' fields OpenAI doesn't recognise, at any depth."""
+    if isinstance(node, list):
+        for item in node:
+            strip_unsupported_formats(item)
+        return
+    if not isinstance(node, dict):
+        return
+    if "format" in node and node["format"] not in SUPPORTED_FORMATS and node.get("type") in ("string", None):
+        node.pop("format")
+    for key in _SUBSCHEMA_KEYS:
+        if isinstance(node.get(key), (dict, list)):
+            strip_unsupported_formats(node[key])
+    for key in _SUBSCHEMA_LIST_KEYS:
+        if isinstance(node.get(key), list):
+            strip_unsupported_formats(node[key])
+    for key in _SUBSCHEMA_MAP_KEYS:
+        if isinstance(node.get(key), dict):
+            for sub in node[key].values():
+                strip_unsupported_formats(sub)
+
+
+# -----------------------------------------------------------------------------#
+#  Validator compilation                                                       #
+# -----------------------------------------------------------------------------#
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool))
+                         or (isinstance(v, float) and v.is_integer()),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def _accept(value, path, errors) -> None:
+    return None
+
+
+def _short(value: Any) -> str:
+    text = json.dumps(value, default=str)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+class _Compiler:
+    """Turns one schema document into a tree of validator closures."""
+
+    def __init__(self, root: dict):
+        self.root = root
+        self.refs: Dict[str, Validator] = {}
+
+    def _resolve(self, ref: str) -> Optional[Any]:
+        if not ref.startswith("#"):
+            return None
+        node: Any = self.root
+        for part in ref[1:].lstrip("/").split("/") if ref != "#" else []:
+            part = part.replace("~1", "/").replace("~0", "~")
+            if isinstance(node, dict) and part in node:
+                node = node[part]
+            elif isinstance(node, list) and part.isdigit() and int(part) < len(node):
+                node = node[int(part)]
+            else:
+                return None
+        return node
+
+    def _compile_ref(self, ref: str) -> Validator:
+        if ref in self.refs:
+            return self.refs[ref]
+
+        # Placeholder first so recursive schemas terminate.
+        slot: List[Validator] = [_accept]
+        self.refs[ref] = lambda v, p, e: slot[0](v, p, e)
+        target = self._resolve(ref)
+        if target is not None:
+            slot[0] = self.compile(target)
+        return self.refs[ref]
+
+    def compile(self, schema: Any) -> Validator:
+        if schema is True or schema == {}:
+            return _accept
+        if schema is False:
+            return lambda v, p, e: e.append((p, "no value is allowed here"))
+        if not isinstance(schema, dict):
+            return _accept
+
+        checks: List[Validator] = []
+
+        if "$ref" in schema:
+            checks.append(self._compile_ref(schema["$ref"]))
+
+        if "type" in schema:
+            types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+            preds = [_TYPE_CHECKS[t] for t in types if t in _TYPE_CHECKS]
+            if preds:
+                expected = " or ".join(types)
+
+                def check_type(v, p, e, preds=preds, expected=expected):
+                    if not any(pred(v) for pred in preds):
+                        e.append((p, f"expected {expected}, got {_short(v)}"))
+                checks.append(check_type)
+
+        if "enum" in schema:
+            allowed = schema["enum"]
+            checks.append(lambda v, p, e: v in allowed or e.append((p, f"must be one of {_short(allowed)}")))
+        if "const" in schema:
+            const = schema["const"]
+            checks.append(lambda v, p, e: v == const or e.append((p, f"must equal {_short(const)}")))
+
+        checks.extend(self._string_checks(schema))
+        checks.extend(self._number_checks(schema))
+        checks.extend(self._object_checks(schema))
+        checks.extend(self._array_checks(schema))
+        checks.extend(self._combinator_checks(schema))
+
+        if not checks:
+            return _accept
+        if len(checks) == 1:
+            return checks[0]
+
+        def validate_all(v, p, e, checks=tuple(checks)):
+            for check in checks:
+                check(v, p, e)
+        return validate_all
+
+    # -- keyword groups ---------------------------------------------------#
+    def _string_checks(self, schema: dict) -> List[Validator]:
+        checks: List[Validator] = []
+        if "minLength" in schema:
+            n = schema["minLength"]
+            checks.append(lambda v, p, e: not isinstance(v, str) or len(v) >= n
+                          or e.append((p, f"must be at least {n} characters")))
+        if "maxLength" in schema:
+            n = schema["maxLength"]
+            checks.append(lambda v, p, e: not isinstance(v, str) or len(v) <= n
+                          or e.append((p, f"must be at most {n} characters")))
+        if "pattern" in schema:
+            try:
+                rx = re.compile(schema["pattern"])
+            except re.error:
+                rx = None
+            if rx is not None:
+                checks.append(lambda v, p, e: not isinstance(v, str) or rx.search(v)
+                              or e.append((p, f"must match pattern {rx.pattern!r}")))
+        return checks
+
+    def _number_checks(self, schema: dict) -> List[Validator]:
+        checks: List[Validator] = []
+        is_num = _TYPE_CHECKS["number"]
+        for key, op, text in (
+            ("minimum", lambda v, n: v >= n, ">="),
+            ("maximum", lambda v, n: v <= n, "<="),
+            ("exclusiveMinimum", lambda v, n: v > n, ">"),
+            ("exclusiveMaximum", lambda v, n: v < n, "<"),
+        ):
+            n = schema.get(key)
+            if isinstance(n, (int, float)) and not isinstance(n, bool):
+                checks.append(lambda v, p, e, n=n, op=op, text=text: not is_num(v) or op(v, n)
+                              or e.append((p, f"must be {text} {n}")))
+        if isinstance(schema.get("multipleOf"), (int, float)) and schema["multipleOf"]:
+            m = schema["multipleOf"]
+            checks.append(lambda v, p, e: not is_num(v) or (v / m).is_integer()
+                          or e.append((p, f"must be a multiple of {m}")))
+        return checks
+
+    def _object_checks(self, schema: dict) -> List[Validator]:
+        checks: List[Validator] = []
+        props = {k: self.compile(s) for k, s in (schema.get("properties") or {}).items()}
+        patterns = []
+        bad_pattern = False
+        for k, s in (schema.get("patternProperties") or {}).items():
+            try:
+                patterns.append((re.compile(k), self.compile(s)))
+            except re.error:
+                bad_pattern = True          # skipped like `pattern`; can't tell which names it covers
+        required = list(schema.get("required") or [])
+        additional = schema.get("additionalProperties", True)
+        extra = None if additional is True or bad_pattern else self.compile(additional)
+
+        if required:
+            def check_required(v, p, e):
+                if isinstance(v, dict):
+                    for name in required:
+                        if name not in v:
+                            e.append((f"{p}.{name}", "required property is missing"))
+            checks.append(check_required)
+
+        if props or patterns or extra is not None:
+            def check_properties(v, p, e):
+                if not isinstance(v, dict):
+                    return
+                for name, value in v.items():
+                    sub = f"{p}.{name}"
+                    matched = False
+                    if name in props:
+                        props[name](value, sub, e)
+                        matched = True
+                    for rx, validator in patterns:
+                        if rx.search(name):
+                            validator(value, sub, e)
+                            matched = True
+                    if not matched and extra is not None:
+                        if additional is False:
+                            e.append((sub, "unexpected property"))
+                        else:
+                            extra(value, sub, e)
+            checks.append(check_properties)
+
+        for key, text in (("minProperties", ">="), ("maxProperties", "<=")):
+            if key in schema:
+                n = schema[key]
+                op = (lambda a, b: a >= b) if text == ">=" else (lambda a, b: a <= b)
+                checks.append(lambda v, p, e, n=n, op=op, text=text: not isinstance(v, dict) or op(len(v), n)
+                              or e.append((p, f"must have {text} {n} properties")))
+        return checks
+
+    def _array_checks(self, schema: dict) -> List[Validator]:
+        checks: List[Validator] = []
+        items = schema.get("items")
+        prefix = schema.get("prefixItems")
+        if isinstance(items, list):                 # draft-07 tuple form
+            prefix, items = items, schema.get("additionalItems", True)
+        prefix_validators = [self.compile(s) for s in (prefix or [])]
+        item_validator = None if items is None or items is True else self.compile(items)
+
+        if prefix_validators or item_validator is not None:
+            def check_items(v, p, e):
+                if not isinstance(v, list):
+                    return
+                for i, value in enumerate(v):
+                    if i < len(prefix_validators):
+                        prefix_validators[i](value, f"{p}[{i}]", e)
+                    elif item_validator is not None:
+                        item_validator(value, f"{p}[{i}]", e)
+            checks.append(check_items)
+
+        if "minItems" in schema:
+            n = schema["minItems"]
+            checks.append(lambda v, p, e: not isinstance(v, list) or len(v) >= n
+                          or e.append((p, f"must have at least {n} items")))
+        if "maxItems" in schema:
+            n = schema["maxItems"]
+            checks.append(lambda v, p, e: not isinstance(v, list) or len(v) <= n
+                          or e.append((p, f"must have at most {n} items")))
+        if schema.get("uniqueItems"):
+            def check_unique(v, p, e):
+                if isinstance(v, list):
+                    seen = [json.dumps(x, sort_keys=True, default=str) for x in v]
+                    if len(set(seen)) != len(seen):
+                        e.append((p, "items must be unique"))
+            checks.append(check_unique)
+        return checks
+
+    def _combinator_checks(self, schema: dict) -> List[Validator]:
+        checks: List[Validator] = []
+        for sub in schema.get("allOf") or []:
+            checks.append(self.compile(sub))
+
+        if schema.get("anyOf"):
+            options = [self.compile(s) for s in schema["anyOf"]]
+
+            def check_any(v, p, e):
+                best: Optional[List[ValidationError]] = None
+                for option in options:
+                    errs: List[ValidationError] = []
+                    option(v, p, errs)
+                    if not errs:
+                        return
+                    if best is None or len(errs) < len(best):
+                        best = errs
+                e.append((p, "does not match any of the allowed schemas (anyOf)"))
+                e.extend(best or [])
+            checks.append(check_any)
+
+        if schema.get("oneOf"):
+            options = [self.compile(s) for s in schema["oneOf"]]
+
+            def check_one(v, p, e):
+                matches = 0
+                for option in options:
+                    errs: List[ValidationError] = []
+                    option(v, p, errs)
+                    matches += not errs
+                if matches != 1:
+                    e.append((p, f"must match exactly one schema (oneOf), matched {matches}"))
+            checks.append(check_one)
+
+        if "not" in schema:
+            negated = self.compile(schema["not"])
+
+            def check_not(v, p, e):
+                errs: List[ValidationError] = []
+                negated(v, p, errs)
+                if not errs:
+                    e.append((p, "must not match the 'not' schema"))
+            checks.append(check_not)
+        return checks
+
+
+def format_errors(tool_name: str, errors: List[ValidationError]) -> str:
+    """Human- and model-readable summary of validation errors."""
+    lines = [f"Invalid arguments for tool '{tool_name}':"]
+    lines.extend(f"- {path}: {message}" for path, message in errors)
+    lines.append("Fix the arguments to match the tool's parameter schema and call the tool again.")
+    return "\n".join(lines)
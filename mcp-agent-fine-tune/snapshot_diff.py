@@ -0,0 +1,148 @@
+"""
+Accessibility-snapshot diffing for Playwright MCP tool results.
+
+The Playwright MCP server appends a full YAML page snapshot to the result of
+every navigate/click/type. Most of it is unchanged between consecutive steps
+on the same page. `SnapshotDiffer` keeps the last snapshot per tab and
+replaces the snapshot block with a compact structural diff: nodes that were
+added, whose line changed, or that were removed, keyed by their `[ref=eN]`
+so the model still has every ref it needs to act on new or changed elements.
+
+The full snapshot is still sent when:
+- the tab has no previous snapshot (first visit, newly selected tab),
+- the diff would not be much smaller than the snapshot itself,
+- the model explicitly calls the snapshot tool (the on-demand fallback).
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+SNAPSHOT_TOOL = "browser_snapshot"
+
+_SNAPSHOT_RE = re.compile(r"(- Page Snapshot\n```yaml\n)(.*?)(\n```|\Z)", re.S)
+_CURRENT_TAB_RE = re.compile(r"^- (\d+): \(current\)", re.M)
+_REF_RE = re.compile(r"\[ref=([^\]]+)\]")
+
+Node = Tuple[int, str, Optional[str], List[str]]     # (depth, line, parent ref, ref-less child lines)
+
+
+def parse_nodes(snapshot: str) -> Dict[str, Node]:
+    """
+    Index a YAML snapshot by element ref.
+
+    Each ref'd line becomes a node carrying its depth, its own line, the ref of
+    its nearest ref'd ancestor, and the ref-less lines nested directly under it
+    (e.g. `- /url: ...`, `- text: ...`), which count as part of its content.
+    Lines before the first ref'd node are collected under the key "".
+    """
+    nodes: Dict[str, Node] = {"": (-1, "", None, [])}
+    stack: List[Tuple[int, str]] = []       # (depth, ref) of open ref'd ancestors
+    for line in snapshot.splitlines():
+        if not line.strip():
+            continue
+        depth = len(line) - len(line.lstrip(" "))
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        match = _REF_RE.search(line)
+        if match:
+            ref = match.group(1)
+            parent = stack[-1][1] if stack else None
+            nodes[ref] = (depth, line.strip(), parent, [])
+            stack.append((depth, ref))
+        else:
+            owner = stack[-1][1] if stack else ""
+            nodes[owner][3].append(line.strip())
+    return nodes
+
+
+def diff_snapshots(old: str, new: str) -> Tuple[str, int, int]:
+    """
+    Structural diff of two snapshots.
+
+    Returns (diff_text, changed_nodes, unchanged_nodes). Added and changed
+    nodes are listed in document order with their ancestor ref, so the model
+    can place them; removed nodes are listed by ref.
+    """
+    before, after = parse_nodes(old), parse_nodes(new)
+    added: List[str] = []
+    changed: List[str] = []
+    touched = unchanged = 0
+
+    for ref, (depth, line, parent, extra) in after.items():
+        if ref == "":
+            continue
+        where = f"  # in {parent}" if parent else ""
+        body = [f"{line}{where}"] + [f"  {x}" for x in extra]
+        prev = before.get(ref)
+        if prev is None:
+            added.extend(body)
+            touched += 1
+        elif (prev[1], prev[2], prev[3]) != (line, parent, extra):
+            changed.extend(body)
+            touched += 1
+        else:
+            unchanged += 1
+
+    removed = [ref for ref in before if ref and ref not in after]
+
+    out: List[str] = []
+    if added:
+        out += ["# added"] + added
+    if changed:
+        out += ["# changed"] + changed
+    if removed:
+        out += ["# removed", "- " + ", ".join(removed)]
+    return "\n".join(out), touched + len(removed), unchanged
+
+
+class SnapshotDiffer:
+    """Replaces repeated page snapshots in tool results with diffs, per tab."""
+
+    def __init__(self, *, max_ratio: float = 0.6):
+        self.max_ratio = max_ratio               # send the full snapshot if the diff is larger than this fraction
+        self.last: Dict[str, str] = {}           # tab → last snapshot sent (in full or as a diff)
+        self.stats = {"full": 0, "diff": 0, "chars_saved": 0}
+
+    @staticmethod
+    def _tab_key(text: str) -> str:
+        match = _CURRENT_TAB_RE.search(text)
+        return match.group(1) if match else "1"
+
+    def process(self, tool_name: Optional[str], text: str) -> str:
+        """Return the tool result text with its snapshot replaced by a diff when worthwhile."""
+        match = _SNAPSHOT_RE.search(text)
+        if not match:
+            return text
+
+        tab = self._tab_key(text)
+        snapshot = match.group(2)
+        previous = self.last.get(tab)
+        self.last[tab] = snapshot
+
+        if previous is None or tool_name == SNAPSHOT_TOOL:
+            self.stats["full"] += 1
+            return text
+
+        if previous == snapshot:
+            diff, n_changed, unchanged = "", 0, len(parse_nodes(snapshot)) - 1
+        else:
+            diff, n_changed, unchanged = diff_snapshots(previous, snapshot)
+        if len(diff) > self.max_ratio * len(snapshot):
+            self.stats["full"] += 1
+            return text
+
+        header = (
+            f"- Page Snapshot diff (vs. previous snapshot of this tab: {n_changed} node(s) changed, "
+            f"{unchanged} unchanged and omitted; refs in the previous snapshot remain valid unless removed; "
+            f"call {SNAPSHOT_TOOL} for the full snapshot)\n```yaml\n"
+        )
+        body = diff or "# no changes"
+        replaced = text[:match.start()] + header + body + match.group(3) + text[match.end():]
+        self.stats["diff"] += 1
+        self.stats["chars_saved"] += len(text) - len(replaced)
+        return replaced
+
+    def reset(self) -> None:
+        self.last.clear()
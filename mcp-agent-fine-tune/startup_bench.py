@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the CLI entry points.
+
+Measures, over several runs:
+  * import time of `agent` (from `python -X importtime`), with the slowest modules
+  * wall time of `agent.py --help` and `push-to-hub.py --help`
+  * time until the interactive agent shows its first "You" prompt
+
+Results are appended to benchmarks/startup.jsonl together with the git
+revision, so numbers can be compared across commits.
+
+Usage:
+  uv run startup_bench.py [--runs 5] [--config config.json] [--no-record]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import select
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+HERE = Path(__file__).resolve().parent
+RESULTS_FILE = HERE / "benchmarks" / "startup.jsonl"
+
+
+def import_profile(module: str = "agent", top: int = 8) -> Tuple[float, List[Tuple[str, float]]]:
+    """Total import time of `module` (ms) and its `top` slowest direct imports by cumulative time."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    # Lines read "import time: self [us] | cumulative | <name>", children before their
+    # parent, with the name indented two spaces per nesting level.
+    children: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = int(cum) / 1000
+        elif depth == 0:
+            if name.strip() == module:
+                slowest = sorted(children.items(), key=lambda x: -x[1])[:top]
+                return int(cum) / 1000, slowest
+            children = {}
+    return 0.0, []
+
+
+def time_command(args: List[str], runs: int) -> float:
+    """Median wall time (ms) of running `args` to completion."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=HERE, capture_output=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def time_to_prompt(config: str, runs: int, timeout: float = 60.0) -> Optional[float]:
+    """Median time (ms) from launching the interactive agent until it prints the first prompt."""
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "startup-bench"}
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "agent.py", "--config", config],
+            cwd=HERE, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        seen = b""
+        elapsed = None
+        while time.perf_counter() - start < timeout:
+            ready, _, _ = select.select([proc.stdout], [], [], 0.5)
+            if not ready:
+                continue
+            chunk = os.read(proc.stdout.fileno(), 4096)
+            if not chunk:
+                break
+            seen += chunk
+            if b"You:" in seen:
+                elapsed = (time.perf_counter() - start) * 1000
+                break
+        try:
+            proc.communicate(b"exit\n", timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+        if elapsed is None:
+            return None
+        samples.append(elapsed)
+    return statistics.median(samples)
+
+
+def git_revision() -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True)
+    return proc.stdout.strip() or "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup time")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measurement (median is reported)")
+    parser.add_argument("--config", default="config.json", help="MCP config used for the time-to-prompt run")
+    parser.add_argument("--no-record", action="store_true", help=f"Don't append results to {RESULTS_FILE.name}")
+    args = parser.parse_args()
+    config = Path(args.config).resolve()         # the agent runs from this directory, not the caller's
+    if not config.is_file():
+        parser.error(f"MCP config {args.config} not found (time to first prompt needs the servers it starts)")
+
+    import_ms, slowest = import_profile()
+    result = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "git_rev": git_revision(),
+        "python": sys.version.split()[0],
+        "import_agent_ms": round(import_ms, 1),
+        "agent_help_ms": round(time_command([sys.executable, "agent.py", "--help"], args.runs), 1),
+        "push_help_ms": round(time_command([sys.executable, "push-to-hub.py", "--help"], args.runs), 1),
+        "first_prompt_ms": time_to_prompt(str(config), args.runs),
+    }
+    if result["first_prompt_ms"] is not None:
+        result["first_prompt_ms"] = round(result["first_prompt_ms"], 1)
+
+    table = Table(title=f"Startup ({result['git_rev']}, median of {args.runs})")
+    table.add_column("Measurement")
+    table.add_column("ms", justify="right")
+    table.add_row("import agent", f"{result['import_agent_ms']:.1f}")
+    table.add_row("agent.py --help", f"{result['agent_help_ms']:.1f}")
+    table.add_row("push-to-hub.py --help", f"{result['push_help_ms']:.1f}")
+    table.add_row("first prompt", "n/a" if result["first_prompt_ms"] is None else f"{result['first_prompt_ms']:.1f}")
+    console.print(table)
+
+    imports = Table(title="Slowest imports under `import agent`")
+    imports.add_column("Module")
+    imports.add_column("ms", justify="right")
+    for name, ms in slowest:
+        imports.add_row(name, f"{ms:.1f}")
+    console.print(imports)
+
+    if not args.no_record:
+        RESULTS_FILE.parent.mkdir(exist_ok=True)
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        console.print(f"[green]Appended results to {RESULTS_FILE.relative_to(HERE)}[/green]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Minimal OpenAI-compatible stub server for testing without a GPU.
+
+Serves `GET /v1/models` and `POST /v1/chat/completions` (streaming and
+non-streaming, with `n` choices when non-streaming). Responses are canned: a fixed number of short tokens emitted
+after a configurable prefill delay, with a configurable delay between tokens.
+If the request carries tools and the last message is from the user, the stub
+answers with a call to the first tool instead, with `--tool-arguments` as
+the raw arguments string (default "{}"; pass malformed JSON to exercise the
+agent's argument repair).
+
+Usage:
+  uv run stub_server.py [--port=8000] [--ttft-ms=50] [--itl-ms=5] [--tokens=32] [--tool-arguments='{"url": "x",']
+"""
+
+import argparse
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ttft_s = 0.05
+    itl_s = 0.005
+    tokens = 32
+    tool_arguments = "{}"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ------------------------------------------------------------------#
+    #  Helpers                                                          #
+    # ------------------------------------------------------------------#
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, payload: str) -> None:
+        data = f"data: {payload}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    @staticmethod
+    def _tool_call(req: dict):
+        tools = req.get("tools") or []
+        messages = req.get("messages") or []
+        if not tools or not messages or messages[-1].get("role") != "user":
+            return None
+        return {
+            "id": f"call_{uuid.uuid4().hex[:8]}",
+            "type": "function",
+            "function": {"name": tools[0]["function"]["name"], "arguments": StubHandler.tool_arguments},
+        }
+
+    # ------------------------------------------------------------------#
+    #  Routes                                                           #
+    # ------------------------------------------------------------------#
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        n_tokens = min(self.tokens, req.get("max_tokens") or req.get("max_completion_tokens") or self.tokens)
+        prompt_tokens = len(json.dumps(req.get("messages", []))) // 4
+        tool_call = self._tool_call(req)
+        if tool_call:
+            n_tokens = 1
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": req.get("model", "stub-model")}
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens, "total_tokens": prompt_tokens + n_tokens}
+
+        time.sleep(self.ttft_s)
+
+        if not req.get("stream"):
+            time.sleep(self.itl_s * max(n_tokens - 1, 0))
+            message = {"role": "assistant", "content": "" if tool_call else " ".join(f"tok{i}" for i in range(n_tokens))}
+            if tool_call:
+                message["tool_calls"] = [tool_call]
+            choices = [
+                {"index": i, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}
+                for i in range(max(int(req.get("n") or 1), 1))
+            ]
+            self._send_json(200, {**base, "object": "chat.completion", "choices": choices, "usage": usage})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> str:
+            return json.dumps({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            })
+
+        if tool_call:
+            self._send_chunk(chunk({"role": "assistant", "tool_calls": [{"index": 0, **tool_call}]}))
+        else:
+            for i in range(n_tokens):
+                if i:
+                    time.sleep(self.itl_s)
+                self._send_chunk(chunk({"content": f"tok{i} "}))
+        extra = {"usage": usage} if (req.get("stream_options") or {}).get("include_usage") else {}
+        self._send_chunk(chunk({}, "tool_calls" if tool_call else "stop", **extra))
+        self._send_chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind (default: 8000)")
+    parser.add_argument("--ttft-ms", type=float, default=50, help="Delay before the first token (default: 50)")
+    parser.add_argument("--itl-ms", type=float, default=5, help="Delay between tokens (default: 5)")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens per response (default: 32)")
+    parser.add_argument("--tool-arguments", default="{}", help="Raw arguments string of stub tool calls (default: {})")
+    args = parser.parse_args()
+
+    StubHandler.ttft_s = args.ttft_ms / 1000
+    StubHandler.itl_s = args.itl_ms / 1000
+    StubHandler.tokens = args.tokens
+    StubHandler.tool_arguments = args.tool_arguments
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
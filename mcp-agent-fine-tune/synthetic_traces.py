@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Synthetic conversation traces shaped like the real ones in `traces/`.
+
+Each trace has a system prompt, a user request, then `turns` assistant steps
+that each carry reasoning content and one or two Playwright-style tool calls,
+with tool results made of the "Ran Playwright code" preamble plus a YAML
+accessibility snapshot of roughly `snapshot_chars` characters, and a final
+assistant answer. Tools are browser-style function schemas; `mcp_tools` gives
+the same tools in MCP form (name / description / inputSchema) as servers
+return them from tools/list.
+
+Generation is deterministic for a given seed, so benchmarks built on these
+traces are comparable between runs and commits.
+
+Usage:
+  uv run synthetic_traces.py --out synthetic_traces --count 20 [--turns 8] [--snapshot-chars 16000] [--tools 25]
+"""
+
+import argparse
+import datetime
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+WORDS = (
+    "research tools tutorials language models fine tuning evals time series product repo content "
+    "pricing about contact blog newsletter subscribe github video course license download support "
+    "inference deployment dataset training agent browser navigate click page link button heading"
+).split()
+
+ROLES = ["link", "button", "heading", "paragraph", "listitem", "img", "textbox", "generic", "navigation"]
+
+# Browser-style tools: (name, description, {param: (type, description, format)}, required)
+BASE_TOOLS = [
+    ("browser_navigate", "Navigate to a URL", {"url": ("string", "The URL to navigate to", "uri")}, ["url"]),
+    ("browser_click", "Perform click on a web page", {
+        "element": ("string", "Human-readable element description used to obtain permission to interact with the element", None),
+        "ref": ("string", "Exact target element reference from the page snapshot", None),
+    }, ["element", "ref"]),
+    ("browser_type", "Type text into editable element", {
+        "element": ("string", "Human-readable element description", None),
+        "ref": ("string", "Exact target element reference from the page snapshot", None),
+        "text": ("string", "Text to type into the element", None),
+        "submit": ("boolean", "Whether to submit entered text (press Enter after)", None),
+    }, ["element", "ref", "text"]),
+    ("browser_snapshot", "Capture accessibility snapshot of the current page", {}, []),
+    ("browser_navigate_back", "Go back to the previous page", {}, []),
+    ("browser_wait_for", "Wait for text to appear or disappear or a specified time to pass", {
+        "time": ("number", "The time to wait in seconds", None),
+        "text": ("string", "The text to wait for", None),
+    }, []),
+]
+READ_ONLY_TOOLS = ("browser_snapshot", "browser_wait_for")     # readOnlyHint, as in the Playwright MCP server
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def make_snapshot(rng: random.Random, chars: int, start_ref: int = 2) -> str:
+    """A YAML accessibility snapshot of about `chars` characters with nested [ref=eN] nodes."""
+    lines: List[str] = []
+    size = 0
+    ref = start_ref
+    depth = 0
+    while size < chars:
+        role = rng.choice(ROLES)
+        line = f'{"  " * depth}- {role} "{_words(rng, rng.randint(1, 6))}" [ref=e{ref}]'
+        if role == "link":
+            line += ":"
+            lines.append(line)
+            line = f'{"  " * (depth + 1)}- /url: /{rng.choice(WORDS)}/{rng.choice(WORDS)}'
+        lines.append(line)
+        size += len(line) + 1
+        ref += 1
+        depth = max(0, min(depth + rng.choice((-1, 0, 0, 1)), 6))
+    return "\n".join(lines)
+
+
+def make_tool_result(rng: random.Random, tool: str, snapshot_chars: int) -> str:
+    url = f"https://example.com/{rng.choice(WORDS)}"
+    return (
+        f"- Ran Playwright code:\n```js\n// {tool}\nawait page.goto('{url}');\n```\n\n"
+        f"- Page URL: {url}\n- Page Title: {_words(rng, 6).title()}\n"
+        f"- Page Snapshot\n```yaml\n{make_snapshot(rng, snapshot_chars)}\n```\n"
+    )
+
+
+def make_tools(n_tools: int) -> List[Dict[str, Any]]:
+    """`n_tools` MCP-format tools: the browser tools, then numbered variants of them."""
+    tools = []
+    for i in range(n_tools):
+        name, description, params, required = BASE_TOOLS[i % len(BASE_TOOLS)]
+        if i >= len(BASE_TOOLS):
+            name = f"{name}_{i // len(BASE_TOOLS)}"
+        properties = {}
+        for pname, (ptype, pdesc, fmt) in params.items():
+            properties[pname] = {"type": ptype, "description": pdesc}
+            if fmt:
+                properties[pname]["format"] = fmt
+        tools.append({
+            "name": name,
+            "description": description,
+            "inputSchema": {
+                "type": "object",
+                "properties": properties,
+                "required": required,
+                "additionalProperties": False,
+                "$schema": "http://json-schema.org/draft-07/schema#",
+            },
+            "annotations": {"readOnlyHint": name.startswith(READ_ONLY_TOOLS)},
+        })
+    return tools
+
+
+def openai_tools(mcp_tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """MCP tools in the OpenAI format stored in traces (no schema compilation)."""
+    return [{
+        "type": "function",
+        "function": {"name": t["name"], "description": t["description"], "parameters": t["inputSchema"]},
+    } for t in mcp_tools]
+
+
+def make_trace(turns: int = 8, snapshot_chars: int = 16000, n_tools: int = 25, seed: int = 0) -> Dict[str, Any]:
+    """One synthetic trace with `turns` tool-calling assistant steps and a final answer."""
+    rng = random.Random(seed)
+    tools = make_tools(n_tools)
+    messages: List[Dict[str, Any]] = [
+        {"role": "system", "content": _words(rng, 80)},
+        {"role": "user", "content": f"go to example.com and find the {_words(rng, 8)}"},
+    ]
+    call = 0
+    for _ in range(turns):
+        calls = []
+        for _ in range(rng.choice((1, 1, 1, 2))):
+            tool = rng.choice(tools[:len(BASE_TOOLS)])
+            args = {p: (f"e{rng.randint(2, 400)}" if p == "ref" else _words(rng, 3))
+                    for p in tool["inputSchema"]["required"]}
+            calls.append({
+                "id": f"chatcmpl-tool-{seed:04d}{call:06d}",
+                "type": "function",
+                "function": {"name": tool["name"], "arguments": args},
+            })
+            call += 1
+        messages.append({
+            "role": "assistant",
+            "content": "\n\n",
+            "reasoning_content": _words(rng, rng.randint(40, 200)),
+            "tool_calls": calls,
+        })
+        for tc in calls:
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tc["id"],
+                "content": make_tool_result(rng, tc["function"]["name"], snapshot_chars),
+            })
+    messages.append({
+        "role": "assistant",
+        "content": _words(rng, 40),
+        "reasoning_content": _words(rng, 120),
+    })
+    return {
+        "timestamp": datetime.datetime(2025, 5, 29).strftime("%Y%m%d_%H%M%S"),
+        "model": "synthetic",
+        "messages": messages,
+        "tools": openai_tools(tools),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic traces shaped like the recorded ones")
+    parser.add_argument("--out", default="synthetic_traces", help="Output directory (default: synthetic_traces)")
+    parser.add_argument("--count", type=int, default=20, help="Number of traces (default: 20)")
+    parser.add_argument("--turns", type=int, default=8, help="Tool-calling assistant turns per trace (default: 8)")
+    parser.add_argument("--snapshot-chars", type=int, default=16000, help="Approximate snapshot size (default: 16000)")
+    parser.add_argument("--tools", type=int, default=25, help="Tools per trace (default: 25)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first trace (default: 0)")
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    for i in range(args.count):
+        trace = make_trace(args.turns, args.snapshot_chars, args.tools, seed=args.seed + i)
+        with open(out / f"synthetic_{args.seed + i:05d}.json", "w") as f:
+            json.dump(trace, f, indent=2)
+    print(f"Wrote {args.count} traces to {out}/")
+
+
+if __name__ == "__main__":
+    main()
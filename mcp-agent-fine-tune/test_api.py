@@ -1,27 +1,184 @@
 #!/usr/bin/env python3
 """
 Test script to check available models on an OpenAI-compatible API endpoint
+
+With --load, instead sweeps concurrency levels using realistic agent payloads
+(conversation prefixes and tools taken from recorded traces), streaming every
+response and reporting TTFT, inter-token latency, output tokens/s and
+p50/p95/p99 latency per level.
+
+Usage:
+  uv run test_api.py https://your-api-endpoint/v1
+  uv run test_api.py http://localhost:8000/v1 --load --concurrency 1,4,16,64 --model Qwen/Qwen3-30B-A3B-FP8
+  uv run test_api.py http://replica-a:8000/v1,http://replica-b:8000/v1 --load
+
+Several comma-separated base URLs are each smoke-tested in turn, and load
+tests spread requests across them (see endpoint_pool.py).
 """
 
+import argparse
+import asyncio
 import requests
 import json
-import sys
+import math
+import time
+from pathlib import Path
 
-def main():
-    # Get base URL from command line or use default
-    base_url = sys.argv[1] if len(sys.argv) > 1 else "https://0zslbmx98vpo2i-8000.proxy.runpod.net/v1"
-    
-    # Fix URL if needed
-    if base_url.endswith("--show-reasoning"):
-        base_url = base_url.replace("--show-reasoning", "")
-    
-    # Ensure URL ends with /v1
-    if not base_url.endswith("/v1"):
-        if "/v1" not in base_url:
-            base_url = f"{base_url}/v1"
-    
-    print(f"Testing API endpoint: {base_url}")
-    
+from endpoint_pool import make_async_client, parse_base_urls, session_client
+
+DEFAULT_BASE_URL = "https://0zslbmx98vpo2i-8000.proxy.runpod.net/v1"
+DEFAULT_MODEL = "Qwen/Qwen3-30B-A3B-FP8"
+
+# -----------------------------------------------------------------------------#
+#  Load testing                                                                #
+# -----------------------------------------------------------------------------#
+def percentile(values, pct):
+    """Nearest-rank percentile of a list (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+def load_payloads(trace_dir, max_payloads=None):
+    """
+    Build (messages, tools) request bodies from every assistant turn of every
+    recorded trace, so requests carry the real tools array and long snapshots.
+    """
+    from test_trace_reload import _api_messages, iter_assistant_turns
+
+    payloads = []
+    for trace_file in sorted(Path(trace_dir).glob("*.json")):
+        try:
+            with open(trace_file, "r") as f:
+                trace = json.load(f)
+        except Exception as e:
+            print(f"Skipping {trace_file}: {e}")
+            continue
+        tools = trace.get("tools", [])
+        for _, prefix, _ in iter_assistant_turns(trace.get("messages", [])):
+            payloads.append({"messages": _api_messages(prefix), "tools": tools, "trace": trace_file.name})
+    if max_payloads:
+        payloads = payloads[:max_payloads]
+    return payloads
+
+async def _stream_one(client, model, payload, max_tokens):
+    """Send one streamed request and time its chunks."""
+    start = time.perf_counter()
+    first = None
+    token_times = []
+    usage_tokens = None
+    try:
+        stream = await session_client(client, payload.get("trace")).chat.completions.create(
+            model=model,
+            messages=payload["messages"],
+            tools=payload["tools"] or None,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage_tokens = chunk.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if (delta.content or getattr(delta, "reasoning_content", None) or delta.tool_calls):
+                now = time.perf_counter()
+                if first is None:
+                    first = now
+                token_times.append(now)
+    except Exception as e:
+        return {"error": str(e), "latency": time.perf_counter() - start}
+
+    end = time.perf_counter()
+    tokens = usage_tokens if usage_tokens is not None else len(token_times)
+    return {
+        "error": None,
+        "latency": end - start,
+        "ttft": (first - start) if first is not None else None,
+        "itl": [b - a for a, b in zip(token_times, token_times[1:])],
+        "tokens": tokens,
+        "decode_tps": (tokens - 1) / (end - first) if first is not None and tokens > 1 and end > first else None,
+    }
+
+async def run_level(client, model, payloads, concurrency, num_requests, max_tokens):
+    """Run `num_requests` streamed requests with `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(i):
+        async with semaphore:
+            return await _stream_one(client, model, payloads[i % len(payloads)], max_tokens)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(worker(i) for i in range(num_requests)))
+    wall = time.perf_counter() - start
+
+    ok = [r for r in results if r["error"] is None]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    itls = [gap for r in ok for gap in r["itl"]]
+    latencies = [r["latency"] for r in ok]
+    decode = [r["decode_tps"] for r in ok if r["decode_tps"] is not None]
+    total_tokens = sum(r["tokens"] for r in ok)
+
+    return {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "errors": len(results) - len(ok),
+        "first_error": next((r["error"] for r in results if r["error"]), None),
+        "wall_s": wall,
+        "requests_per_s": len(ok) / wall if wall else None,
+        "output_tokens_per_s": total_tokens / wall if wall else None,
+        "decode_tokens_per_s_per_request": sum(decode) / len(decode) if decode else None,
+        **{f"ttft_p{p}_s": percentile(ttfts, p) for p in (50, 95, 99)},
+        **{f"itl_p{p}_s": percentile(itls, p) for p in (50, 95, 99)},
+        **{f"latency_p{p}_s": percentile(latencies, p) for p in (50, 95, 99)},
+    }
+
+def _fmt(value, scale=1.0, digits=1):
+    return "-" if value is None else f"{value * scale:.{digits}f}"
+
+def print_load_results(levels):
+    """Print one row per concurrency level."""
+    header = (f"{'conc':>5} {'reqs':>5} {'err':>4} {'req/s':>7} {'out tok/s':>10} {'tok/s/req':>10} "
+              f"{'TTFT p50/p95/p99 ms':>22} {'ITL p50/p95/p99 ms':>21} {'lat p50/p95/p99 s':>21}")
+    print("\n" + header)
+    print("-" * len(header))
+    for r in levels:
+        ttft = "/".join(_fmt(r[f"ttft_p{p}_s"], 1000, 0) for p in (50, 95, 99))
+        itl = "/".join(_fmt(r[f"itl_p{p}_s"], 1000, 1) for p in (50, 95, 99))
+        lat = "/".join(_fmt(r[f"latency_p{p}_s"], 1, 2) for p in (50, 95, 99))
+        print(f"{r['concurrency']:>5} {r['requests']:>5} {r['errors']:>4} {_fmt(r['requests_per_s'], digits=2):>7} "
+              f"{_fmt(r['output_tokens_per_s']):>10} {_fmt(r['decode_tokens_per_s_per_request']):>10} "
+              f"{ttft:>22} {itl:>21} {lat:>21}")
+        if r["first_error"]:
+            print(f"      first error: {r['first_error']}")
+
+async def load_test(base_url, model, levels, requests_per_level, max_tokens, trace_dir, api_key):
+    """Sweep the given concurrency levels and return per-level metrics."""
+    payloads = load_payloads(trace_dir)
+    if not payloads:
+        print(f"No trace payloads found in '{trace_dir}', using a plain prompt")
+        payloads = [{"messages": [{"role": "user", "content": "Say hello"}], "tools": []}]
+    print(f"Using {len(payloads)} payloads from '{trace_dir}'")
+
+    client = make_async_client(base_url, api_key, max_retries=0)
+    results = []
+    try:
+        for level in levels:
+            n = requests_per_level or max(4 * level, 8)
+            print(f"Concurrency {level}: sending {n} requests...")
+            results.append(await run_level(client, model, payloads, level, n, max_tokens))
+    finally:
+        if hasattr(client, "router"):
+            for ep in client.router.stats():
+                print(f"  {ep['base_url']}: {ep['requests']} requests, {ep['errors']} errors"
+                      + (" (ejected)" if ep["ejected"] else ""))
+        await client.close()
+    return results
+
+def smoke_test(base_url, model):
+    """List the models and send one short completion to a single endpoint."""
     # Test models endpoint
     try:
         models_url = f"{base_url}/models"
@@ -31,8 +188,8 @@ def main():
         if response.status_code == 200:
             models = response.json()
             print("\nAvailable models:")
-            for model in models.get("data", []):
-                print(f"- {model.get('id')}")
+            for entry in models.get("data", []):
+                print(f"- {entry.get('id')}")
         else:
             print(f"Error: {response.status_code}")
             print(response.text)
@@ -44,7 +201,7 @@ def main():
         print("\nTesting a simple completion...")
         completion_url = f"{base_url}/chat/completions"
         payload = {
-            "model": "Qwen/Qwen3-30B-A3B-FP8",
+            "model": model,
             "messages": [{"role": "user", "content": "Say hello"}],
             "max_tokens": 10
         }
@@ -63,5 +220,49 @@ def main():
     except Exception as e:
         print(f"Exception: {e}")
 
+def main():
+    parser = argparse.ArgumentParser(description="Test an OpenAI-compatible API endpoint")
+    parser.add_argument("base_url", nargs="?", default=DEFAULT_BASE_URL, help="API base URL (comma-separated list for several replicas)")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Model to request (default: {DEFAULT_MODEL})")
+    parser.add_argument("--load", action="store_true", help="Run a streaming load test sweep instead of the smoke test")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Comma-separated concurrency levels (default: 1,2,4,8,16,32)")
+    parser.add_argument("--requests-per-level", type=int, help="Requests per level (default: 4x concurrency, at least 8)")
+    parser.add_argument("--max-tokens", type=int, default=128, help="max_tokens per load-test request (default: 128)")
+    parser.add_argument("--trace-dir", default="traces", help="Traces to take payloads from (default: 'traces')")
+    parser.add_argument("--api-key", default="EMPTY", help="API key to send (default: EMPTY)")
+    parser.add_argument("--output", help="Also write load-test results to this JSON file")
+    args = parser.parse_args()
+
+    base_urls = []
+    for base_url in parse_base_urls(args.base_url):
+        # Fix URL if needed
+        if base_url.endswith("--show-reasoning"):
+            base_url = base_url.replace("--show-reasoning", "")
+
+        # Ensure URL ends with /v1
+        if not base_url.endswith("/v1"):
+            if "/v1" not in base_url:
+                base_url = f"{base_url}/v1"
+        base_urls.append(base_url)
+    base_url = ",".join(base_urls)
+
+    print(f"Testing API endpoint: {base_url}")
+    
+    if args.load:
+        levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+        results = asyncio.run(load_test(base_url, args.model, levels, args.requests_per_level,
+                                        args.max_tokens, args.trace_dir, args.api_key))
+        print_load_results(results)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"base_url": base_url, "model": args.model, "levels": results}, f, indent=2)
+            print(f"\nResults saved to: {args.output}")
+        return
+    
+    for url in base_urls:
+        if len(base_urls) > 1:
+            print(f"\n=== {url} ===")
+        smoke_test(url, args.model)
+
 if __name__ == "__main__":
     main()
@@ -8,40 +8,52 @@ This script:
 3. Passes those messages and tools to the API
 4. Compares the new response with the original one
 
+With --batch, every assistant turn of every trace is replayed instead, using
+concurrent async requests, and per-turn tool-name/argument scores are written
+to a JSON report.
+
 Usage:
   uv run test_trace_reload.py --base-url=https://0zslbmx98vpo2i-8000.proxy.runpod.net/v1 --model=Qwen/Qwen3-30B-A3B-FP8
+  uv run test_trace_reload.py --base-url=... --model=... --batch [--concurrency=32] [--report=eval_report.json]
 """
 
 import argparse
+import asyncio
 import json
 import os
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI
 from rich.console import Console
 from rich.panel import Panel
+from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn
+from rich.table import Table
 from rich.text import Text
 
+from endpoint_pool import make_async_client, make_client, session_client
+from response_cache import DEFAULT_MAX_BYTES, ResponseCache, acached_chat_completion, cached_chat_completion
+from trace_catalog import add_filter_arguments, filters_from_args, select_traces
+
 console = Console()
 
-def find_latest_trace(trace_dir: str = "traces") -> Optional[Path]:
-    """Find the most recent trace file in the traces directory."""
+def find_latest_trace(trace_dir: str = "traces", filters: Optional[Dict[str, Any]] = None) -> Optional[Path]:
+    """Find the most recent trace (matching `filters`) via the trace catalogue."""
     trace_path = Path(trace_dir)
     if not trace_path.exists() or not trace_path.is_dir():
         console.print(f"[red]Error: Trace directory '{trace_dir}' does not exist[/red]")
         return None
     
-    trace_files = list(trace_path.glob("*.json"))
+    trace_files = select_traces(trace_dir, filters or {})
     if not trace_files:
-        console.print(f"[red]Error: No trace files found in '{trace_dir}'[/red]")
+        console.print(f"[red]Error: No matching trace files found in '{trace_dir}'[/red]")
         return None
     
-    # Sort by modification time, newest first
-    latest_trace = max(trace_files, key=lambda p: p.stat().st_mtime)
-    return latest_trace
+    # Newest first
+    return trace_files[0]
 
 def load_trace(trace_file: Path) -> Optional[Dict[str, Any]]:
     """Load a trace file and return its contents."""
@@ -76,16 +88,20 @@ def prepare_messages_for_api(messages: List[Dict[str, Any]]) -> Tuple[List[Dict[
     
     return prepared_messages, last_assistant_msg
 
-def call_api(messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], model: str, base_url: str) -> Dict[str, Any]:
+def call_api(messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], model: str, base_url: str,
+             cache: Optional[ResponseCache] = None, temperature: Optional[float] = None) -> Dict[str, Any]:
     """Make a call to the API with the given messages and tools."""
-    client = OpenAI(api_key="dummy", base_url=base_url)
+    client = make_client(base_url, "dummy")
     
     try:
-        response = client.chat.completions.create(
+        response = cached_chat_completion(
+            client,
+            cache,
             model=model,
             messages=messages,
             tools=tools if tools else None,
             tool_choice="auto",
+            **({} if temperature is None else {"temperature": temperature}),
         )
         return response.choices[0].message
     except Exception as e:
@@ -174,19 +190,247 @@ def display_response(response: Dict[str, Any]) -> None:
             console.print(Panel(f"Name: {name}\nArguments: {args_str}", 
                                title=f"Tool Call {i+1}"))
 
+# -----------------------------------------------------------------------------#
+#  Batch evaluation                                                            #
+# -----------------------------------------------------------------------------#
+def _parse_args(args: Any) -> Any:
+    """Tool-call arguments as a Python object, whether stored parsed or raw."""
+    if isinstance(args, str):
+        try:
+            return json.loads(args) if args.strip() else {}
+        except json.JSONDecodeError:
+            return args
+    return args
+
+def _api_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy messages with tool-call arguments as JSON strings, as the API expects."""
+    out = []
+    for msg in messages:
+        msg = dict(msg)
+        if msg.get("tool_calls"):
+            calls = []
+            for tc in msg["tool_calls"]:
+                tc = dict(tc)
+                if "function" in tc:
+                    fn = dict(tc["function"])
+                    args = fn.get("arguments", "{}")
+                    fn["arguments"] = args if isinstance(args, str) else json.dumps(args)
+                    tc["function"] = fn
+                calls.append(tc)
+            msg["tool_calls"] = calls
+        out.append(msg)
+    return out
+
+def iter_assistant_turns(messages: List[Dict[str, Any]]):
+    """Yield (message_index, prefix, expected) for every assistant message in a trace."""
+    for i, msg in enumerate(messages):
+        if msg.get("role") == "assistant":
+            yield i, messages[:i], msg
+
+def _tool_calls_of(message: Any) -> List[Tuple[str, Any]]:
+    """(name, parsed arguments) pairs from a trace dict or an API message object."""
+    if isinstance(message, dict):
+        calls = message.get("tool_calls") or []
+        return [(tc.get("function", {}).get("name"), _parse_args(tc.get("function", {}).get("arguments", {})))
+                for tc in calls]
+    calls = getattr(message, "tool_calls", None) or []
+    return [(tc.function.name, _parse_args(tc.function.arguments)) for tc in calls]
+
+def score_turn(expected: Dict[str, Any], predicted: Any) -> Dict[str, Any]:
+    """
+    Score one replayed assistant turn against the recorded one.
+
+    - tool_name_match: same multiset of tool names (both empty counts as a match)
+    - args_match: fraction of expected calls with an identically-named predicted
+      call (matched in order) whose arguments are exactly equal
+    - arg_field_accuracy: fraction of expected argument fields reproduced exactly
+    """
+    exp_calls = _tool_calls_of(expected)
+    new_calls = _tool_calls_of(predicted)
+
+    name_match = sorted(n or "" for n, _ in exp_calls) == sorted(n or "" for n, _ in new_calls)
+
+    remaining = list(new_calls)
+    exact, fields_total, fields_ok = 0, 0, 0
+    for name, args in exp_calls:
+        idx = next((j for j, (n, _) in enumerate(remaining) if n == name), None)
+        new_args = remaining.pop(idx)[1] if idx is not None else None
+        if new_args == args:
+            exact += 1
+        if isinstance(args, dict):
+            fields_total += len(args)
+            if isinstance(new_args, dict):
+                fields_ok += sum(1 for k, v in args.items() if new_args.get(k) == v)
+
+    return {
+        "expected_tools": [n for n, _ in exp_calls],
+        "predicted_tools": [n for n, _ in new_calls],
+        "tool_name_match": name_match,
+        "args_match": (exact / len(exp_calls)) if exp_calls else float(not new_calls),
+        "arg_field_accuracy": (fields_ok / fields_total) if fields_total else None,
+    }
+
+async def _eval_turn(client: AsyncOpenAI, semaphore: asyncio.Semaphore, job: Dict[str, Any],
+                     model: str, progress: Progress, task_id,
+                     cache: Optional[ResponseCache] = None, temperature: Optional[float] = None) -> Dict[str, Any]:
+    """Replay a single assistant turn and score it; errors are recorded, not raised."""
+    result = {"trace": job["trace"], "message_index": job["message_index"]}
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            rsp = await acached_chat_completion(
+                session_client(client, job["trace"]),      # a trace's turns share a prefix: keep them on one replica
+                cache,
+                model=model,
+                messages=job["messages"],
+                tools=job["tools"] if job["tools"] else None,
+                tool_choice="auto",
+                **({} if temperature is None else {"temperature": temperature}),
+            )
+            result.update(score_turn(job["expected"], rsp.choices[0].message))
+            result["error"] = None
+        except Exception as e:
+            result["error"] = str(e)
+        result["latency_s"] = round(time.perf_counter() - start, 3)
+    progress.update(task_id, advance=1)
+    return result
+
+def summarize_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate per-turn scores into overall accuracies."""
+    ok = [r for r in results if r["error"] is None]
+    with_fields = [r["arg_field_accuracy"] for r in ok if r["arg_field_accuracy"] is not None]
+    latencies = sorted(r["latency_s"] for r in ok)
+    return {
+        "turns": len(results),
+        "errors": len(results) - len(ok),
+        "tool_name_accuracy": sum(r["tool_name_match"] for r in ok) / len(ok) if ok else None,
+        "args_accuracy": sum(r["args_match"] for r in ok) / len(ok) if ok else None,
+        "arg_field_accuracy": sum(with_fields) / len(with_fields) if with_fields else None,
+        "latency_p50_s": latencies[len(latencies) // 2] if latencies else None,
+    }
+
+async def run_batch_eval(trace_files: List[Path], model: str, base_url: str,
+                         concurrency: int = 32, cache: Optional[ResponseCache] = None,
+                         temperature: Optional[float] = None) -> Dict[str, Any]:
+    """Replay every assistant turn of every trace with at most `concurrency` requests in flight."""
+    jobs = []
+    for trace_file in trace_files:
+        trace = load_trace(trace_file)
+        if not trace:
+            continue
+        tools = trace.get("tools", [])
+        for idx, prefix, expected in iter_assistant_turns(trace.get("messages", [])):
+            jobs.append({
+                "trace": trace_file.name,
+                "message_index": idx,
+                "messages": _api_messages(prefix),
+                "tools": tools,
+                "expected": expected,
+            })
+
+    client = make_async_client(base_url, "dummy")
+    semaphore = asyncio.Semaphore(concurrency)
+    started = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(),
+        console=console
+    ) as progress:
+        task_id = progress.add_task(f"Replaying {len(jobs)} assistant turns...", total=len(jobs))
+        results = await asyncio.gather(*(
+            _eval_turn(client, semaphore, job, model, progress, task_id, cache, temperature) for job in jobs
+        ))
+    endpoints = client.router.stats() if hasattr(client, "router") else None
+    await client.close()
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "model": model,
+        "base_url": base_url,
+        "started": started,
+        "elapsed_s": round(elapsed, 3),
+        "concurrency": concurrency,
+        "traces": len(trace_files),
+        "summary": summarize_results(results),
+        "turns": results,
+    }
+    if endpoints:
+        report["endpoints"] = endpoints
+    return report
+
+def print_batch_summary(report: Dict[str, Any]) -> None:
+    """Render the batch report summary as a table."""
+    summary = report["summary"]
+    table = Table(title=f"Batch evaluation: {report['model']}")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    table.add_row("Traces", str(report["traces"]))
+    for key, value in summary.items():
+        table.add_row(key, "-" if value is None else (f"{value:.3f}" if isinstance(value, float) else str(value)))
+    table.add_row("elapsed_s", f"{report['elapsed_s']:.1f}")
+    console.print(table)
+    for ep in report.get("endpoints", []):
+        console.print(f"  {ep['base_url']}: {ep['requests']} requests, {ep['errors']} errors"
+                      + (" [red](ejected)[/red]" if ep["ejected"] else ""))
+
 def main():
     parser = argparse.ArgumentParser(description="Test trace reload capability")
     parser.add_argument("--trace-dir", default="traces", help="Directory containing trace files")
     parser.add_argument("--model", required=True, help="Model to use for the API call")
-    parser.add_argument("--base-url", required=True, help="Base URL for the API")
+    parser.add_argument("--base-url", required=True, help="Base URL for the API (comma-separated list to load-balance across replicas)")
     parser.add_argument("--trace-file", help="Specific trace file to use (optional)")
+    parser.add_argument("--batch", action="store_true", help="Replay every assistant turn of every trace and write a JSON report")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum in-flight requests in --batch mode (default: 32)")
+    parser.add_argument("--report", default="eval_report.json", help="Where to write the --batch report (default: eval_report.json)")
+    parser.add_argument("--temperature", type=float, help="Sampling temperature (default: the server's, or 0 with --cache-dir)")
+    parser.add_argument("--cache-dir", help="Enable the on-disk response cache in this directory")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="Size limit of the response cache in MB")
+    parser.add_argument("--cache-bypass", action="store_true", help="Skip cache lookups (fresh responses are still stored)")
+    parser.add_argument("--cache-sampled", action="store_true", help="Also cache requests not sent at temperature 0")
+    add_filter_arguments(parser)
     
     args = parser.parse_args()
+    filters = filters_from_args(args)
     
     console.print("[bold magenta]Trace Reload Test[/bold magenta]")
     
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024, bypass=args.cache_bypass,
+                              cache_sampled=args.cache_sampled)
+        console.print(f"[blue]Response cache:[/blue] {cache.path}")
+        if args.temperature is None:
+            args.temperature = 0.0              # only deterministic responses are cached
+            console.print("[blue]Sampling at temperature 0 so responses can be cached (--temperature overrides)[/blue]")
+    
+    if args.batch:
+        try:
+            trace_files = [Path(args.trace_file)] if args.trace_file else sorted(select_traces(args.trace_dir, filters))
+        except (FileNotFoundError, ValueError) as exc:
+            parser.error(str(exc))
+        if not trace_files:
+            console.print(f"[red]Error: No matching trace files found in '{args.trace_dir}'[/red]")
+            return
+        console.print(f"[blue]Evaluating {len(trace_files)} traces against {args.base_url} "
+                      f"with model {args.model} (concurrency {args.concurrency})[/blue]")
+        report = asyncio.run(run_batch_eval(trace_files, args.model, args.base_url, args.concurrency, cache,
+                                            args.temperature))
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print_batch_summary(report)
+        if cache:
+            console.print(f"[blue]Cache hits: {cache.hits}, misses: {cache.misses}[/blue]")
+        console.print(f"[bold blue]Report saved to:[/bold blue] {args.report}")
+        return
+    
     # Find the latest trace file or use the specified one
-    trace_file = Path(args.trace_file) if args.trace_file else find_latest_trace(args.trace_dir)
+    try:
+        trace_file = Path(args.trace_file) if args.trace_file else find_latest_trace(args.trace_dir, filters)
+    except ValueError as exc:
+        parser.error(str(exc))
     if not trace_file:
         return
     
@@ -216,7 +460,7 @@ def main():
     
     # Call the API
     console.print(f"\n[blue]Calling API at {args.base_url} with model {args.model}...[/blue]")
-    new_response = call_api(prepared_messages, tools, args.model, args.base_url)
+    new_response = call_api(prepared_messages, tools, args.model, args.base_url, cache, args.temperature)
     
     if not new_response:
         return
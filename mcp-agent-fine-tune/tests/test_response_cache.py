@@ -0,0 +1,97 @@
+"""
+End-to-end check of the response cache: replaying the same traces twice with
+`--cache-dir --temperature 0` must serve the second run from the cache.
+
+Runs test_trace_reload.py --batch against stub_server.py, so no GPU or API
+key is needed:
+
+  uv run python -m unittest discover tests
+"""
+
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(HERE))
+
+from synthetic_traces import make_trace  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"stub server did not start on port {port}")
+
+
+class ResponseCacheReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        traces = self.dir / "traces"
+        traces.mkdir()
+        for seed in range(2):
+            with open(traces / f"synthetic_{seed:05d}.json", "w") as f:
+                json.dump(make_trace(turns=2, snapshot_chars=500, n_tools=6, seed=seed), f)
+
+        self.port = _free_port()
+        self.server = subprocess.Popen(
+            [sys.executable, "stub_server.py", "--port", str(self.port), "--ttft-ms", "1", "--itl-ms", "0"],
+            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(self.server.wait)
+        self.addCleanup(self.server.terminate)
+        _wait_for_port(self.port)
+
+    def _replay(self, *extra: str) -> tuple:
+        proc = subprocess.run(
+            [sys.executable, "test_trace_reload.py", "--batch",
+             "--trace-dir", str(self.dir / "traces"),
+             "--model", "stub", "--base-url", f"http://127.0.0.1:{self.port}/v1",
+             "--report", str(self.dir / "report.json"),
+             "--cache-dir", str(self.dir / "cache"), *extra],
+            cwd=HERE, capture_output=True, text=True, timeout=120,
+            env={**os.environ, "COLUMNS": "200"},       # keep rich from wrapping the hit counts
+        )
+        self.assertEqual(proc.returncode, 0, proc.stdout + proc.stderr)
+        match = re.search(r"Cache hits: (\d+), misses: (\d+)", proc.stdout)
+        self.assertIsNotNone(match, proc.stdout)
+        return int(match.group(1)), int(match.group(2))
+
+    def test_second_run_is_served_from_cache(self):
+        hits, misses = self._replay("--temperature", "0")
+        self.assertEqual(hits, 0)
+        self.assertGreater(misses, 0)
+        self.assertEqual(self._replay("--temperature", "0"), (misses, 0))
+
+    def test_cache_dir_alone_defaults_to_temperature_0(self):
+        _, misses = self._replay()
+        self.assertGreater(misses, 0)
+        self.assertEqual(self._replay(), (misses, 0))
+
+    def test_sampled_requests_are_not_cached(self):
+        self.assertEqual(self._replay("--temperature", "0.7"), (0, 0))
+        self.assertEqual(self._replay("--temperature", "0.7"), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Per-turn tool retrieval with an offline BM25 index.
+
+Each OpenAI-format tool is indexed as a bag of words taken from its name,
+description and parameter names (and parameter descriptions). Before each
+model call the agent scores tools against the recent conversation and sends
+only the top-k, plus any tools used recently (pinned), so the tools payload
+stays roughly constant as more MCP servers are added.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+_SPLIT_RE = re.compile(r"[^a-z0-9]+")
+_CAMEL_RE = re.compile(r"([a-z0-9])([A-Z])")
+
+# Very common words that would otherwise match every description.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "if", "in", "into", "is", "it",
+    "of", "on", "or", "the", "this", "to", "with", "you", "your", "me", "i", "then", "that", "what",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, splitting snake_case and camelCase identifiers."""
+    text = _CAMEL_RE.sub(r"\1 \2", text or "").lower()
+    return [t for t in _SPLIT_RE.split(text) if t and t not in STOPWORDS]
+
+
+def _tool_text(tool: dict) -> str:
+    fn = tool.get("function", {})
+    params = fn.get("parameters") or {}
+    parts = [fn.get("name", ""), fn.get("name", ""), fn.get("description", "")]   # name counts twice
+    for pname, pschema in (params.get("properties") or {}).items():
+        parts.append(pname)
+        if isinstance(pschema, dict):
+            parts.append(pschema.get("description", ""))
+    return " ".join(parts)
+
+
+class ToolRetriever:
+    """BM25 index over a fixed list of OpenAI-format tools."""
+
+    def __init__(self, tools: List[dict], *, k1: float = 1.2, b: float = 0.75):
+        self.tools = tools
+        self.names = [t.get("function", {}).get("name", "") for t in tools]
+        self.k1 = k1
+        self.b = b
+
+        self.doc_tf: List[Counter] = [Counter(tokenize(_tool_text(t))) for t in tools]
+        self.doc_len = [sum(tf.values()) for tf in self.doc_tf]
+        self.avg_len = (sum(self.doc_len) / len(self.doc_len)) if self.doc_len else 0.0
+
+        df: Counter = Counter()
+        for tf in self.doc_tf:
+            df.update(tf.keys())
+        n = len(tools)
+        self.idf: Dict[str, float] = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def scores(self, query: str) -> List[float]:
+        terms = Counter(tokenize(query))
+        out = []
+        for tf, length in zip(self.doc_tf, self.doc_len):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_len) if self.avg_len else self.k1
+            score = 0.0
+            for term, qf in terms.items():
+                f = tf.get(term)
+                if f:
+                    score += self.idf[term] * f * (self.k1 + 1) / (f + norm) * qf
+            out.append(score)
+        return out
+
+    def select(self, query: str, k: int, pinned: Iterable[str] = ()) -> List[dict]:
+        """
+        Top-k matching tools for `query`, plus every pinned tool name that
+        exists, in the original tool order so the prompt stays stable. When
+        nothing matches and nothing is pinned, all tools are returned rather
+        than leaving the model with none.
+        """
+        if k >= len(self.tools):
+            return list(self.tools)
+
+        pinned = set(pinned)
+        scores = self.scores(query)
+        ranked = sorted(range(len(self.tools)), key=lambda i: (-scores[i], i))
+        chosen = {i for i in ranked[:k] if scores[i] > 0}
+        chosen.update(i for i, name in enumerate(self.names) if name in pinned)
+        if not chosen:
+            return list(self.tools)
+        return [self.tools[i] for i in sorted(chosen)]
+
+
+def retrieval_query(messages: List[Dict[str, Any]], max_chars: int = 4000) -> str:
+    """
+    Query text for the next turn: the latest user message plus the latest
+    assistant content/reasoning. Tool results (page snapshots) are left out.
+    """
+    parts: List[str] = []
+    for msg in reversed(messages):
+        role = msg.get("role")
+        if role == "assistant" and not parts:
+            parts.append(str(msg.get("reasoning_content") or "")[-max_chars:])
+            parts.append(str(msg.get("content") or ""))
+        elif role == "user":
+            parts.append(str(msg.get("content") or ""))
+            break
+    return " ".join(p for p in parts if p)
+
+
+def recently_used_tools(messages: List[Dict[str, Any]], turns: int = 3) -> List[str]:
+    """Names of tools called in the last `turns` assistant messages."""
+    names: List[str] = []
+    seen = 0
+    for msg in reversed(messages):
+        if msg.get("role") != "assistant":
+            continue
+        for tc in msg.get("tool_calls") or []:
+            name: Optional[str] = tc.get("function", {}).get("name")
+            if name and name not in names:
+                names.append(name)
+        seen += 1
+        if seen >= turns:
+            break
+    return names
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+SQLite catalogue of conversation traces, for selecting traces without
+opening every JSON file.
+
+Each trace is indexed once with its filename, timestamp, model, task (first
+user message), message / assistant-turn / tool-call counts, tool-result
+sizes, which tools it called (and how often), and its user prompts in an
+FTS5 full-text index. The catalogue lives next to the traces in
+`<trace_dir>/.catalog.sqlite` and is kept up to date incrementally:
+
+  * the agent adds each trace as it saves it,
+  * `sync()` picks up files written or copied in by anything else; it only
+    lists the directory when the directory's mtime changed (otherwise it
+    stats the indexed files), and only parses files whose size or mtime
+    differ from the indexed ones.
+
+Queries (newest first) combine model, tool, time range, minimum turns and
+full-text search, e.g. every trace using browser_click with model X last
+week. `test_trace_reload.py` and `push-to-hub.py` accept the same filters.
+
+Usage:
+  uv run trace_catalog.py [--trace-dir traces] [--filter-model M] [--filter-tool T] [--since 2025-05-01]
+                          [--until ...] [--min-turns N] [--search "trelis AND pricing"] [--limit 20] [--stats]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+CATALOG_NAME = ".catalog.sqlite"
+SCHEMA_VERSION = "1"
+
+
+def _trace_time(trace: Dict[str, Any], mtime: float) -> str:
+    """ISO time of a trace: its `timestamp` field (YYYYmmdd_HHMMSS), else the file mtime."""
+    try:
+        return datetime.datetime.strptime(str(trace.get("timestamp", "")), "%Y%m%d_%H%M%S").isoformat()
+    except ValueError:
+        return datetime.datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
+
+
+def summarize_trace(trace: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, int], str]:
+    """(catalogue fields, tool → call count, prompt text) for one trace."""
+    messages = trace.get("messages", []) or []
+    tools: Dict[str, int] = {}
+    prompts: List[str] = []
+    result_sizes: List[int] = []
+    turns = 0
+    for msg in messages:
+        role = msg.get("role")
+        if role == "user":
+            prompts.append(str(msg.get("content") or ""))
+        elif role == "assistant":
+            turns += 1
+            for tc in msg.get("tool_calls") or []:
+                name = tc.get("function", {}).get("name")
+                if name:
+                    tools[name] = tools.get(name, 0) + 1
+        elif role == "tool":
+            result_sizes.append(len(str(msg.get("content") or "")))
+    fields = {
+        "model": trace.get("model", ""),
+        "task": prompts[0] if prompts else "",
+        "messages": len(messages),
+        "turns": turns,
+        "tool_calls": sum(tools.values()),
+        "tool_result_chars": sum(result_sizes),
+        "max_tool_result_chars": max(result_sizes, default=0),
+    }
+    return fields, tools, "\n".join(prompts)
+
+
+class TraceCatalog:
+    """SQLite-backed index of the traces in one directory."""
+
+    def __init__(self, trace_dir: str = "traces", db_path: Optional[str] = None):
+        self.trace_dir = Path(trace_dir)
+        # Never create the directory: a mistyped --trace-dir should fail, not read as an empty catalogue
+        if not self.trace_dir.is_dir():
+            raise FileNotFoundError(f"Trace directory '{trace_dir}' does not exist")
+        self.db_path = Path(db_path) if db_path else self.trace_dir / CATALOG_NAME
+        self.db = sqlite3.connect(self.db_path, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        # A persistent journal keeps the directory listing (and so its mtime) stable across writes
+        self.db.execute("PRAGMA journal_mode=PERSIST")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS traces (
+                id INTEGER PRIMARY KEY,
+                filename TEXT UNIQUE,
+                mtime REAL,
+                size INTEGER,
+                created TEXT,
+                model TEXT,
+                task TEXT,
+                messages INTEGER,
+                turns INTEGER,
+                tool_calls INTEGER,
+                tool_result_chars INTEGER,
+                max_tool_result_chars INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_traces_created ON traces (created);
+            CREATE INDEX IF NOT EXISTS idx_traces_model ON traces (model, created);
+            CREATE TABLE IF NOT EXISTS trace_tools (
+                trace_id INTEGER,
+                tool TEXT,
+                calls INTEGER,
+                PRIMARY KEY (trace_id, tool)
+            );
+            CREATE INDEX IF NOT EXISTS idx_trace_tools_tool ON trace_tools (tool, trace_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS trace_prompts USING fts5(prompts);
+            """
+        )
+        version = self.db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if version is None:
+            self.db.execute("INSERT INTO meta VALUES ('schema', ?)", (SCHEMA_VERSION,))
+        self.db.commit()
+
+    # ---------------------------------------------------------------------#
+    #  Indexing                                                            #
+    # ---------------------------------------------------------------------#
+    def _remove(self, trace_id: int) -> None:
+        self.db.execute("DELETE FROM traces WHERE id = ?", (trace_id,))
+        self.db.execute("DELETE FROM trace_tools WHERE trace_id = ?", (trace_id,))
+        self.db.execute("DELETE FROM trace_prompts WHERE rowid = ?", (trace_id,))
+
+    def _index(self, path: Path, trace: Dict[str, Any], stat: os.stat_result) -> None:
+        old = self.db.execute("SELECT id FROM traces WHERE filename = ?", (path.name,)).fetchone()
+        if old:
+            self._remove(old["id"])
+        fields, tools, prompts = summarize_trace(trace)
+        cur = self.db.execute(
+            "INSERT INTO traces (filename, mtime, size, created, model, task, messages, turns, tool_calls, "
+            "tool_result_chars, max_tool_result_chars) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path.name, stat.st_mtime, stat.st_size, _trace_time(trace, stat.st_mtime), fields["model"],
+             fields["task"], fields["messages"], fields["turns"], fields["tool_calls"],
+             fields["tool_result_chars"], fields["max_tool_result_chars"]),
+        )
+        trace_id = cur.lastrowid
+        self.db.executemany("INSERT INTO trace_tools VALUES (?, ?, ?)",
+                            [(trace_id, name, calls) for name, calls in tools.items()])
+        self.db.execute("INSERT INTO trace_prompts (rowid, prompts) VALUES (?, ?)", (trace_id, prompts))
+
+    def add(self, path: Path, trace: Optional[Dict[str, Any]] = None) -> None:
+        """Index (or re-index) one trace file; pass `trace` to skip re-reading it."""
+        path = Path(path)
+        if trace is None:
+            with open(path) as f:
+                trace = json.load(f)
+        self._index(path, trace, path.stat())
+        self.db.commit()
+
+    def sync(self, force: bool = False) -> Tuple[int, int]:
+        """
+        Bring the catalogue in line with the directory. Returns (indexed,
+        removed). When the directory mtime is unchanged no file was added,
+        removed or renamed, so the listing is skipped and only the known
+        files are stat'ed to catch traces rewritten in place.
+        """
+        dir_mtime = str(self.trace_dir.stat().st_mtime_ns)
+        seen = self.db.execute("SELECT value FROM meta WHERE key = 'dir_mtime'").fetchone()
+        known = {row["filename"]: (row["id"], row["mtime"], row["size"])
+                 for row in self.db.execute("SELECT id, filename, mtime, size FROM traces")}
+        if not force and seen is not None and seen["value"] == dir_mtime:
+            names = list(known)
+        else:
+            with os.scandir(self.trace_dir) as entries:
+                names = [e.name for e in entries if e.name.endswith(".json") and e.is_file()]
+
+        indexed = 0
+        present = set()
+        for name in names:
+            path = self.trace_dir / name
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            present.add(name)
+            old = known.get(name)
+            if old and old[1] == stat.st_mtime and old[2] == stat.st_size:
+                continue
+            try:
+                with open(path) as f:
+                    trace = json.load(f)
+            except (OSError, json.JSONDecodeError) as exc:
+                console.print(f"[yellow]Skipping {name}: {exc}[/yellow]")
+                continue
+            self._index(path, trace, stat)
+            indexed += 1
+
+        removed = [trace_id for name, (trace_id, _, _) in known.items() if name not in present]
+        for trace_id in removed:
+            self._remove(trace_id)
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('dir_mtime', ?)", (dir_mtime,))
+        self.db.commit()
+        return indexed, len(removed)
+
+    # ---------------------------------------------------------------------#
+    #  Queries                                                             #
+    # ---------------------------------------------------------------------#
+    def query(
+        self,
+        *,
+        model: Optional[str] = None,
+        tool: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        min_turns: Optional[int] = None,
+        search: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Matching traces, newest first. `since`/`until` are ISO dates or times
+        (`until` is exclusive), `search` is an FTS5 query over user prompts.
+        """
+        sql = ["SELECT t.*, (SELECT group_concat(tool, ',') FROM trace_tools WHERE trace_id = t.id) AS tools",
+               "FROM traces t"]
+        where: List[str] = []
+        params: List[Any] = []
+        if search:
+            sql.append("JOIN trace_prompts p ON p.rowid = t.id")
+            where.append("trace_prompts MATCH ?")
+            params.append(search)
+        if model:
+            where.append("t.model = ?")
+            params.append(model)
+        if tool:
+            where.append("EXISTS (SELECT 1 FROM trace_tools tt WHERE tt.trace_id = t.id AND tt.tool = ?)")
+            params.append(tool)
+        if since:
+            where.append("t.created >= ?")
+            params.append(since)
+        if until:
+            where.append("t.created < ?")
+            params.append(until)
+        if min_turns:
+            where.append("t.turns >= ?")
+            params.append(min_turns)
+        if where:
+            sql.append("WHERE " + " AND ".join(where))
+        sql.append("ORDER BY t.created DESC, t.filename DESC")
+        if limit:
+            sql.append("LIMIT ?")
+            params.append(limit)
+        return [dict(row) for row in self.db.execute(" ".join(sql), params)]
+
+    def paths(self, **filters: Any) -> List[Path]:
+        """Trace file paths matching `filters` (see `query`), newest first."""
+        return [self.trace_dir / row["filename"] for row in self.query(**filters)]
+
+    def latest(self) -> Optional[Path]:
+        rows = self.query(limit=1)
+        return self.trace_dir / rows[0]["filename"] if rows else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts per model and per tool across the catalogue."""
+        return {
+            "traces": self.db.execute("SELECT COUNT(*) FROM traces").fetchone()[0],
+            "models": {r[0]: r[1] for r in self.db.execute(
+                "SELECT model, COUNT(*) FROM traces GROUP BY model ORDER BY COUNT(*) DESC")},
+            "tools": {r[0]: (r[1], r[2]) for r in self.db.execute(
+                "SELECT tool, COUNT(*), SUM(calls) FROM trace_tools GROUP BY tool ORDER BY SUM(calls) DESC")},
+        }
+
+    def close(self) -> None:
+        self.db.close()
+
+
+# -----------------------------------------------------------------------------#
+#  Shared CLI filters                                                          #
+# -----------------------------------------------------------------------------#
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    """Trace selection options shared by the scripts that read traces."""
+    group = parser.add_argument_group("trace selection (via the trace catalogue)")
+    group.add_argument("--filter-model", help="Only traces recorded with this model")
+    group.add_argument("--filter-tool", help="Only traces that call this tool")
+    group.add_argument("--since", help="Only traces from this ISO date/time onwards")
+    group.add_argument("--until", help="Only traces before this ISO date/time")
+    group.add_argument("--min-turns", type=int, help="Only traces with at least this many assistant turns")
+    group.add_argument("--search", help="Full-text query over user prompts (SQLite FTS5 syntax)")
+
+
+def filters_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """Filters set on the command line, as keyword arguments for `TraceCatalog.query`."""
+    filters = {
+        "model": args.filter_model,
+        "tool": args.filter_tool,
+        "since": args.since,
+        "until": args.until,
+        "min_turns": args.min_turns,
+        "search": args.search,
+    }
+    return {k: v for k, v in filters.items() if v}
+
+
+def select_traces(trace_dir: str, filters: Dict[str, Any]) -> List[Path]:
+    """Sync the directory's catalogue and return the matching trace paths, newest first.
+
+    Raises FileNotFoundError if the directory is missing and ValueError for an
+    invalid `search` expression, so callers can report them as usage errors.
+    """
+    catalog = TraceCatalog(trace_dir)
+    try:
+        catalog.sync()
+        try:
+            return catalog.paths(**filters)
+        except sqlite3.OperationalError as exc:
+            if not filters.get("search"):
+                raise
+            raise ValueError(f"Invalid --search query {filters['search']!r}: {exc}") from exc
+    finally:
+        catalog.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the trace catalogue")
+    parser.add_argument("--trace-dir", default="traces", help="Directory containing trace files (default: 'traces')")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum traces to list (default: 50)")
+    parser.add_argument("--stats", action="store_true", help="Show counts per model and tool instead of listing traces")
+    parser.add_argument("--rebuild", action="store_true", help="Re-scan every file instead of only changed ones")
+    parser.add_argument("--json", action="store_true", help="Print matching rows as JSON")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        catalog = TraceCatalog(args.trace_dir)
+    except FileNotFoundError as exc:
+        parser.error(str(exc))
+    indexed, removed = catalog.sync(force=args.rebuild)
+    if indexed or removed:
+        console.print(f"[blue]Catalogue updated: {indexed} indexed, {removed} removed[/blue]")
+
+    if args.stats:
+        stats = catalog.stats()
+        console.print(f"[bold]{stats['traces']} traces[/bold]")
+        table = Table(title="Models")
+        table.add_column("Model")
+        table.add_column("Traces", justify="right")
+        for model, count in stats["models"].items():
+            table.add_row(model or "-", str(count))
+        console.print(table)
+        table = Table(title="Tools")
+        table.add_column("Tool")
+        table.add_column("Traces", justify="right")
+        table.add_column("Calls", justify="right")
+        for tool, (traces, calls) in stats["tools"].items():
+            table.add_row(tool, str(traces), str(calls))
+        console.print(table)
+        return
+
+    try:
+        rows = catalog.query(**filters_from_args(args), limit=args.limit)
+    except sqlite3.OperationalError as exc:
+        parser.error(f"Invalid --search query {args.search!r}: {exc}")
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    table = Table(title=f"{len(rows)} trace(s)")
+    table.add_column("Created")
+    table.add_column("Model")
+    table.add_column("Turns", justify="right")
+    table.add_column("Tool calls", justify="right")
+    table.add_column("Result KB", justify="right")
+    table.add_column("Task", no_wrap=True, max_width=48)
+    table.add_column("File", no_wrap=True)
+    for row in rows:
+        table.add_row(row["created"], row["model"], str(row["turns"]), str(row["tool_calls"]),
+                      f"{row['tool_result_chars'] / 1000:.0f}", row["task"][:60], row["filename"])
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()